@@ -0,0 +1,172 @@
+# ALMACENAMIENTO DE PRECIOS EN UNA TABLA LARGA prices(ticker, date, ...)
+# 1. Importar Librerías
+import pandas as pd
+import sqlite3
+from sqlite3 import Error
+import argparse
+import logging
+from estrategiamomento_instrumentacion import conectar, configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# prices guarda las barras mensuales que leen el backtesting y el dashboard;
+# prices_daily, con el mismo esquema, las barras diarias de las que se derivan
+# (y de las que se obtiene el panel a cualquier otra frecuencia).
+TABLA_PRECIOS = 'prices'
+TABLA_DIARIA = 'prices_daily'
+TABLAS_PRECIOS = (TABLA_PRECIOS, TABLA_DIARIA)
+# Columnas de las tablas por activo del formato anterior
+COLUMNAS_TABLA_ACTIVO = ('date', 'open', 'high', 'low', 'close', 'adj_close', 'volume')
+
+# 2. Crear Conexión a la Base de Datos
+def crear_conexion(db_file):
+    conn = None
+    try:
+        conn = conectar(db_file)
+        return conn
+    except Error as e:
+        logger.error("Error al conectar a la base de datos: %s", e)
+    return conn
+
+# 3. Esquema
+def crear_tabla_precios(conn, tabla=TABLA_PRECIOS):
+    # La clave primaria (ticker, date) sin rowid es el índice agrupado para leer
+    # series por activo; el índice (date, ticker, adj_close) cubre los cortes transversales.
+    try:
+        c = conn.cursor()
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {tabla} (
+                        ticker TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL,
+                        adj_close REAL,
+                        volume INTEGER,
+                        PRIMARY KEY (ticker, date)
+                    ) WITHOUT ROWID''')
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_date_ticker ON {tabla} (date, ticker, adj_close)")
+    except sqlite3.Error as e:
+        logger.error("Error al crear la tabla %s: %s", tabla, e)
+
+def usa_tabla_precios(conn, tabla=TABLA_PRECIOS):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (tabla,))
+    return c.fetchone() is not None
+
+def tablas_por_activo(conn):
+    """Tablas del formato anterior (una por activo): las que tienen el esquema de
+    precios (date, open, ..., volume) sin columna ticker. Así no se confunden con
+    un activo las tablas auxiliares como fetch_state."""
+    c = conn.cursor()
+    c.execute(f"""SELECT m.name FROM sqlite_master m
+                  WHERE m.type='table' AND m.name NOT LIKE 'sqlite_%'
+                    AND m.name NOT IN ({', '.join('?' * len(TABLAS_PRECIOS))})
+                    AND (SELECT COUNT(*) FROM pragma_table_info(m.name) p
+                         WHERE p.name IN ({', '.join('?' * len(COLUMNAS_TABLA_ACTIVO))})) = ?
+                    AND NOT EXISTS (SELECT 1 FROM pragma_table_info(m.name) p WHERE p.name = 'ticker')
+                  ORDER BY m.name""",
+              (*TABLAS_PRECIOS, *COLUMNAS_TABLA_ACTIVO, len(COLUMNAS_TABLA_ACTIVO)))
+    return [row[0] for row in c.fetchall()]
+
+# 4. Migración desde Tablas por Activo
+def migrar_base_datos(conn, eliminar_tablas=False):
+    """Copia todas las tablas por activo a prices en una única transacción.
+    Devuelve el número de filas copiadas."""
+    tablas = tablas_por_activo(conn)
+    crear_tabla_precios(conn)
+    filas = 0
+    try:
+        c = conn.cursor()
+        for tabla in tablas:
+            c.execute(f'''INSERT OR IGNORE INTO prices (ticker, date, open, high, low, close, adj_close, volume)
+                          SELECT ?, date, open, high, low, close, adj_close, volume FROM {tabla}''', (tabla,))
+            filas += c.rowcount
+            logger.info("Migrado %s: %d filas", tabla, c.rowcount)
+            if eliminar_tablas:
+                c.execute(f"DROP TABLE {tabla}")
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error("Error al migrar la base de datos, se deshacen los cambios: %s", e)
+        conn.rollback()
+        return 0
+    return filas
+
+# 5. Lecturas
+def obtener_tickers(conn):
+    if not usa_tabla_precios(conn):
+        return tablas_por_activo(conn)
+    c = conn.cursor()
+    c.execute("SELECT DISTINCT ticker FROM prices ORDER BY ticker")
+    return [row[0] for row in c.fetchall()]
+
+def ultimas_fechas(conn, tabla=TABLA_PRECIOS):
+    """MAX(date) de todos los activos en una sola consulta: {ticker: 'YYYY-MM-DD'}."""
+    c = conn.cursor()
+    c.execute(f"SELECT ticker, MAX(date) FROM {tabla} GROUP BY ticker ORDER BY ticker")
+    return dict(c.fetchall())
+
+def leer_corte_transversal(conn, fecha, activos=None, columnas=('adj_close',)):
+    """Precios de todos los activos (o de `activos`) en `fecha`, indexados por
+    ticker, con una sola consulta sobre el índice (date, ticker)."""
+    query = f"SELECT ticker, {', '.join(columnas)} FROM prices WHERE date = ?"
+    params = [pd.Timestamp(fecha).strftime('%Y-%m-%d')]
+    if activos is not None:
+        query += f" AND ticker IN ({', '.join('?' * len(activos))})"
+        params += list(activos)
+    return pd.read_sql_query(query, conn, params=params).set_index('ticker')
+
+def leer_panel(conn, activos=None, fecha_inicio=None, fecha_fin=None, columna='adj_close', tabla=TABLA_PRECIOS):
+    """Matriz fechas x activos de `columna` con una sola consulta."""
+    condiciones, params = [], []
+    if activos is not None:
+        condiciones.append(f"ticker IN ({', '.join('?' * len(activos))})")
+        params += list(activos)
+    if fecha_inicio is not None:
+        condiciones.append("date >= ?")
+        params.append(pd.Timestamp(fecha_inicio).strftime('%Y-%m-%d'))
+    if fecha_fin is not None:
+        condiciones.append("date <= ?")
+        params.append(pd.Timestamp(fecha_fin).strftime('%Y-%m-%d'))
+    query = f"SELECT ticker, date, {columna} FROM {tabla}"
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    df = pd.read_sql_query(query, conn, params=params)
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    panel = df.pivot(index='date', columns='ticker', values=columna).sort_index()
+    panel.columns.name = None
+    if activos is not None:
+        panel = panel.reindex(columns=list(activos))
+    return panel.astype(float) if columna != 'volume' else panel
+
+# 6. Main
+def main():
+    parser = argparse.ArgumentParser(description="Almacenamiento de precios en la tabla larga prices")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    migrar = subparsers.add_parser('migrar', help="Convierte una base de datos con una tabla por activo")
+    migrar.add_argument('db_file')
+    migrar.add_argument('--eliminar-tablas', action='store_true', help="Borra las tablas por activo tras copiarlas")
+    estado = subparsers.add_parser('estado', help="Muestra la última fecha de cada activo")
+    estado.add_argument('db_file')
+    args = parser.parse_args()
+    configurar_logging()
+
+    if args.comando == 'estado':
+        conn = crear_conexion(args.db_file)
+        if conn is None:
+            return
+        for ticker, fecha in ultimas_fechas(conn).items():
+            print(f"{ticker}: {fecha}")
+        conn.close()
+    elif args.comando == 'migrar':
+        conn = crear_conexion(args.db_file)
+        if conn is None:
+            return
+        filas = migrar_base_datos(conn, eliminar_tablas=args.eliminar_tablas)
+        if args.eliminar_tablas:
+            conn.execute("VACUUM")
+        conn.close()
+        print(f"Migración completada: {filas} filas en prices")
+
+if __name__ == '__main__':
+    main()
@@ -3,36 +3,54 @@ import pandas as pd
 import numpy as np
 import sqlite3
 from sqlite3 import Error
-from datetime import datetime
+from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from google.colab import drive
+from concurrent.futures import ProcessPoolExecutor
 import os
-import gspread
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import logging
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado, seleccion_greedy
+from estrategiamomento_panelprecios import obtener_panel, instalar_panel
+from estrategiamomento_metricas import MetricasAcumuladas, columnas_metricas
+from estrategiamomento_correlaciones import obtener_correlaciones, registrar_correlaciones
+from estrategiamomento_memoriacompartida import panel_compartido
+from estrategiamomento_incremental import backtesting_incremental, ruta_estado, registrar_publicacion
+from estrategiamomento_instrumentacion import (
+    conectar, tramo, medir, configurar_logging, esta_activa, extraer_traza, incorporar_traza,
+    reiniciar as reiniciar_traza
+)
+from estrategiamomento_resultados import escribir_resultados, ruta_resultados
+from estrategiamomento_publicacion import publicar_resultados, llamar_con_reintentos
+
+logger = logging.getLogger(__name__)
 
 # 2. Montar Google Drive y Configurar Credenciales
 def montar_drive():
+    from google.colab import drive
     drive.mount('/content/drive', force_remount=True)
     output_dir = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento'
     os.makedirs(output_dir, exist_ok=True)
-    print(f"Directorio de salida: {output_dir}")
+    logger.info("Directorio de salida: %s", output_dir)
     return output_dir
 
+# Las librerías de Google solo se importan al publicar, para poder ejecutar el
+# backtesting (y sus benchmarks) sin tenerlas instaladas
 def autenticar_google_sheets(creds_file):
+    import gspread
+    from google.oauth2.service_account import Credentials
     try:
         scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
         creds = Credentials.from_service_account_file(creds_file, scopes=scopes)
         client = gspread.authorize(creds)
-        print("Autenticación exitosa con Google Sheets")
+        logger.info("Autenticación exitosa con Google Sheets")
         return client, creds
     except Exception as e:
-        print(f"Error al autenticar con Google Sheets: {e}")
+        logger.error("Error al autenticar con Google Sheets: %s", e)
         return None, None
 
 # 3. Obtener o Crear Carpeta en Google Drive
 def obtener_o_crear_carpeta(creds, folder_path, parent_folder='root'):
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
     try:
         drive_service = build('drive', 'v3', credentials=creds)
         folder_name = folder_path.split('/')[-1]
@@ -49,7 +67,7 @@ def obtener_o_crear_carpeta(creds, folder_path, parent_folder='root'):
         folders = response.get('files', [])
         if folders:
             folder_id = folders[0]['id']
-            print(f"Carpeta encontrada: {folder_name}, ID: {folder_id}")
+            logger.info("Carpeta encontrada: %s, ID: %s", folder_name, folder_id)
             return folder_id
         
         # Crear la carpeta si no existe
@@ -63,20 +81,20 @@ def obtener_o_crear_carpeta(creds, folder_path, parent_folder='root'):
             fields='id'
         ).execute()
         folder_id = folder.get('id')
-        print(f"Carpeta creada: {folder_name}, ID: {folder_id}")
+        logger.info("Carpeta creada: %s, ID: %s", folder_name, folder_id)
         return folder_id
     except HttpError as e:
-        print(f"Error al obtener o crear carpeta: {e}")
+        logger.error("Error al obtener o crear carpeta: %s", e)
         return None
 
 # 4. Crear Conexión a la Base de Datos
 def crear_conexion(db_file):
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = conectar(db_file)
         return conn
     except Error as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        logger.error("Error al conectar a la base de datos: %s", e)
     return conn
 
 # 5. Obtener Lista de Activos
@@ -102,27 +120,12 @@ def obtener_activos(db_file):
         return []
 """
 # 6. Leer Datos de un Activo
+@medir('lectura_bd')
 def leer_datos_activo(db_file, activo, fecha_inicio, fecha_fin):
-    conn = crear_conexion(db_file)
-    if conn is None:
-        return None
-    try:
-        query = f"""
-            SELECT date, adj_close AS Adj_Close
-            FROM {activo}
-            WHERE date BETWEEN ? AND ?
-            ORDER BY date
-        """
-        df = pd.read_sql_query(query, conn, params=(fecha_inicio, fecha_fin), parse_dates=['date'])
-        df.set_index('date', inplace=True)
-        conn.close()
-        return df
-    except sqlite3.Error as e:
-        print(f"Error al leer datos de {activo}: {e}")
-        conn.close()
-        return None
+    return obtener_panel(db_file).leer(activo, fecha_inicio, fecha_fin)
 
 # 7. Calcular Momentum Score
+@medir('momentum')
 def calcular_momentum(df, activo):
     try:
         if len(df) < 13:
@@ -141,10 +144,11 @@ def calcular_momentum(df, activo):
         )
         return {'activo': activo, 'momentum_score': momentum_score if np.isfinite(momentum_score) else 0.0}
     except Exception as e:
-        print(f"Error al calcular momentum para {activo}: {e}")
+        logger.error("Error al calcular momentum para %s: %s", activo, e)
         return None
 
 # 8. Calcular Volatilidades
+@medir('volatilidad')
 def calcular_volatilidad(df, activo, meses):
     try:
         if len(df) < meses:
@@ -154,7 +158,7 @@ def calcular_volatilidad(df, activo, meses):
         volatilidad = retornos.std()
         return volatilidad if np.isfinite(volatilidad) else 0.0
     except Exception as e:
-        print(f"Error al calcular volatilidad para {activo}: {e}")
+        logger.error("Error al calcular volatilidad para %s: %s", activo, e)
         return None
 
 # 9. Calcular Matriz de Correlación
@@ -169,10 +173,11 @@ def calcular_correlaciones(datos_activos, activos):
             return None
         return retornos.corr(method='pearson')
     except Exception as e:
-        print(f"Error al calcular correlaciones: {e}")
+        logger.error("Error al calcular correlaciones: %s", e)
         return None
 
 # 10. Seleccionar Activos con Métricas Detalladas
+@medir()
 def seleccionar_activos(db_file, fecha_fin, momentum_min=0.7, momentum_max=3, max_activos=3, vol_corta_meses=4, vol_larga_meses=12):
     fecha_inicio_12m = (fecha_fin - relativedelta(months=13)).strftime('%Y-%m-%d')
     fecha_inicio_4m = (fecha_fin - relativedelta(months=vol_corta_meses)).strftime('%Y-%m-%d')
@@ -180,12 +185,14 @@ def seleccionar_activos(db_file, fecha_fin, momentum_min=0.7, momentum_max=3, ma
     
     activos = obtener_activos(db_file)
     if not activos:
-        print(f"No se encontraron activos para {fecha_fin_str}")
+        logger.warning("No se encontraron activos para %s", fecha_fin_str)
         return pd.DataFrame({'fecha': [fecha_fin_str], 'activos_seleccionados': [[]]}), []
     
     datos_activos = {}
     momentum_results = []
     volatilidades = []
+    with tramo('lectura_bd'):
+        obtener_panel(db_file).precargar(activos)
     
     for activo in activos:
         df_12m = leer_datos_activo(db_file, activo, fecha_inicio_12m, fecha_fin_str)
@@ -213,7 +220,7 @@ def seleccionar_activos(db_file, fecha_fin, momentum_min=0.7, momentum_max=3, ma
             momentum_results.append(momentum_data)
     
     if not momentum_results:
-        print(f"No hay datos de momentum para {fecha_fin_str}")
+        logger.info("No hay datos de momentum para %s", fecha_fin_str)
         return pd.DataFrame({'fecha': [fecha_fin_str], 'activos_seleccionados': [[]]}), []
     
     df_volatilidades = pd.DataFrame(volatilidades)
@@ -225,46 +232,45 @@ def seleccionar_activos(db_file, fecha_fin, momentum_min=0.7, momentum_max=3, ma
     df_momentum = df_momentum[(df_momentum['momentum_score'] >= momentum_min) & (df_momentum['momentum_score'] <= momentum_max)]
     
     if df_momentum.empty:
-        print(f"No hay activos con momentum score entre {momentum_min} y {momentum_max} para {fecha_fin_str}")
+        logger.info("No hay activos con momentum score entre %s y %s para %s", momentum_min, momentum_max, fecha_fin_str)
         return pd.DataFrame({'fecha': [fecha_fin_str], 'activos_seleccionados': [[]]}), []
     
     df_momentum = df_momentum.sort_values(by='momentum_score', ascending=False)
     
-    matriz_correlacion = calcular_correlaciones(datos_activos, activos_validos)
-    seleccionados = []
-    activos_restantes = df_momentum['activo'].tolist()
+    # Correlaciones del mes leídas del tensor precalculado; solo participan los
+    # activos que entrarían en calcular_correlaciones
+    posiciones = {activo: j for j, activo in enumerate(activos)}
+    en_matriz = np.zeros(len(activos), dtype=bool)
+    en_matriz[[posiciones[activo] for activo in activos_validos if len(datos_activos[activo]) >= 12]] = True
+    with tramo('correlacion'):
+        tensor = obtener_correlaciones(db_file, activos, fecha_fin) if en_matriz.any() else None
+        if tensor is not None and fecha_fin in tensor.fechas:
+            matriz_correlacion = tensor.matriz(fecha_fin)
+        else:
+            # Fecha que no es un fin de mes del tensor: se calcula la matriz del mes como antes
+            matriz_correlacion = np.full((len(activos), len(activos)), np.nan)
+            participantes = [activo for activo in activos if en_matriz[posiciones[activo]]]
+            df_correlacion = calcular_correlaciones(datos_activos, participantes) if participantes else None
+            if df_correlacion is None:
+                en_matriz[:] = False
+            else:
+                indices = [posiciones[activo] for activo in df_correlacion.columns]
+                matriz_correlacion[np.ix_(indices, indices)] = df_correlacion.to_numpy(dtype=float)
+                en_matriz[:] = False
+                en_matriz[indices] = True
     metricas_por_activo = []
     
-    if activos_restantes:
-        primer_activo = df_momentum.iloc[0]['activo']
-        seleccionados.append(primer_activo)
-        activos_restantes.remove(primer_activo)
-    
-    while len(seleccionados) < max_activos and activos_restantes:
-        mejor_activo = None
-        menor_correlacion_promedio = float('inf')
-        
-        for candidato in activos_restantes:
-            if matriz_correlacion is not None and candidato in matriz_correlacion.columns:
-                correlaciones = [matriz_correlacion.loc[candidato, seleccionado] for seleccionado in seleccionados if seleccionado in matriz_correlacion.index]
-                if correlaciones:
-                    correlacion_promedio = np.mean(correlaciones)
-                    if correlacion_promedio < menor_correlacion_promedio:
-                        menor_correlacion_promedio = correlacion_promedio
-                        mejor_activo = candidato
-        if mejor_activo:
-            seleccionados.append(mejor_activo)
-            activos_restantes.remove(mejor_activo)
-        else:
-            break
+    orden = [posiciones[activo] for activo in df_momentum['activo']]
+    with tramo('seleccion_greedy'):
+        seleccionados = [activos[j] for j in seleccion_greedy(orden, matriz_correlacion, en_matriz, max_activos)]
     
     # Calcular métricas por activo seleccionado
     for activo in seleccionados:
         momentum = df_momentum[df_momentum['activo'] == activo]['momentum_score'].iloc[0] if not df_momentum[df_momentum['activo'] == activo].empty else 0.0
         vol_corta = df_volatilidades[df_volatilidades['activo'] == activo]['vol_corta'].iloc[0] if not df_volatilidades[df_volatilidades['activo'] == activo].empty else 0.0
         vol_larga = df_volatilidades[df_volatilidades['activo'] == activo]['vol_larga'].iloc[0] if not df_volatilidades[df_volatilidades['activo'] == activo].empty else 0.0
-        correlaciones = [matriz_correlacion.loc[activo, otro] for otro in seleccionados if otro != activo and matriz_correlacion is not None and activo in matriz_correlacion.index and otro in matriz_correlacion.columns]
-        correlacion_promedio = np.mean(correlaciones) if correlaciones else 0.0
+        otros = [posiciones[otro] for otro in seleccionados if otro != activo and en_matriz[posiciones[activo]] and en_matriz[posiciones[otro]]]
+        correlacion_promedio = np.mean(matriz_correlacion[posiciones[activo], otros]) if otros else 0.0
         metricas_por_activo.append({
             'fecha': fecha_fin_str,
             'activo': activo,
@@ -277,6 +283,7 @@ def seleccionar_activos(db_file, fecha_fin, momentum_min=0.7, momentum_max=3, ma
     return pd.DataFrame({'fecha': [fecha_fin_str], 'activos_seleccionados': [seleccionados]}), metricas_por_activo
 
 # 11. Calcular Retorno del Portafolio con Detalles
+@medir('retorno_portafolio')
 def calcular_retorno_portafolio(db_file, activos_seleccionados, fecha_anterior, fecha_actual, capital, comision=0.0025):
     if not activos_seleccionados:
         return 0.0, []
@@ -286,11 +293,15 @@ def calcular_retorno_portafolio(db_file, activos_seleccionados, fecha_anterior,
     num_activos = len(activos_seleccionados)
     capital_por_activo = capital / num_activos if num_activos > 0 else 0
     
+    # Precios de compra y venta: los cortes transversales de los dos fines de mes
+    panel = obtener_panel(db_file)
+    with tramo('lectura_bd'):
+        precios_compra = panel.corte(fecha_anterior, activos_seleccionados)
+        precios_venta = panel.corte(fecha_actual, activos_seleccionados)
     for activo in activos_seleccionados:
-        df = leer_datos_activo(db_file, activo, fecha_anterior.strftime('%Y-%m-%d'), fecha_actual.strftime('%Y-%m-%d'))
-        if df is not None and len(df) >= 2:
-            precio_compra = df['Adj_Close'].iloc[-2]
-            precio_venta = df['Adj_Close'].iloc[-1]
+        if activo in precios_compra.index and activo in precios_venta.index:
+            precio_compra = precios_compra[activo]
+            precio_venta = precios_venta[activo]
             retorno = (precio_venta / precio_compra) - 1 if precio_compra > 0 else 0.0
             cantidad_activos = capital_por_activo / precio_compra if precio_compra > 0 else 0.0
             retornos.append(retorno)
@@ -321,47 +332,114 @@ def calcular_metricas(capital_inicial, capital_final, retornos_mensuales, años)
     return sharpe if np.isfinite(sharpe) else 0.0, volatilidad_anualizada if np.isfinite(volatilidad_anualizada) else 0.0, cagr if np.isfinite(cagr) else 0.0
 
 # 13. Backtesting con Métricas
-def backtesting_selecciones_con_metricas(db_file, inicio, fin, capital_inicial=10000):
+# La selección y el retorno de cada mes solo dependen de los precios hasta el mes
+# siguiente, no del capital: con procesos > 1 (o None, todos los núcleos) se
+# calculan en paralelo (lotes de meses en un pool de procesos) y al final una
+# pasada secuencial, barata, compone el capital y las métricas. Por defecto se
+# usa un solo proceso: con pocos núcleos el arranque del pool cuesta más de lo
+# que ahorra. El proceso padre publica el panel de precios en memoria compartida
+# (estrategiamomento_memoriacompartida) y calcula una vez el tensor de
+# correlaciones; los procesos leen los precios del panel compartido, sin abrir la
+# base de datos ni copiar las matrices. Los tramos y contadores de instrumentación
+# de cada lote vuelven con sus resultados y se añaden a la traza del padre.
+def _inicializar_proceso(db_file, entradas, activos, tensor):
+    # Con fork el trabajador hereda los tramos ya registrados por el padre
+    reiniciar_traza()
+    # Sin panel compartido (bases con una tabla por activo) los históricos llegan en `entradas`
+    if entradas is not None:
+        instalar_panel(db_file, entradas)
+    if tensor is not None:
+        registrar_correlaciones(db_file, activos, tensor)
+
+def _procesar_meses(db_file, meses):
+    """(activos seleccionados o None, métricas por activo, retorno, detalles) de
+    cada (fecha, fecha_siguiente). Las cantidades de los detalles se calculan en la
+    pasada secuencial, cuando se conoce el capital."""
+    resultados = []
+    for fecha, fecha_siguiente in meses:
+        logger.info("Procesando selecciones para %s...", fecha.strftime('%Y-%m-%d'))
+        seleccion, metricas_por_activo = seleccionar_activos(db_file, fecha, momentum_min=0.7, momentum_max=3, max_activos=3, vol_corta_meses=4, vol_larga_meses=12)
+        if seleccion is None or seleccion.empty:
+            resultados.append((None, [], 0.0, []))
+            continue
+        activos_seleccionados = seleccion.iloc[0]['activos_seleccionados']
+        retorno_mensual, detalles_activos = calcular_retorno_portafolio(db_file, activos_seleccionados, fecha, fecha_siguiente, 0.0)
+        resultados.append((activos_seleccionados, metricas_por_activo, retorno_mensual, detalles_activos))
+    return resultados
+
+def _procesar_lote(db_file, meses):
+    resultados = _procesar_meses(db_file, meses)
+    return resultados, extraer_traza() if esta_activa() else None
+
+def _contexto_procesos():
+    import multiprocessing
+    return multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+@medir()
+def backtesting_selecciones_con_metricas(db_file, inicio, fin, capital_inicial=10000, procesos=1):
     fechas = pd.date_range(start=inicio, end=fin, freq='ME')
+    meses = list(zip(fechas[:-1], fechas[1:]))
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(meses)))
+    
+    if procesos == 1:
+        resultados = _procesar_meses(db_file, meses)
+    else:
+        activos = obtener_activos(db_file)
+        with tramo('correlacion'):
+            tensor = obtener_correlaciones(db_file, activos, fechas[-2])
+        tamaño_lote = max(1, -(-len(meses) // (procesos * 4)))
+        lotes = [meses[k:k + tamaño_lote] for k in range(0, len(meses), tamaño_lote)]
+        logger.info("Procesando %d meses en %d lotes con %d procesos", len(meses), len(lotes), procesos)
+        with panel_compartido(db_file, activos) as descriptor:
+            if descriptor is not None:
+                db_trabajo, entradas = descriptor['ruta'], None
+            else:
+                db_trabajo = db_file
+                with tramo('lectura_bd'):
+                    entradas = obtener_panel(db_file).instantanea(activos)
+            with ProcessPoolExecutor(max_workers=procesos, mp_context=_contexto_procesos(),
+                                     initializer=_inicializar_proceso,
+                                     initargs=(db_trabajo, entradas, activos, tensor)) as executor:
+                resultados = []
+                for lote, traza in executor.map(_procesar_lote, [db_trabajo] * len(lotes), lotes):
+                    resultados.extend(lote)
+                    incorporar_traza(traza)
+    
     selecciones = []
     metricas_activos = []
     capital = capital_inicial
-    retornos_mensuales = []
+    # Estadísticas acumuladas: cada mes cuesta O(1) en lugar de recorrer todo el histórico
+    acumulador = MetricasAcumuladas(capital_inicial)
     
-    for i, fecha in enumerate(fechas[:-1]):
-        fecha_siguiente = fechas[i + 1]
-        print(f"Procesando selecciones para {fecha.strftime('%Y-%m-%d')}...")
-        
-        seleccion, metricas_por_activo = seleccionar_activos(db_file, fecha, momentum_min=0.7, momentum_max=3, max_activos=3, vol_corta_meses=4, vol_larga_meses=12)
-        if seleccion is None or seleccion.empty:
+    for (fecha, _), (activos_seleccionados, metricas_por_activo, retorno_mensual, detalles_activos) in zip(meses, resultados):
+        if activos_seleccionados is None:
             selecciones.append({
                 'fecha': fecha.strftime('%Y-%m-%d'),
                 'activos_seleccionados': [],
                 'rentabilidad_mensual': 0.0,
                 'capitalizacion_final': capital,
-                'sharpe': 0.0,
-                'volatilidad_final': 0.0,
-                'cagr': 0.0
+                **dict.fromkeys(columnas_metricas(), 0.0)
             })
-            retornos_mensuales.append(0.0)
+            acumulador.añadir_retorno(0.0)
             continue
         
-        activos_seleccionados = seleccion.iloc[0]['activos_seleccionados']
-        retorno_mensual, detalles_activos = calcular_retorno_portafolio(db_file, activos_seleccionados, fecha, fecha_siguiente, capital)
+        # Cantidades compradas con el capital del inicio del mes (como en calcular_retorno_portafolio)
+        capital_por_activo = capital / len(activos_seleccionados) if activos_seleccionados else 0
+        for detalle in detalles_activos:
+            detalle['cantidad_activos'] = capital_por_activo / detalle['precio_compra'] if detalle['precio_compra'] > 0 else 0.0
         capital *= (1 + retorno_mensual)
         años = (fecha - inicio).days / 365.25
-        sharpe, volatilidad_final, cagr = calcular_metricas(capital_inicial, capital, retornos_mensuales, años)
+        acumulador.actualizar_capital(capital)
+        metricas = acumulador.metricas(años)
         
         selecciones.append({
             'fecha': fecha.strftime('%Y-%m-%d'),
             'activos_seleccionados': activos_seleccionados,
             'rentabilidad_mensual': retorno_mensual,
             'capitalizacion_final': capital,
-            'sharpe': sharpe,
-            'volatilidad_final': volatilidad_final,
-            'cagr': cagr
+            **metricas
         })
-        retornos_mensuales.append(retorno_mensual)
+        acumulador.añadir_retorno(retorno_mensual)
         
         # Combinar métricas por activo con detalles de retorno
         for metricas in metricas_por_activo:
@@ -379,56 +457,70 @@ def backtesting_selecciones_con_metricas(db_file, inicio, fin, capital_inicial=1
     df_metricas_activos = pd.DataFrame(metricas_activos)
     return df_selecciones, df_metricas_activos
 
-# 14. Limpiar DataFrames
-def limpiar_dataframe(df):
-    # Reemplazar NaN, inf, -inf con 0.0 para columnas numéricas
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    df[numeric_cols] = df[numeric_cols].replace([np.inf, -np.inf], 0.0).fillna(0.0)
-    # Convertir listas a cadenas y reemplazar None con cadena vacía
-    for col in df.columns:
-        if df[col].apply(lambda x: isinstance(x, list)).any():
-            df[col] = df[col].apply(str)
-        if df[col].isna().any():
-            df[col] = df[col].fillna('')
-    print(f"DataFrame limpiado. Resumen:\n{df.head()}")
-    return df
+# 14. Verificar Paridad entre el Motor Vectorizado y el Bucle Mensual
+def verificar_paridad(db_file, inicio, fin, tolerancia=1e-9):
+    df_sel_bucle, df_met_bucle = backtesting_selecciones_con_metricas(db_file, inicio, fin)
+    df_sel_vect, df_met_vect = backtesting_vectorizado(db_file, inicio, fin, activos=obtener_activos(db_file))
+    diferencias = []
+    for nombre, bucle, vect in [('selecciones', df_sel_bucle, df_sel_vect), ('metricas_activos', df_met_bucle, df_met_vect)]:
+        if list(bucle.columns) != list(vect.columns) or len(bucle) != len(vect):
+            diferencias.append(f"{nombre}: forma distinta {bucle.shape} vs {vect.shape}")
+            continue
+        for col in bucle.columns:
+            if pd.api.types.is_numeric_dtype(bucle[col]):
+                if not np.allclose(bucle[col].astype(float), vect[col].astype(float), rtol=tolerancia, atol=tolerancia, equal_nan=True):
+                    diferencias.append(f"{nombre}: columna '{col}' difiere")
+            elif bucle[col].tolist() != vect[col].tolist():
+                diferencias.append(f"{nombre}: columna '{col}' difiere")
+    if diferencias:
+        logger.warning("Diferencias entre bucle mensual y motor vectorizado:\n%s", "\n".join(diferencias))
+    else:
+        logger.info("Motor vectorizado y bucle mensual producen los mismos resultados")
+    return not diferencias
+
+# 15. Publicar en Google Sheets
+# Los resultados se publican siempre en la misma hoja: la configurada en
+# ESTRATEGIAMOMENTO_SPREADSHEET o, si no, la registrada en el estado incremental.
+# Solo se crea una hoja nueva cuando no hay ninguna, y en ella solo se escriben
+# las filas que cambian (ver estrategiamomento_publicacion).
+VARIABLE_SPREADSHEET = 'ESTRATEGIAMOMENTO_SPREADSHEET'
+
+def crear_google_sheets(client, creds):
+    # Obtener o crear la carpeta en Google Drive
+    folder_path = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento'
+    folder_id = obtener_o_crear_carpeta(creds, folder_path)
+    if folder_id is None:
+        logger.warning("No se pudo obtener o crear la carpeta. Creando en la raíz de Drive.")
+
+    # Crear la hoja
+    spreadsheet = client.create('Momentum_Estrategia_20y', folder_id=folder_id)
+    spreadsheet.share('', perm_type='anyone', role='writer')
+    logger.info("Hoja creada: %s, URL: %s", spreadsheet.title, spreadsheet.url)
+    return spreadsheet
 
-# 15. Escribir en Google Sheets
-def escribir_google_sheets(df_selecciones, df_metricas_activos, client, creds, output_dir):
+# 16. Escribir en Google Sheets
+@medir('sheets_escritura')
+def escribir_google_sheets(df_selecciones, df_metricas_activos, client, creds, spreadsheet_url=None):
+    """Publica los resultados en `spreadsheet_url` (o en una hoja nueva) y devuelve
+    su URL, o None si falla."""
     try:
-        # Limpiar DataFrames
-        df_selecciones = limpiar_dataframe(df_selecciones)
-        df_metricas_activos = limpiar_dataframe(df_metricas_activos)
-        
-        # Obtener o crear la carpeta en Google Drive
-        folder_path = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento'
-        folder_id = obtener_o_crear_carpeta(creds, folder_path)
-        if folder_id is None:
-            print("No se pudo obtener o crear la carpeta. Creando en la raíz de Drive.")
-        
-        # Crear la hoja
-        spreadsheet = client.create('Momentum_Estrategia_20y', folder_id=folder_id)
-        spreadsheet.share('', perm_type='anyone', role='writer')
-        print(f"Hoja creada: {spreadsheet.title}, URL: {spreadsheet.url}")
-        
-        # Pestaña Por Mes
-        worksheet_mes = spreadsheet.worksheet('Sheet1')
-        worksheet_mes.update_title('Por Mes')
-        worksheet_mes.update([df_selecciones.columns.values.tolist()] + df_selecciones.values.tolist())
-        
-        # Pestaña Por Activo
-        worksheet_activo = spreadsheet.add_worksheet(title='Por Activo', rows=len(df_metricas_activos) + 1, cols=len(df_metricas_activos.columns))
-        worksheet_activo.update([df_metricas_activos.columns.values.tolist()] + df_metricas_activos.values.tolist())
-        
-        print("Datos escritos en Google Sheets")
+        if spreadsheet_url is None:
+            spreadsheet = crear_google_sheets(client, creds)
+        else:
+            spreadsheet = llamar_con_reintentos(client.open_by_url, spreadsheet_url)
+        filas = publicar_resultados(spreadsheet, df_selecciones, df_metricas_activos)
+        logger.info("Datos escritos en Google Sheets: %s", filas)
+        return spreadsheet.url
     except Exception as e:
-        print(f"Error al escribir en Google Sheets: {e}")
+        logger.error("Error al escribir en Google Sheets: %s", e)
+        return None
 
-# 16. Main
+# 17. Main
 def main():
+    configurar_logging()
     db_file = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento/precios_activos_mensual.db'
     creds_file = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento/importfromapi-c1f7294cbbea.json'
-    output_dir = montar_drive()
+    montar_drive()
     
     # Autenticar con Google Sheets
     client, creds = autenticar_google_sheets(creds_file)
@@ -436,18 +528,34 @@ def main():
         return
     
     inicio = datetime(2005, 5, 31)
-    fin = datetime(2025, 4, 30)
+    # Último día del mes completo más reciente (el mismo que usa el cargador de precios)
+    hoy = datetime.today()
+    fin = (hoy.replace(day=1) - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
     
-    print(f"Ejecutando backtesting desde {inicio.strftime('%Y-%m-%d')} hasta {fin.strftime('%Y-%m-%d')}...")
+    logger.info("Ejecutando backtesting desde %s hasta %s...", inicio.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'))
     
-    df_selecciones, df_metricas_activos = backtesting_selecciones_con_metricas(db_file, inicio, fin)
+    # Solo se calculan los meses posteriores al último guardado en el estado
+    directorio_estado = ruta_estado(db_file)
+    df_selecciones, df_metricas_activos, resumen = backtesting_incremental(db_file, inicio, fin, directorio_estado,
+                                                                           activos=obtener_activos(db_file))
     
     if not df_selecciones.empty:
-        escribir_google_sheets(df_selecciones, df_metricas_activos, client, creds, output_dir)
-        print("\nPrimeras filas de selecciones mensuales:\n", df_selecciones.head())
-        print("\nPrimeras filas de métricas por activo:\n", df_metricas_activos.head())
+        # Artefacto local que el dashboard puede leer sin pasar por Google Sheets
+        try:
+            escribir_resultados(df_selecciones, df_metricas_activos, ruta_resultados(db_file))
+        except (ImportError, OSError) as e:
+            logger.warning("No se pudo escribir el artefacto de resultados: %s", e)
+        spreadsheet_url = os.environ.get(VARIABLE_SPREADSHEET) or resumen['spreadsheet_url']
+        if resumen['publicacion_pendiente'] or spreadsheet_url != resumen['spreadsheet_url']:
+            # Si falla, la publicación sigue pendiente y se reintenta en la próxima ejecución
+            spreadsheet_url = escribir_google_sheets(df_selecciones, df_metricas_activos, client, creds,
+                                                     spreadsheet_url)
+            if spreadsheet_url is not None:
+                registrar_publicacion(directorio_estado, spreadsheet_url)
+        logger.info("Primeras filas de selecciones mensuales:\n%s", df_selecciones.head())
+        logger.info("Primeras filas de métricas por activo:\n%s", df_metricas_activos.head())
     else:
-        print("No se generaron selecciones")
+        logger.warning("No se generaron selecciones")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,504 @@
+# BACKTESTING VECTORIZADO SOBRE PANEL DE PRECIOS (FECHAS x ACTIVOS)
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+from sqlite3 import Error
+from datetime import datetime
+import time
+import logging
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_paneldiario import obtener_panel_diario, regla_frecuencia, PERIODOS_POR_AÑO
+from estrategiamomento_almacen import obtener_tickers
+from estrategiamomento_columnar import es_almacen_columnar, leer_activos_columnar, leer_panel_columnar
+from estrategiamomento_metricas import metricas_serie
+from estrategiamomento_instrumentacion import conectar, tramo, medir, configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# Meses de la ventana de momentum/correlación (fecha_fin - 13 meses, ambos extremos incluidos)
+MESES_VENTANA_12M = 13
+# Pesos de los retornos de 1, 3, 6 y 12 meses en el momentum score
+PESOS_MOMENTUM = (12, 4, 2, 1)
+# Claves de preparar_datos indexadas por mes del backtest
+MESES_DATOS = ['fechas_meses', 'meses', 'compra', 'venta', 'retorno_activo', 'con_precio', 'años']
+
+# 2. Crear Conexión a la Base de Datos
+def crear_conexion(db_file):
+    conn = None
+    try:
+        conn = conectar(db_file)
+        return conn
+    except Error as e:
+        logger.error("Error al conectar a la base de datos: %s", e)
+    return conn
+
+# 3. Obtener Lista de Activos
+def obtener_activos(db_file):
+    if es_almacen_columnar(db_file):
+        return leer_activos_columnar(db_file)
+    conn = crear_conexion(db_file)
+    if conn is None:
+        return []
+    try:
+        activos = obtener_tickers(conn)
+        conn.close()
+        return activos
+    except sqlite3.Error as e:
+        logger.error("Error al obtener activos: %s", e)
+        conn.close()
+        return []
+
+# 4. Cargar Panel de Precios Ajustados
+@medir('lectura_bd')
+def cargar_panel_precios(db_file, activos):
+    """Histórico completo de cada activo (leído una sola vez a través del panel
+    compartido) como matriz fechas x activos sobre un índice contiguo de fines de
+    mes, con NaN donde el activo no tiene dato. Con un almacén columnar la
+    matriz se lee directamente del fichero mapeado en memoria."""
+    if es_almacen_columnar(db_file):
+        panel = leer_panel_columnar(db_file, activos=activos)
+        fechas = pd.date_range(start=panel.index.min(), end=panel.index.max(), freq='ME')
+        return panel.reindex(fechas)
+    panel_precios = obtener_panel(db_file)
+    disponibles = set(obtener_activos(db_file))
+    panel_precios.precargar([activo for activo in activos if activo in disponibles])
+    series = {}
+    for activo in activos:
+        if activo not in disponibles:
+            logger.warning("No hay datos para %s, se omite del panel", activo)
+            continue
+        df = panel_precios.historico(activo)
+        if df is None:
+            return None
+        series[activo] = df['Adj_Close']
+
+    panel = pd.DataFrame(series, columns=activos, dtype=float)
+    if panel.empty:
+        return panel
+    fechas = pd.date_range(start=panel.index.min(), end=panel.index.max(), freq='ME')
+    return panel.reindex(fechas)
+
+# 5. Posiciones Comprimidas por Activo
+def comprimir_panel(precios):
+    """Replica el acceso posicional (iloc) de leer_datos_activo: para cada activo
+    guarda sus filas válidas consecutivas y el conteo acumulado de filas por fecha,
+    de forma que una ventana [fecha_inicio, fecha_fin] son las posiciones
+    conteo[inicio] .. conteo[fin + 1] - 1."""
+    validos = ~np.isnan(precios)
+    num_fechas, num_activos = precios.shape
+    conteo = np.zeros((num_fechas + 1, num_activos), dtype=np.int64)
+    np.cumsum(validos, axis=0, out=conteo[1:])
+    filas, columnas = np.nonzero(validos)
+    comprimido = np.full((max(int(conteo[-1].max()), 1), num_activos), np.nan)
+    comprimido[conteo[filas + 1, columnas] - 1, columnas] = precios[filas, columnas]
+    retornos = np.full_like(comprimido, np.nan)
+    retornos[1:] = comprimido[1:] / comprimido[:-1] - 1
+    return validos, conteo, comprimido, retornos
+
+def _tomar(matriz, posiciones, mascara):
+    columnas = np.arange(matriz.shape[1])
+    valores = matriz[np.clip(posiciones, 0, matriz.shape[0] - 1), columnas]
+    return np.where(mascara, valores, np.nan)
+
+def _desviacion(valores, mascara):
+    # Desviación estándar muestral en dos pasadas (igual que Series.std)
+    n = mascara.sum(axis=1)
+    x = np.where(mascara, valores, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = x.sum(axis=1) / n
+        dif = np.where(mascara, valores - media[:, None, :], 0.0)
+        var = (dif * dif).sum(axis=1) / (n - 1)
+    return np.where(n >= 2, np.sqrt(var), np.nan)
+
+# 6. Calcular Volatilidades para Todos los Meses
+@medir('volatilidad')
+def calcular_indicadores(conteo, retornos, indices, vol_corta_meses=4, vol_larga_meses=12):
+    """Volatilidad corta/larga y disponibilidad de cada activo en cada mes de
+    `indices` (posiciones en el panel), como matrices meses x activos."""
+    t = np.asarray(indices)
+    fin = conteo[t + 1]
+    ultima = fin - 1
+    inicio_12m = conteo[np.maximum(t - MESES_VENTANA_12M, 0)]
+    inicio_corta = conteo[np.maximum(t - vol_corta_meses, 0)]
+    filas_12m = fin - inicio_12m
+    filas_corta = fin - inicio_corta
+
+    def volatilidad(inicio, meses):
+        desfases = np.arange(meses)[None, :, None]
+        posiciones = ultima[:, None, :] - desfases
+        mascara = posiciones >= inicio[:, None, :] + 1
+        valores = retornos[np.clip(posiciones, 0, retornos.shape[0] - 1), np.arange(retornos.shape[1])]
+        vol = _desviacion(valores, mascara)
+        return np.where(np.isfinite(vol), vol, 0.0)
+
+    vol_corta = volatilidad(inicio_corta, vol_corta_meses)
+    vol_larga = volatilidad(inicio_12m, vol_larga_meses)
+    # Un activo entra en el cálculo si tiene filas en ambas ventanas y suficientes para ambas volatilidades
+    disponible = (filas_12m > 0) & (filas_corta >= max(vol_corta_meses, 1)) & (filas_12m >= vol_larga_meses)
+
+    return {
+        'vol_corta': vol_corta,
+        'vol_larga': vol_larga,
+        'disponible': disponible,
+        'filas_12m': filas_12m
+    }
+
+# 7. Calcular Momentum para Todos los Meses
+@medir('momentum')
+def calcular_momentum_panel(conteo, comprimido, indices, pesos_momentum=PESOS_MOMENTUM):
+    """Momentum score de calcular_momentum para cada mes y activo. Los pesos se
+    aplican a los retornos de 1, 3, 6 y 12 meses y su suma se resta al final, de
+    modo que un activo sin variación tiene score 0. NaN si hay menos de 13 filas."""
+    t = np.asarray(indices)
+    fin = conteo[t + 1]
+    ultima = fin - 1
+    tiene_momentum = fin - conteo[np.maximum(t - MESES_VENTANA_12M, 0)] >= 13
+    peso_1m, peso_3m, peso_6m, peso_12m = pesos_momentum
+    p0 = _tomar(comprimido, ultima, tiene_momentum)
+    p1 = _tomar(comprimido, ultima - 1, tiene_momentum)
+    p3 = _tomar(comprimido, ultima - 3, tiene_momentum)
+    p6 = _tomar(comprimido, ultima - 6, tiene_momentum)
+    p12 = _tomar(comprimido, ultima - 12, tiene_momentum)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        momentum = (
+            peso_1m * (p0 / p1) +
+            peso_3m * (p0 / p3) +
+            peso_6m * (p0 / p6) +
+            peso_12m * (p0 / p12) -
+            sum(pesos_momentum)
+        )
+    return np.where(tiene_momentum & ~np.isfinite(momentum), 0.0, momentum), tiene_momentum
+
+# 8. Calcular Matrices de Correlación para Todos los Meses
+@medir('correlacion')
+def calcular_correlaciones_panel(validos, conteo, retornos, indices, memoria_maxima=256 * 2**20):
+    """Matriz de correlación de Pearson (meses x activos x activos) de los retornos
+    de la ventana de 13 meses que termina en cada mes, con observaciones completas
+    por pares (igual que DataFrame.corr). No depende de los parámetros de la
+    estrategia, así que se calcula una sola vez para todos los meses; los meses se
+    procesan en bloques para no superar `memoria_maxima` bytes de intermedios."""
+    t = np.asarray(indices)
+    num_activos = validos.shape[1]
+    correlacion = np.empty((len(t), num_activos, num_activos))
+    bloque = max(1, memoria_maxima // (10 * 8 * num_activos * num_activos))
+    for desde in range(0, len(t), bloque):
+        correlacion[desde:desde + bloque] = _correlaciones_bloque(validos, conteo, retornos, t[desde:desde + bloque])
+    return correlacion
+
+def _correlaciones_bloque(validos, conteo, retornos, t):
+    num_activos = validos.shape[1]
+    # Fechas de la ventana de cada mes: (meses, 14)
+    s = t[:, None] + np.arange(-MESES_VENTANA_12M, 1)
+    dentro = s >= 0
+    s = np.maximum(s, 0)
+    inicio_12m = conteo[np.maximum(t - MESES_VENTANA_12M, 0)]
+    # El primer dato de la ventana no tiene retorno (pct_change().dropna())
+    incluido = dentro[:, :, None] & validos[s] & (conteo[s + 1] - inicio_12m[:, None, :] >= 2)
+    valor = np.where(incluido, retornos[np.clip(conteo[s + 1] - 1, 0, None), np.arange(num_activos)], 0.0)
+
+    # Sumas por pares con productos de matrices sobre los retornos centrados por
+    # activo (la correlación no cambia al desplazar cada serie y así se evita la
+    # cancelación numérica de las sumas de cuadrados)
+    mascara = incluido.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = valor.sum(axis=1) / mascara.sum(axis=1)
+    x = np.where(incluido, valor - media[:, None, :], 0.0)
+    mascara_t = mascara.transpose(0, 2, 1)
+    x_t = x.transpose(0, 2, 1)
+    nobs = mascara_t @ mascara
+    suma_x = x_t @ mascara
+    suma_y = suma_x.transpose(0, 2, 1)
+    suma_xx = (x_t * x_t) @ mascara
+    suma_yy = suma_xx.transpose(0, 2, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = x_t @ x - suma_x * suma_y / nobs
+        var_x = suma_xx - suma_x * suma_x / nobs
+        var_y = suma_yy - suma_y * suma_y / nobs
+        # Series constantes: varianza nula salvo por el redondeo
+        var_x = np.where(var_x > 1e-12 * suma_xx, var_x, 0.0)
+        var_y = np.where(var_y > 1e-12 * suma_yy, var_y, 0.0)
+        divisor = np.sqrt(var_x * var_y)
+        return np.where((nobs >= 1) & (divisor != 0), cov / divisor, np.nan)
+
+# 9. Selección Greedy por Menor Correlación Promedio
+# Tras el activo de mayor momentum se añade, uno a uno, el candidato con menor
+# correlación promedio con los ya seleccionados. La suma de correlaciones de cada
+# candidato se mantiene en un vector y se actualiza con la columna del último
+# seleccionado, así cada paso es O(candidatos) en lugar de recalcular la media
+# sobre todos los seleccionados.
+def seleccion_greedy(orden, correlacion, en_matriz, max_activos):
+    """Selección de un mes: `orden` son los candidatos por momentum descendente y
+    solo los activos con `en_matriz` participan en las correlaciones."""
+    orden = np.asarray(orden)
+    seleccionados = [int(orden[0])]
+    candidatos = orden[1:][en_matriz[orden[1:]]]
+    disponibles = np.ones(len(candidatos), dtype=bool)
+    referencias = 1 if en_matriz[orden[0]] else 0
+    suma = correlacion[candidatos, orden[0]].astype(float)
+    with np.errstate(invalid='ignore'):
+        while len(seleccionados) < max_activos and referencias and disponibles.any():
+            promedios = np.where(disponibles, suma / referencias, np.inf)
+            promedios[np.isnan(promedios)] = np.inf
+            mejor = int(np.argmin(promedios))
+            if not np.isfinite(promedios[mejor]):
+                break
+            seleccionados.append(int(candidatos[mejor]))
+            disponibles[mejor] = False
+            suma += correlacion[candidatos, candidatos[mejor]]
+            referencias += 1
+    return seleccionados
+
+@medir('seleccion_greedy')
+def seleccion_greedy_lote(ordenes, validos_orden, correlacion, en_matriz, max_activos):
+    """La misma selección para muchos meses a la vez. `ordenes` (meses x K) tiene
+    los candidatos de cada mes por momentum descendente, con relleno donde
+    `validos_orden` es False; `correlacion` es (meses x activos x activos) y
+    `en_matriz` (meses x activos). Devuelve (meses x max_activos) con -1 donde no
+    hay selección."""
+    num_meses, num_candidatos = ordenes.shape
+    seleccion = np.full((num_meses, max_activos), -1, dtype=np.int64)
+    if num_candidatos == 0 or max_activos == 0:
+        return seleccion
+    filas = np.arange(num_meses)
+    activo = validos_orden[:, 0].copy()
+    primero = ordenes[:, 0]
+    seleccion[activo, 0] = primero[activo]
+    disponibles = validos_orden & en_matriz[filas[:, None], ordenes]
+    disponibles[:, 0] = False
+    referencias = (activo & en_matriz[filas, primero]).astype(np.int64)
+    suma = correlacion[filas[:, None], ordenes, primero[:, None]].astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for paso in range(1, max_activos):
+            activo &= (referencias > 0) & disponibles.any(axis=1)
+            promedios = np.where(disponibles, suma / referencias[:, None], np.inf)
+            promedios[np.isnan(promedios)] = np.inf
+            mejor = np.argmin(promedios, axis=1)
+            activo &= np.isfinite(promedios[filas, mejor])
+            if not activo.any():
+                break
+            meses, mejor = filas[activo], mejor[activo]
+            elegido = ordenes[meses, mejor]
+            seleccion[meses, paso] = elegido
+            disponibles[meses, mejor] = False
+            suma[meses] += correlacion[meses[:, None], ordenes[meses], elegido[:, None]]
+            referencias[meses] += 1
+    return seleccion
+
+# 10. Métricas Acumuladas de la Serie de Retornos
+def calcular_metricas_series(capital_inicial, capitales, retornos, años, periodos_por_año=12):
+    """Equivalente vectorizado de actualizar MetricasAcumuladas mes a mes con los
+    retornos de los meses anteriores y el capital tras el mes actual."""
+    return metricas_serie(capital_inicial, capitales, retornos, años, periodos_por_año=periodos_por_año)
+
+# 11. Preparar Datos del Panel
+def preparar_datos(db_file, inicio, fin, activos=None, panel=None, frecuencia='ME'):
+    """Panel comprimido y posiciones de las fechas del backtest; es la parte
+    común a cualquier combinación de parámetros.
+
+    Con `frecuencia` distinta de 'ME' (D, W o QE) el panel se obtiene de las
+    barras diarias (prices_daily) resampleadas a esa frecuencia, se rebalancea en
+    cada periodo y las ventanas de momentum y volatilidad cuentan periodos en
+    lugar de meses."""
+    regla = regla_frecuencia(frecuencia)
+    inicio = pd.Timestamp(inicio)
+    fechas = pd.date_range(start=inicio, end=fin, freq=regla)
+    if len(fechas) < 2:
+        return None
+
+    if panel is None:
+        if activos is None:
+            activos = obtener_activos(db_file)
+        if frecuencia == 'ME':
+            panel = cargar_panel_precios(db_file, activos)
+        else:
+            panel = obtener_panel_diario(db_file).panel(frecuencia, activos)
+        if panel is None:
+            return None
+
+    # Extender el índice del panel para cubrir todas las fechas del backtest
+    if panel.empty:
+        indice = fechas
+    else:
+        indice = pd.date_range(start=min(panel.index.min(), fechas[0]), end=max(panel.index.max(), fechas[-1]),
+                               freq=regla)
+    precios = panel.reindex(index=indice).to_numpy(dtype=float)
+    validos, conteo, comprimido, retornos = comprimir_panel(precios)
+    indices = indice.get_indexer(fechas)
+
+    # Precios de compra (mes actual) y venta (mes siguiente) para todos los meses
+    compra = precios[indices[:-1]]
+    venta = precios[indices[1:]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        retorno_activo = np.where(compra > 0, venta / compra - 1, 0.0)
+
+    return {
+        'inicio': inicio,
+        'fechas': fechas,
+        'fechas_meses': fechas[:-1].strftime('%Y-%m-%d'),
+        'activos': list(panel.columns),
+        'indice': indice,
+        'precios': precios,
+        'validos': validos,
+        'conteo': conteo,
+        'comprimido': comprimido,
+        'retornos': retornos,
+        'meses': indices[:-1],
+        'compra': compra,
+        'venta': venta,
+        'retorno_activo': retorno_activo,
+        'con_precio': validos[indices[:-1]] & validos[indices[1:]],
+        'años': np.array([(fecha - inicio).days / 365.25 for fecha in fechas[:-1]]),
+        'periodos_por_año': PERIODOS_POR_AÑO[frecuencia]
+    }
+
+def recortar_meses(datos, desde):
+    """Copia superficial de `datos` limitada a los meses a partir de la posición
+    `desde`, para calcular solo los meses nuevos de un backtest ya procesado."""
+    recorte = dict(datos)
+    for clave in MESES_DATOS + ['correlacion']:
+        if clave in datos:
+            recorte[clave] = datos[clave][desde:]
+    return recorte
+
+# 12. Calcular Características por Ventanas de Volatilidad
+def calcular_caracteristicas(datos, vol_corta_meses=4, vol_larga_meses=12):
+    ind = calcular_indicadores(datos['conteo'], datos['retornos'], datos['meses'], vol_corta_meses, vol_larga_meses)
+    filtro_vol = ind['disponible'] & (ind['vol_corta'] <= ind['vol_larga'])
+    elegibles = filtro_vol & (ind['filas_12m'] >= 12)
+    # Las correlaciones no dependen de las ventanas de volatilidad: se reutilizan si ya están en datos
+    correlacion = datos.get('correlacion')
+    if correlacion is None:
+        correlacion = calcular_correlaciones_panel(datos['validos'], datos['conteo'], datos['retornos'], datos['meses'])
+    ind.update({
+        'filtro_vol': filtro_vol,
+        'elegibles': elegibles,
+        'correlacion': correlacion,
+        'hay_matriz': elegibles.any(axis=1)
+    })
+    return ind
+
+# 13. Simular Selecciones y Rentabilidad Mensual
+def simular_selecciones(datos, caracteristicas, momentum, tiene_momentum, momentum_min=0.7, momentum_max=3,
+                        max_activos=3, comision=0.0025, top_k=None):
+    """Selecciones y rentabilidad neta de todos los meses. Con `top_k` la selección
+    greedy solo considera los `top_k` candidatos de mayor momentum de cada mes (más
+    rápido con universos grandes, pero puede cambiar las selecciones)."""
+    candidatos = (caracteristicas['filtro_vol'] & tiene_momentum &
+                  (momentum >= momentum_min) & (momentum <= momentum_max))
+    num_meses = len(datos['meses'])
+    num_candidatos = candidatos.sum(axis=1)
+
+    # Candidatos de cada mes por momentum descendente (orden estable entre empates)
+    with np.errstate(invalid='ignore'):
+        ordenes = np.argsort(np.where(candidatos, -momentum, np.inf), axis=1, kind='stable')
+    ancho = int(num_candidatos.max()) if num_meses else 0
+    if top_k is not None:
+        ancho = min(ancho, top_k)
+    ordenes = ordenes[:, :ancho]
+    validos_orden = np.arange(ancho) < num_candidatos[:, None]
+    seleccion = seleccion_greedy_lote(ordenes, validos_orden, caracteristicas['correlacion'],
+                                      caracteristicas['elegibles'], max_activos)
+
+    # Media de los retornos de los seleccionados con precio de compra y venta
+    with tramo('retorno_portafolio'):
+        filas = np.arange(num_meses)[:, None]
+        columnas = np.maximum(seleccion, 0)
+        con_dato = (seleccion >= 0) & datos['con_precio'][filas, columnas]
+        num_con_dato = con_dato.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            retorno_bruto = np.where(con_dato, datos['retorno_activo'][filas, columnas], 0.0).sum(axis=1) / num_con_dato
+            retorno_neto = (1 + retorno_bruto) * (1 - comision) * (1 - comision) - 1
+        rentabilidad = np.where((num_con_dato > 0) & np.isfinite(retorno_neto), retorno_neto, 0.0)
+    selecciones_idx = [fila[fila >= 0].tolist() for fila in seleccion]
+    return selecciones_idx, rentabilidad
+
+# 14. Backtesting Vectorizado
+@medir()
+def backtesting_vectorizado(db_file, inicio, fin, capital_inicial=10000, momentum_min=0.7, momentum_max=3,
+                            max_activos=3, vol_corta_meses=4, vol_larga_meses=12, comision=0.0025,
+                            pesos_momentum=PESOS_MOMENTUM, activos=None, panel=None, frecuencia='ME'):
+    """Mismo resultado que backtesting_selecciones_con_metricas, pero leyendo el
+    panel de precios una sola vez y calculando los indicadores de todos los
+    meses como operaciones sobre matrices. Con `frecuencia` (D, W, ME o QE) se
+    rebalancea a esa frecuencia a partir de las barras diarias."""
+    datos = preparar_datos(db_file, inicio, fin, activos=activos, panel=panel, frecuencia=frecuencia)
+    if datos is None:
+        return pd.DataFrame(), pd.DataFrame()
+
+    ind = calcular_caracteristicas(datos, vol_corta_meses, vol_larga_meses)
+    momentum, tiene_momentum = calcular_momentum_panel(datos['conteo'], datos['comprimido'], datos['meses'], pesos_momentum)
+    return ejecutar_configuracion(datos, ind, momentum, tiene_momentum, capital_inicial, momentum_min, momentum_max,
+                                  max_activos, comision)
+
+def ejecutar_configuracion(datos, caracteristicas, momentum, tiene_momentum, capital_inicial=10000, momentum_min=0.7,
+                           momentum_max=3, max_activos=3, comision=0.0025):
+    """Selecciones, capital y métricas de una configuración a partir de datos,
+    características y momentum ya calculados (se pueden reutilizar entre
+    configuraciones con las mismas ventanas de volatilidad y pesos)."""
+    selecciones_idx, rentabilidad = simular_selecciones(datos, caracteristicas, momentum, tiene_momentum, momentum_min,
+                                                        momentum_max, max_activos, comision)
+    capitales = np.cumprod(np.concatenate([[capital_inicial], 1 + rentabilidad]))
+    capital_previo, capitales = capitales[:-1], capitales[1:]
+    metricas = calcular_metricas_series(capital_inicial, capitales, rentabilidad, datos['años'],
+                                        datos.get('periodos_por_año', 12))
+    return construir_resultados(datos, caracteristicas, momentum, selecciones_idx, rentabilidad, capital_previo,
+                                capitales, metricas)
+
+# 15. Construir DataFrames de Resultados
+def construir_resultados(datos, ind, momentum, selecciones_idx, rentabilidad, capital_previo, capitales, metricas):
+    """df_selecciones y df_metricas_activos con las mismas columnas que
+    backtesting_selecciones_con_metricas."""
+    activos = datos['activos']
+    fechas_str = datos['fechas_meses']
+    df_selecciones = pd.DataFrame({
+        'fecha': fechas_str,
+        'activos_seleccionados': [[activos[j] for j in seleccion] for seleccion in selecciones_idx],
+        'rentabilidad_mensual': rentabilidad,
+        'capitalizacion_final': capitales,
+        **metricas
+    })
+
+    compra, venta, con_precio = datos['compra'], datos['venta'], datos['con_precio']
+    elegibles, hay_matriz, correlacion = ind['elegibles'], ind['hay_matriz'], ind['correlacion']
+    metricas_activos = []
+    for i, seleccion in enumerate(selecciones_idx):
+        for j in seleccion:
+            otros = [k for k in seleccion if k != j and hay_matriz[i] and elegibles[i, j] and elegibles[i, k]]
+            con_dato = con_precio[i, j]
+            precio_compra = compra[i, j] if con_dato else 0.0
+            metricas_activos.append({
+                'fecha': fechas_str[i],
+                'activo': activos[j],
+                'momentum_score': momentum[i, j],
+                'volatilidad_corta': ind['vol_corta'][i, j],
+                'volatilidad_larga': ind['vol_larga'][i, j],
+                'correlacion_promedio': np.mean(correlacion[i, j, otros]) if otros else 0.0,
+                'precio_compra': precio_compra,
+                'precio_venta': venta[i, j] if con_dato else 0.0,
+                'cantidad_activos': (capital_previo[i] / len(seleccion) / precio_compra
+                                     if con_dato and precio_compra > 0 else 0.0),
+                'retorno_activo': datos['retorno_activo'][i, j] if con_dato else 0.0
+            })
+
+    return df_selecciones, pd.DataFrame(metricas_activos)
+
+# 16. Main
+def main():
+    configurar_logging()
+    db_file = 'precios_activos_mensual.db'
+    inicio = datetime(2005, 5, 31)
+    fin = datetime(2025, 4, 30)
+
+    t0 = time.perf_counter()
+    df_selecciones, df_metricas_activos = backtesting_vectorizado(db_file, inicio, fin)
+    print(f"Backtesting vectorizado completado en {time.perf_counter() - t0:.3f} s")
+
+    if not df_selecciones.empty:
+        print("\nPrimeras filas de selecciones mensuales:\n", df_selecciones.head())
+        print("\nPrimeras filas de métricas por activo:\n", df_metricas_activos.head())
+    else:
+        print("No se generaron selecciones")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# BARRIDO PARALELO DE PARÁMETROS DE SELECCIÓN
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from estrategiamomento_backtesting_vectorizado import (
+    PESOS_MOMENTUM, preparar_datos, calcular_caracteristicas, calcular_momentum_panel, simular_selecciones,
+    calcular_correlaciones_panel
+)
+from estrategiamomento_metricas import metricas_serie
+from estrategiamomento_memoriacompartida import arrays_compartidos, adjuntar_arrays
+from estrategiamomento_instrumentacion import configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# Configuración de producción usada por backtesting_selecciones_con_metricas
+GRILLA_DEFECTO = {
+    'momentum_min': [0.7],
+    'momentum_max': [3],
+    'max_activos': [3],
+    'vol_corta_meses': [4],
+    'vol_larga_meses': [12],
+    'pesos_momentum': [PESOS_MOMENTUM]
+}
+
+# 2. Expandir la Grilla de Parámetros
+def expandir_grilla(grilla):
+    grilla = {**GRILLA_DEFECTO, **grilla}
+    nombres = list(GRILLA_DEFECTO)
+    return [dict(zip(nombres, valores)) for valores in itertools.product(*(grilla[n] for n in nombres))]
+
+# 3. Métricas de una Serie de Retornos Mensuales
+def metricas_configuracion(rentabilidad, años, capital_inicial=10000, periodos_por_año=12):
+    """Métricas del último mes de la serie, con las mismas convenciones que el
+    backtesting y el dashboard (metricas_serie). `años` son los años transcurridos
+    en cada mes (datos['años'])."""
+    capitales = capital_inicial * np.cumprod(1 + rentabilidad)
+    metricas = metricas_serie(capital_inicial, capitales, rentabilidad, años, periodos_por_año=periodos_por_año)
+    return {
+        'cagr': metricas['cagr'][-1],
+        'sharpe': metricas['sharpe'][-1],
+        'volatilidad': metricas['volatilidad_final'][-1],
+        'max_drawdown': metricas['max_drawdown'][-1],
+        'sortino': metricas['sortino'][-1],
+        'calmar': metricas['calmar'][-1],
+        'capital_final': capitales[-1]
+    }
+
+# 4. Trabajo de Cada Proceso
+# Las matrices de `datos` (panel comprimido, retornos, tensor de correlaciones...)
+# se publican una sola vez en memoria compartida y cada proceso las adjunta sin
+# copia; solo los valores pequeños (fechas, activos...) viajan en el initializer.
+# Las características por ventana de volatilidad / pesos se memorizan por proceso.
+_datos = None
+_caracteristicas = {}
+_momentum = {}
+
+def _separar_arrays(datos):
+    arrays = {clave: valor for clave, valor in datos.items()
+              if isinstance(valor, np.ndarray) and valor.dtype.kind in 'biuf'}
+    return arrays, {clave: valor for clave, valor in datos.items() if clave not in arrays}
+
+def _inicializar_proceso(datos, descriptor=None):
+    global _datos
+    _datos = {**datos, **adjuntar_arrays(descriptor)} if descriptor is not None else datos
+    _caracteristicas.clear()
+    _momentum.clear()
+
+def _evaluar_configuraciones(configuraciones, capital_inicial, comision):
+    resultados = []
+    for config in configuraciones:
+        clave_vol = (config['vol_corta_meses'], config['vol_larga_meses'])
+        if clave_vol not in _caracteristicas:
+            _caracteristicas[clave_vol] = calcular_caracteristicas(_datos, *clave_vol)
+        clave_pesos = tuple(config['pesos_momentum'])
+        if clave_pesos not in _momentum:
+            _momentum[clave_pesos] = calcular_momentum_panel(_datos['conteo'], _datos['comprimido'],
+                                                             _datos['meses'], clave_pesos)
+        momentum, tiene_momentum = _momentum[clave_pesos]
+        _, rentabilidad = simular_selecciones(_datos, _caracteristicas[clave_vol], momentum, tiene_momentum,
+                                              config['momentum_min'], config['momentum_max'],
+                                              config['max_activos'], comision)
+        resultados.append({
+            **config,
+            'pesos_momentum': '/'.join(f"{p:g}" for p in clave_pesos),
+            **metricas_configuracion(rentabilidad, _datos['años'], capital_inicial, _datos['periodos_por_año'])
+        })
+    return resultados
+
+# 5. Barrido de Parámetros
+def barrido_parametros(db_file, inicio, fin, grilla, capital_inicial=10000, comision=0.0025, procesos=None,
+                       activos=None):
+    """Evalúa todas las combinaciones de `grilla` (listas de valores por parámetro
+    de seleccionar_activos más `pesos_momentum`) y devuelve una fila de métricas
+    por configuración."""
+    datos = preparar_datos(db_file, inicio, fin, activos=activos)
+    if datos is None:
+        logger.warning("No hay datos suficientes para el barrido")
+        return pd.DataFrame()
+    # Las correlaciones son comunes a todas las configuraciones
+    datos['correlacion'] = calcular_correlaciones_panel(datos['validos'], datos['conteo'], datos['retornos'],
+                                                        datos['meses'])
+
+    configuraciones = expandir_grilla(grilla)
+    # Agrupar por ventanas de volatilidad para que cada lote reutilice sus características
+    configuraciones.sort(key=lambda c: (c['vol_corta_meses'], c['vol_larga_meses'], tuple(c['pesos_momentum'])))
+    procesos = procesos or os.cpu_count() or 1
+    tamaño_lote = max(1, -(-len(configuraciones) // (procesos * 4)))
+    lotes = [configuraciones[i:i + tamaño_lote] for i in range(0, len(configuraciones), tamaño_lote)]
+    logger.info("Evaluando %d configuraciones en %d lotes con %d procesos", len(configuraciones), len(lotes), procesos)
+
+    if procesos == 1:
+        _inicializar_proceso(datos)
+        resultados = [_evaluar_configuraciones(lote, capital_inicial, comision) for lote in lotes]
+    else:
+        arrays, pequeños = _separar_arrays(datos)
+        with arrays_compartidos(arrays) as descriptor, \
+                ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                    initargs=(pequeños, descriptor)) as executor:
+            resultados = list(executor.map(_evaluar_configuraciones, lotes,
+                                           [capital_inicial] * len(lotes), [comision] * len(lotes)))
+
+    df_resultados = pd.DataFrame([fila for lote in resultados for fila in lote])
+    return df_resultados.sort_values(by='sharpe', ascending=False, ignore_index=True)
+
+# 6. Main
+def _pesos(valor):
+    pesos = tuple(float(p) for p in valor.split('/'))
+    if len(pesos) != 4:
+        raise argparse.ArgumentTypeError("Los pesos deben tener la forma p1/p3/p6/p12, p. ej. 12/4/2/1")
+    return pesos
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido paralelo de parámetros de la estrategia momentum")
+    parser.add_argument('--db', default='precios_activos_mensual.db')
+    parser.add_argument('--inicio', default='2005-05-31')
+    parser.add_argument('--fin', default='2025-04-30')
+    parser.add_argument('--momentum-min', type=float, nargs='+', default=GRILLA_DEFECTO['momentum_min'])
+    parser.add_argument('--momentum-max', type=float, nargs='+', default=GRILLA_DEFECTO['momentum_max'])
+    parser.add_argument('--max-activos', type=int, nargs='+', default=GRILLA_DEFECTO['max_activos'])
+    parser.add_argument('--vol-corta-meses', type=int, nargs='+', default=GRILLA_DEFECTO['vol_corta_meses'])
+    parser.add_argument('--vol-larga-meses', type=int, nargs='+', default=GRILLA_DEFECTO['vol_larga_meses'])
+    parser.add_argument('--pesos-momentum', type=_pesos, nargs='+', default=GRILLA_DEFECTO['pesos_momentum'])
+    parser.add_argument('--comision', type=float, default=0.0025)
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--salida', default='barrido_parametros.csv')
+    args = parser.parse_args()
+    configurar_logging()
+
+    grilla = {
+        'momentum_min': args.momentum_min,
+        'momentum_max': args.momentum_max,
+        'max_activos': args.max_activos,
+        'vol_corta_meses': args.vol_corta_meses,
+        'vol_larga_meses': args.vol_larga_meses,
+        'pesos_momentum': args.pesos_momentum
+    }
+    t0 = time.perf_counter()
+    df_resultados = barrido_parametros(args.db, datetime.strptime(args.inicio, '%Y-%m-%d'),
+                                       datetime.strptime(args.fin, '%Y-%m-%d'), grilla,
+                                       comision=args.comision, procesos=args.procesos)
+    logger.info("Barrido completado en %.2f s", time.perf_counter() - t0)
+
+    if not df_resultados.empty:
+        df_resultados.to_csv(args.salida, index=False)
+        logger.info("Resultados guardados en %s", args.salida)
+        logger.info("Mejores configuraciones por Sharpe:\n%s", df_resultados.head(10))
+
+if __name__ == '__main__':
+    main()
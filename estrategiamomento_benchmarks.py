@@ -0,0 +1,219 @@
+# BENCHMARKS DE RENDIMIENTO
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+import os
+import tempfile
+import time
+import contextlib
+import io
+from estrategiamomento_cargaprecios_mensual import crear_tabla, configurar_conexion, insertar_datos
+from estrategiamomento_almacen import leer_panel
+from estrategiamomento_columnar import escribir_almacen_columnar, leer_panel_columnar
+from estrategiamomento_panelprecios import PanelPrecios
+from estrategiamomento_backtesting_vectorizado import seleccion_greedy, seleccion_greedy_lote
+
+# 2. Datos Sintéticos para Escritura
+def generar_barras(filas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    fechas = pd.bdate_range('1990-01-01', periods=filas)
+    precios = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.01, filas))), 3)
+    return pd.DataFrame({
+        'Open': precios, 'High': precios, 'Low': precios, 'Close': precios, 'Adj_Close': precios,
+        'Volume': rng.integers(1_000, 1_000_000, filas)
+    }, index=fechas)
+
+# 3. Inserción Fila a Fila en Tablas por Activo (implementación anterior, como referencia)
+def crear_tabla_por_activo(conn, activo):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {activo} (
+                        date TEXT PRIMARY KEY,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL,
+                        adj_close REAL,
+                        volume INTEGER
+                    )''')
+
+def insertar_datos_por_fila(conn, activo, datos):
+    c = conn.cursor()
+    for index, row in datos.iterrows():
+        c.execute(f'''INSERT OR IGNORE INTO {activo} (date, open, high, low, close, adj_close, volume)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (index.strftime('%Y-%m-%d'),
+                   float(row['Open']),
+                   float(row['High']),
+                   float(row['Low']),
+                   float(row['Close']),
+                   float(row['Adj_Close']),
+                   int(row['Volume'])))
+    conn.commit()
+
+# 4. Benchmark de Escritura
+def benchmark_insercion(num_activos=20, filas_por_activo=5000):
+    """Filas por segundo del bucle fila a fila en tablas por activo (commit por
+    activo, journal por defecto) frente a executemany sobre prices en una única
+    transacción con WAL."""
+    datos = {f'ACT{i}': generar_barras(filas_por_activo, semilla=i) for i in range(num_activos)}
+    total_filas = num_activos * filas_por_activo
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre in ['por_fila', 'masiva']:
+            db_file = os.path.join(directorio, f'{nombre}.db')
+            conn = sqlite3.connect(db_file)
+            with contextlib.redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                if nombre == 'masiva':
+                    configurar_conexion(conn)
+                    crear_tabla(conn)
+                for activo, df in datos.items():
+                    if nombre == 'masiva':
+                        insertar_datos(conn, activo, df, commit=False)
+                    else:
+                        crear_tabla_por_activo(conn, activo)
+                        insertar_datos_por_fila(conn, activo, df)
+                conn.commit()
+                segundos = time.perf_counter() - t0
+            conn.close()
+            resultados[nombre] = {'segundos': segundos, 'filas_por_segundo': total_filas / segundos}
+    resultados['aceleracion'] = resultados['por_fila']['segundos'] / resultados['masiva']['segundos']
+    return resultados
+
+# 5. Benchmark de Carga en Frío del Panel Completo
+def benchmark_carga_panel(num_activos=200, filas_por_activo=5000, repeticiones=3):
+    """Tiempo de cargar el panel fechas x activos de adj_close desde cero: activo a
+    activo con PanelPrecios, con una única consulta a prices y desde el almacén
+    columnar mapeado en memoria."""
+    activos = [f'ACT{i}' for i in range(num_activos)]
+    with tempfile.TemporaryDirectory() as directorio:
+        db_file = os.path.join(directorio, 'precios.db')
+        conn = sqlite3.connect(db_file)
+        with contextlib.redirect_stdout(io.StringIO()):
+            configurar_conexion(conn)
+            crear_tabla(conn)
+            for i, activo in enumerate(activos):
+                insertar_datos(conn, activo, generar_barras(filas_por_activo, semilla=i), commit=False)
+            conn.commit()
+            escribir_almacen_columnar(conn, os.path.join(directorio, 'precios.panel'))
+        conn.close()
+
+        def sqlite_por_activo():
+            panel = PanelPrecios(db_file)
+            matriz = pd.DataFrame({activo: panel.historico(activo)['Adj_Close'] for activo in activos})
+            panel.cerrar()
+            return matriz
+
+        def sqlite_consulta_unica():
+            conn = sqlite3.connect(db_file)
+            matriz = leer_panel(conn, activos)
+            conn.close()
+            return matriz
+
+        def columnar():
+            return leer_panel_columnar(os.path.join(directorio, 'precios.panel'), activos=activos)
+
+        resultados = {}
+        for nombre, funcion in [('sqlite_por_activo', sqlite_por_activo),
+                                ('sqlite_consulta_unica', sqlite_consulta_unica),
+                                ('columnar', columnar)]:
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                matriz = funcion()
+                float(np.nansum(matriz.to_numpy()))  # forzar la lectura de todas las páginas
+                tiempos.append(time.perf_counter() - t0)
+            resultados[nombre] = {'segundos': min(tiempos)}
+    for nombre in ['sqlite_por_activo', 'sqlite_consulta_unica']:
+        resultados[nombre]['aceleracion_columnar'] = resultados[nombre]['segundos'] / resultados['columnar']['segundos']
+    return resultados
+
+# 6. Selección Greedy con Listas y Medias por Candidato (implementación anterior, como referencia)
+def seleccion_greedy_listas(orden, correlacion, en_matriz, max_activos):
+    seleccionados = [orden[0]]
+    restantes = list(orden[1:])
+    while len(seleccionados) < max_activos and restantes:
+        mejor_activo = None
+        menor_correlacion_promedio = float('inf')
+        for candidato in restantes:
+            if en_matriz[candidato]:
+                correlaciones = [correlacion[candidato, s] for s in seleccionados if en_matriz[s]]
+                if correlaciones:
+                    correlacion_promedio = np.mean(correlaciones)
+                    if correlacion_promedio < menor_correlacion_promedio:
+                        menor_correlacion_promedio = correlacion_promedio
+                        mejor_activo = candidato
+        if mejor_activo is None:
+            break
+        seleccionados.append(mejor_activo)
+        restantes.remove(mejor_activo)
+    return seleccionados
+
+# 7. Benchmark de la Selección Greedy
+def benchmark_seleccion(tamaños=(100, 500, 2000), meses=12, max_activos=10, top_k=100, semilla=0):
+    """Segundos por mes de la selección greedy con el bucle de listas anterior, con
+    el vector de correlaciones acumuladas mes a mes y con el núcleo por lotes de
+    todos los meses, sobre matrices de correlación aleatorias con la mitad de los
+    activos como candidatos. Comprueba que las tres dan las mismas selecciones."""
+    rng = np.random.default_rng(semilla)
+    resultados = {}
+    for num_activos in tamaños:
+        factores = rng.normal(size=(meses, num_activos, 5))
+        covarianza = factores @ factores.transpose(0, 2, 1) + np.eye(num_activos)
+        desviacion = np.sqrt(np.diagonal(covarianza, axis1=1, axis2=2))
+        correlacion = covarianza / desviacion[:, :, None] / desviacion[:, None, :]
+        momentum = rng.normal(size=(meses, num_activos))
+        candidatos = rng.random((meses, num_activos)) < 0.5
+        en_matriz = rng.random((meses, num_activos)) < 0.9
+        ordenes = np.argsort(np.where(candidatos, -momentum, np.inf), axis=1, kind='stable')
+        num_candidatos = candidatos.sum(axis=1)
+        listas = [ordenes[i, :num_candidatos[i]] for i in range(meses)]
+
+        tiempos = {}
+        t0 = time.perf_counter()
+        referencia = [seleccion_greedy_listas(list(orden), correlacion[i], en_matriz[i], max_activos)
+                      for i, orden in enumerate(listas)]
+        tiempos['listas'] = (time.perf_counter() - t0) / meses
+        t0 = time.perf_counter()
+        por_mes = [seleccion_greedy(orden, correlacion[i], en_matriz[i], max_activos) for i, orden in enumerate(listas)]
+        tiempos['vector_por_mes'] = (time.perf_counter() - t0) / meses
+
+        def lote(ancho):
+            validos = np.arange(ancho) < num_candidatos[:, None]
+            seleccion = seleccion_greedy_lote(ordenes[:, :ancho], validos, correlacion, en_matriz, max_activos)
+            return [fila[fila >= 0].tolist() for fila in seleccion]
+
+        t0 = time.perf_counter()
+        por_lote = lote(int(num_candidatos.max()))
+        tiempos['lote'] = (time.perf_counter() - t0) / meses
+        t0 = time.perf_counter()
+        lote(min(top_k, int(num_candidatos.max())))
+        tiempos[f'lote_top_{top_k}'] = (time.perf_counter() - t0) / meses
+
+        referencia = [[int(j) for j in seleccion] for seleccion in referencia]
+        resultados[num_activos] = {
+            'segundos_por_mes': tiempos,
+            'mismas_selecciones': referencia == por_mes == por_lote,
+            'aceleracion_lote': tiempos['listas'] / tiempos['lote']
+        }
+    return resultados
+
+# 8. Main
+def main():
+    resultados = benchmark_insercion()
+    for nombre in ['por_fila', 'masiva']:
+        print(f"{nombre}: {resultados[nombre]['segundos']:.3f} s, {resultados[nombre]['filas_por_segundo']:,.0f} filas/s")
+    print(f"Aceleración: {resultados['aceleracion']:.1f}x")
+
+    resultados = benchmark_carga_panel()
+    for nombre, r in resultados.items():
+        extra = f" (columnar {r['aceleracion_columnar']:.0f}x más rápido)" if 'aceleracion_columnar' in r else ''
+        print(f"Carga panel {nombre}: {r['segundos']:.3f} s{extra}")
+
+    for num_activos, r in benchmark_seleccion().items():
+        tiempos = ', '.join(f"{nombre} {segundos * 1000:.2f} ms" for nombre, segundos in r['segundos_por_mes'].items())
+        print(f"Selección greedy con {num_activos} activos (por mes): {tiempos}; "
+              f"mismas selecciones: {r['mismas_selecciones']}, lote {r['aceleracion_lote']:.0f}x más rápido")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+# SUITE DE BENCHMARKS SOBRE CONJUNTOS SINTÉTICOS FIJOS, CON RESULTADOS EN JSON
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+import statistics
+import argparse
+import contextlib
+import io
+from datetime import datetime, timezone
+from estrategiamomento_sintetico import ProveedorSintetico, activos_sinteticos, generar_base_datos, FIN_DEFECTO
+from estrategiamomento_cargaprecios_mensual import obtener_datos, crear_tabla, configurar_conexion, insertar_datos
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_correlaciones import invalidar_correlaciones
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado
+
+# Universos de 1x, 10x y 100x el actual (15 activos), todos con la misma semilla
+# para que los resultados de distintos commits sean comparables
+CONJUNTOS = {
+    'x1': {'activos': 15},
+    'x10': {'activos': 150},
+    'x100': {'activos': 1500}
+}
+INICIO_DATOS = '2005-01-01'
+INICIO_BACKTEST = datetime(2005, 5, 31)
+FIN_BACKTEST = datetime(2025, 4, 30)
+SEMILLA = 0
+UMBRAL_REGRESION = 0.2
+
+# 2. Conjuntos de Datos
+def ruta_conjunto(nombre, directorio):
+    return os.path.join(directorio, f"{nombre}_{CONJUNTOS[nombre]['activos']}_{SEMILLA}.db")
+
+def preparar_conjunto(nombre, directorio):
+    """Genera la base de datos del conjunto la primera vez y la reutiliza después."""
+    db_file = ruta_conjunto(nombre, directorio)
+    if not os.path.exists(db_file):
+        os.makedirs(directorio, exist_ok=True)
+        print(f"Generando conjunto {nombre} ({CONJUNTOS[nombre]['activos']} activos) en {db_file}")
+        temporal = db_file + '.tmp'
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        generar_base_datos(temporal, CONJUNTOS[nombre]['activos'], inicio=INICIO_DATOS, fin=FIN_DEFECTO,
+                           semilla=SEMILLA)
+        os.replace(temporal, db_file)
+    return db_file
+
+# 3. Benchmarks
+# Cada benchmark tiene una función preparar(db_file, conjunto) que no se mide y una
+# función ejecutar(estado) que se mide en cada repetición. ejecutar puede devolver
+# un número de unidades (filas, meses...) para informar también del rendimiento.
+
+# 3.1 obtener_datos -> insertar_datos
+def _preparar_carga(db_file, conjunto):
+    proveedor = ProveedorSintetico(semilla=SEMILLA)
+    activos = activos_sinteticos(conjunto['activos'])
+    for activo in activos:
+        proveedor.serie(activo)  # la generación de las series no forma parte de la medida
+    return {'proveedor': proveedor, 'activos': activos, 'directorio': tempfile.mkdtemp()}
+
+def _ejecutar_carga(estado):
+    destino = os.path.join(estado['directorio'], 'carga.db')
+    if os.path.exists(destino):
+        os.remove(destino)
+    conn = sqlite3.connect(destino)
+    configurar_conexion(conn)
+    crear_tabla(conn)
+    filas = 0
+    for activo in estado['activos']:
+        datos = obtener_datos(activo, INICIO_DATOS, FIN_DEFECTO, estado['proveedor'])
+        filas += insertar_datos(conn, activo, datos, commit=False)[0]
+    conn.commit()
+    conn.close()
+    return filas
+
+def _limpiar_directorio(estado):
+    shutil.rmtree(estado['directorio'], ignore_errors=True)
+
+# 3.2 Una llamada a seleccionar_activos (en frío: sin cachés de precios ni correlaciones)
+def _preparar_seleccion(db_file, conjunto):
+    from estrategiamomento_backtesting import seleccionar_activos
+    return {'db_file': db_file, 'funcion': seleccionar_activos}
+
+def _ejecutar_seleccion(estado):
+    obtener_panel(estado['db_file']).invalidar()
+    invalidar_correlaciones(estado['db_file'])
+    estado['funcion'](estado['db_file'], datetime(2025, 3, 31))
+
+# 3.3 Backtesting completo con el bucle mensual, en un solo proceso (por defecto)
+# y con los meses repartidos entre todos los núcleos
+def _preparar_backtesting_bucle(db_file, conjunto, procesos=1):
+    from estrategiamomento_backtesting import backtesting_selecciones_con_metricas
+    return {'db_file': db_file, 'funcion': backtesting_selecciones_con_metricas, 'procesos': procesos}
+
+def _preparar_backtesting_bucle_paralelo(db_file, conjunto):
+    return _preparar_backtesting_bucle(db_file, conjunto, procesos=None)
+
+def _ejecutar_backtesting_bucle(estado):
+    obtener_panel(estado['db_file']).invalidar()
+    invalidar_correlaciones(estado['db_file'])
+    df_selecciones, _ = estado['funcion'](estado['db_file'], INICIO_BACKTEST, FIN_BACKTEST,
+                                          procesos=estado['procesos'])
+    return len(df_selecciones)
+
+# 3.4 Backtesting vectorizado sobre todo el universo
+def _preparar_backtesting_vectorizado(db_file, conjunto):
+    return {'db_file': db_file}
+
+def _ejecutar_backtesting_vectorizado(estado):
+    obtener_panel(estado['db_file']).invalidar()
+    df_selecciones, _ = backtesting_vectorizado(estado['db_file'], INICIO_BACKTEST, FIN_BACKTEST)
+    return len(df_selecciones)
+
+# 3.5 Carga, filtro, KPIs y gráficos del dashboard
+def _preparar_dashboard(db_file, conjunto):
+    from estrategiamomento_dashboard import preparar_dataframes
+    df_selecciones, df_metricas_activos = backtesting_vectorizado(db_file, INICIO_BACKTEST, FIN_BACKTEST)
+    # Los mismos registros que devolvería get_all_records sobre la hoja publicada
+    df_selecciones['activos_seleccionados'] = df_selecciones['activos_seleccionados'].apply(str)
+    registros_mes = df_selecciones.to_dict('records')
+    registros_activo = df_metricas_activos.to_dict('records')
+    activos = preparar_dataframes([], registros_activo)[1]['activo'].unique()[:3]
+    return {'registros_mes': registros_mes, 'registros_activo': registros_activo, 'activos': activos}
+
+def _filtrar_y_graficar(df_selecciones, df_metricas_activos, activos):
+    from estrategiamomento_dashboard import DatosDashboard, graficos_por_mes, graficos_por_activo
+    datos = DatosDashboard(df_selecciones, df_metricas_activos)
+    df_selecciones_filtrado, df_metricas_filtrado = datos.filtrar(INICIO_BACKTEST, FIN_BACKTEST, activos)
+    datos.kpis(INICIO_BACKTEST, FIN_BACKTEST)
+    graficos_por_mes(df_selecciones_filtrado)
+    graficos_por_activo(df_metricas_filtrado)
+    return len(df_selecciones_filtrado) + len(df_metricas_filtrado)
+
+def _ejecutar_dashboard(estado):
+    from estrategiamomento_dashboard import preparar_dataframes
+    df_selecciones, df_metricas_activos = preparar_dataframes(estado['registros_mes'], estado['registros_activo'])
+    return _filtrar_y_graficar(df_selecciones, df_metricas_activos, estado['activos'])
+
+# 3.6 Lo mismo leyendo el artefacto local en lugar de los registros de Google Sheets
+def _preparar_dashboard_artefacto(db_file, conjunto):
+    import pyarrow  # noqa: F401 (sin pyarrow se omite el benchmark)
+    from estrategiamomento_resultados import escribir_resultados
+    df_selecciones, df_metricas_activos = backtesting_vectorizado(db_file, INICIO_BACKTEST, FIN_BACKTEST)
+    directorio = tempfile.mkdtemp()
+    ruta = os.path.join(directorio, 'resultados.parquet')
+    escribir_resultados(df_selecciones, df_metricas_activos, ruta)
+    return {'ruta': ruta, 'directorio': directorio, 'activos': df_metricas_activos['activo'].unique()[:3]}
+
+def _ejecutar_dashboard_artefacto(estado):
+    from estrategiamomento_resultados import leer_resultados
+    df_selecciones, df_metricas_activos = leer_resultados(estado['ruta'])
+    return _filtrar_y_graficar(df_selecciones, df_metricas_activos, estado['activos'])
+
+# 3.7 Interacciones con los filtros: 200 combinaciones de fechas y activos, cada una dos veces
+def _preparar_dashboard_filtros(db_file, conjunto):
+    df_selecciones, df_metricas_activos = backtesting_vectorizado(db_file, INICIO_BACKTEST, FIN_BACKTEST)
+    rng = np.random.default_rng(SEMILLA)
+    fechas = pd.to_datetime(df_selecciones['fecha'])
+    activos = df_metricas_activos['activo'].unique()
+    filtros = []
+    for _ in range(200):
+        inicio, fin = np.sort(rng.choice(fechas, 2))
+        filtros.append((inicio, fin, list(rng.choice(activos, min(len(activos), rng.integers(1, 6)), replace=False))))
+    df_selecciones['fecha'] = fechas
+    df_metricas_activos['fecha'] = pd.to_datetime(df_metricas_activos['fecha'])
+    return {'df_selecciones': df_selecciones, 'df_metricas_activos': df_metricas_activos, 'filtros': filtros * 2}
+
+def _ejecutar_dashboard_filtros(estado):
+    from estrategiamomento_dashboard import DatosDashboard
+    datos = DatosDashboard(estado['df_selecciones'], estado['df_metricas_activos'])
+    for inicio, fin, activos in estado['filtros']:
+        datos.filtrar(inicio, fin, activos)
+        datos.kpis(inicio, fin)
+    return len(estado['filtros'])
+
+# 3.8 Publicar en Google Sheets (cliente en memoria): hoja vacía y, después, sin cambios
+def _preparar_publicacion(db_file, conjunto):
+    df_selecciones, df_metricas_activos = backtesting_vectorizado(db_file, INICIO_BACKTEST, FIN_BACKTEST)
+    return {'df_selecciones': df_selecciones, 'df_metricas_activos': df_metricas_activos}
+
+def _ejecutar_publicacion(estado):
+    from estrategiamomento_publicacion import ClienteSheetsMemoria, publicar_resultados
+    spreadsheet = ClienteSheetsMemoria().create('benchmark')
+    filas = publicar_resultados(spreadsheet, estado['df_selecciones'], estado['df_metricas_activos'])
+    publicar_resultados(spreadsheet, estado['df_selecciones'], estado['df_metricas_activos'])
+    return sum(filas.values())
+
+# 3.9 Panel a varias frecuencias desde las barras diarias: una lectura y un resampleo por frecuencia
+def _preparar_resampleo(db_file, conjunto):
+    directorio = tempfile.mkdtemp()
+    destino = os.path.join(directorio, 'diario.db')
+    generar_base_datos(destino, conjunto['activos'], inicio=INICIO_DATOS, fin=FIN_DEFECTO, semilla=SEMILLA,
+                       diario=True)
+    return {'db_file': destino, 'directorio': directorio}
+
+def _ejecutar_resampleo(estado):
+    from estrategiamomento_paneldiario import PanelDiario
+    panel_diario = PanelDiario(estado['db_file'])
+    frecuencias = ['W', 'ME', 'QE']
+    for frecuencia in frecuencias:
+        panel_diario.panel(frecuencia)
+    panel_diario.cerrar()
+    return len(frecuencias)
+
+# 3.10 Carga desde la caché de descargas: la misma carga que 3.1 con todas las
+# respuestas del proveedor ya guardadas en disco
+def _preparar_carga_cache(db_file, conjunto):
+    from estrategiamomento_cachedescargas import ProveedorConCache
+    estado = _preparar_carga(db_file, conjunto)
+    estado['proveedor'] = ProveedorConCache(estado['proveedor'], os.path.join(estado['directorio'], 'cache'))
+    for activo in estado['activos']:
+        obtener_datos(activo, INICIO_DATOS, FIN_DEFECTO, estado['proveedor'])
+    return estado
+
+BENCHMARKS = {
+    'carga_mensual': {'preparar': _preparar_carga, 'ejecutar': _ejecutar_carga, 'limpiar': _limpiar_directorio,
+                      'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filas'},
+    # seleccionar_activos y el bucle mensual usan la lista fija de activos de
+    # backtesting: en x10 y x100 medirían lo mismo que en x1, así que solo se miden en x1
+    'seleccionar_activos': {'preparar': _preparar_seleccion, 'ejecutar': _ejecutar_seleccion,
+                            'conjuntos': ['x1']},
+    'backtesting_bucle': {'preparar': _preparar_backtesting_bucle, 'ejecutar': _ejecutar_backtesting_bucle,
+                          'conjuntos': ['x1'], 'repeticiones': 1, 'unidad': 'meses'},
+    'backtesting_bucle_paralelo': {'preparar': _preparar_backtesting_bucle_paralelo,
+                                   'ejecutar': _ejecutar_backtesting_bucle,
+                                   'conjuntos': ['x1'], 'repeticiones': 1, 'unidad': 'meses'},
+    'backtesting_vectorizado': {'preparar': _preparar_backtesting_vectorizado,
+                                'ejecutar': _ejecutar_backtesting_vectorizado,
+                                'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'meses'},
+    'dashboard': {'preparar': _preparar_dashboard, 'ejecutar': _ejecutar_dashboard,
+                  'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filas'},
+    'dashboard_artefacto': {'preparar': _preparar_dashboard_artefacto, 'ejecutar': _ejecutar_dashboard_artefacto,
+                            'limpiar': _limpiar_directorio, 'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filas'},
+    'dashboard_filtros': {'preparar': _preparar_dashboard_filtros, 'ejecutar': _ejecutar_dashboard_filtros,
+                          'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filtros'},
+    'publicacion_sheets': {'preparar': _preparar_publicacion, 'ejecutar': _ejecutar_publicacion,
+                           'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filas'},
+    # Con x100 las barras diarias (varios millones de filas) alargarían demasiado la preparación
+    'resampleo': {'preparar': _preparar_resampleo, 'ejecutar': _ejecutar_resampleo, 'limpiar': _limpiar_directorio,
+                  'conjuntos': ['x1', 'x10'], 'unidad': 'frecuencias'},
+    'carga_cache': {'preparar': _preparar_carga_cache, 'ejecutar': _ejecutar_carga, 'limpiar': _limpiar_directorio,
+                    'conjuntos': ['x1', 'x10', 'x100'], 'unidad': 'filas'}
+}
+
+# 4. Ejecutar la Suite
+def metadatos():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def ejecutar_suite(conjuntos=('x1', 'x10'), benchmarks=None, repeticiones=5, directorio=None):
+    """Ejecuta los benchmarks indicados (todos por defecto) sobre cada conjunto y
+    devuelve {'metadatos': ..., 'resultados': {'nombre[conjunto]': {...}}} con los
+    tiempos mínimo y mediano de las repeticiones."""
+    directorio = directorio or os.path.join(tempfile.gettempdir(), 'estrategiamomento_benchmarks')
+    resultados = {}
+    for nombre_conjunto in conjuntos:
+        db_file = preparar_conjunto(nombre_conjunto, directorio)
+        for nombre, benchmark in BENCHMARKS.items():
+            if (benchmarks and nombre not in benchmarks) or nombre_conjunto not in benchmark['conjuntos']:
+                continue
+            clave = f'{nombre}[{nombre_conjunto}]'
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    estado = benchmark['preparar'](db_file, CONJUNTOS[nombre_conjunto])
+            except ImportError as e:
+                print(f"{clave}: omitido ({e})")
+                resultados[clave] = {'omitido': str(e)}
+                continue
+            tiempos = []
+            try:
+                for _ in range(benchmark.get('repeticiones', repeticiones)):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        t0 = time.perf_counter()
+                        unidades = benchmark['ejecutar'](estado)
+                        tiempos.append(time.perf_counter() - t0)
+            finally:
+                if 'limpiar' in benchmark:
+                    benchmark['limpiar'](estado)
+            resultado = {'min': min(tiempos), 'mediana': statistics.median(tiempos), 'repeticiones': len(tiempos)}
+            if unidades and 'unidad' in benchmark:
+                resultado[f"{benchmark['unidad']}_por_segundo"] = unidades / resultado['min']
+            resultados[clave] = resultado
+            print(f"{clave}: {resultado['min']:.4f} s (mediana {resultado['mediana']:.4f} s)")
+    return {'metadatos': metadatos(), 'resultados': resultados}
+
+# 5. Guardar y Comparar Resultados
+def guardar_resultados(resultados, ruta):
+    with open(ruta, 'w') as f:
+        json.dump(resultados, f, indent=2)
+
+def cargar_resultados(ruta):
+    with open(ruta) as f:
+        return json.load(f)
+
+def comparar_resultados(base, actual, umbral=UMBRAL_REGRESION):
+    """Compara el tiempo mínimo de los benchmarks comunes. Un benchmark es una
+    regresión si tarda más de (1 + umbral) veces lo que tardaba en `base` y una
+    mejora si tarda menos de 1 / (1 + umbral) veces."""
+    comparacion = []
+    for clave, r_actual in actual['resultados'].items():
+        r_base = base['resultados'].get(clave)
+        if r_base is None or 'min' not in r_base or 'min' not in r_actual:
+            continue
+        ratio = r_actual['min'] / r_base['min']
+        if ratio > 1 + umbral:
+            estado = 'regresion'
+        elif ratio < 1 / (1 + umbral):
+            estado = 'mejora'
+        else:
+            estado = 'igual'
+        comparacion.append({'benchmark': clave, 'base': r_base['min'], 'actual': r_actual['min'],
+                            'ratio': ratio, 'estado': estado})
+    return comparacion
+
+def mostrar_comparacion(comparacion):
+    for c in comparacion:
+        print(f"{c['benchmark']:<40} {c['base']:>10.4f} s -> {c['actual']:>10.4f} s  {c['ratio']:>6.2f}x  {c['estado']}")
+    return [c for c in comparacion if c['estado'] == 'regresion']
+
+# 6. Main
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de la estrategia momentum")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    ejecutar = subparsers.add_parser('ejecutar', help="Ejecuta la suite y guarda los resultados en JSON")
+    ejecutar.add_argument('--conjuntos', nargs='+', choices=list(CONJUNTOS), default=['x1', 'x10'])
+    ejecutar.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=None)
+    ejecutar.add_argument('--repeticiones', type=int, default=5)
+    ejecutar.add_argument('--datos', default=None, help="Directorio donde se guardan los conjuntos generados")
+    ejecutar.add_argument('--salida', default='benchmarks.json')
+    ejecutar.add_argument('--base', default=None, help="Resultados anteriores con los que comparar")
+    ejecutar.add_argument('--umbral', type=float, default=UMBRAL_REGRESION)
+    comparar = subparsers.add_parser('comparar', help="Compara dos ficheros de resultados")
+    comparar.add_argument('base')
+    comparar.add_argument('actual')
+    comparar.add_argument('--umbral', type=float, default=UMBRAL_REGRESION)
+    args = parser.parse_args()
+
+    if args.comando == 'ejecutar':
+        actual = ejecutar_suite(args.conjuntos, args.benchmarks, args.repeticiones, args.datos)
+        guardar_resultados(actual, args.salida)
+        print(f"Resultados guardados en {args.salida}")
+        if args.base is None:
+            return
+        base = cargar_resultados(args.base)
+    else:
+        base, actual = cargar_resultados(args.base), cargar_resultados(args.actual)
+
+    regresiones = mostrar_comparacion(comparar_resultados(base, actual, args.umbral))
+    if regresiones:
+        print(f"{len(regresiones)} regresiones por encima del {args.umbral:.0%}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# CACHÉ EN DISCO DE LAS DESCARGAS DEL PROVEEDOR DE PRECIOS
+# 1. Importar Librerías
+import pandas as pd
+import os
+import json
+import time
+import hashlib
+import threading
+import argparse
+import logging
+from estrategiamomento_instrumentacion import tramo, configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# Hay una entrada por serie (ticker, intervalo, auto_adjust): un fichero Parquet
+# comprimido con zstd cuyo nombre es el SHA-256 de la serie, con las barras (solo
+# se aplanan las columnas MultiIndex de yfinance) y, en los metadatos del fichero,
+# el rango [desde, hasta) que cubren. Una petición dentro de ese rango se sirve
+# del disco; si lo excede solo se descargan los tramos que faltan (el principio o
+# el final), se unen a la entrada y el rango crece. Así las peticiones
+# incrementales del planificador (el último mes de cada activo) y la reconstrucción
+# desde cero de la base de datos aprovechan lo ya descargado. Como el rango es
+# contiguo, una petición separada del rango guardado descarga también el hueco
+# intermedio. Los ficheros se reparten en subdirectorios por los dos primeros
+# caracteres del hash.
+#
+# Las barras históricas no cambian y no caducan. Si la petición llega hasta el
+# periodo más reciente (fin a menos de DIAS_RECIENTES días) y la entrada tiene más
+# de `frescura` horas, los últimos DIAS_RECIENTES días pueden ser provisionales y
+# se vuelven a descargar. Si el directorio supera `max_bytes` se borran las
+# entradas usadas hace más tiempo (la fecha de modificación se actualiza en cada
+# acierto).
+EXTENSION_CACHE = '.cache'
+SUFIJO_ENTRADA = '.parquet'
+COMPRESION = 'zstd'
+MAX_BYTES = 2 * 1024 ** 3
+FRESCURA_HORAS = 12
+DIAS_RECIENTES = 7
+METADATOS_RANGO = b'estrategiamomento_rango'
+
+# 2. Rutas y Claves
+def ruta_cache(db_file):
+    return os.path.splitext(db_file)[0] + EXTENSION_CACHE
+
+def clave_descarga(activo, intervalo='1d', auto_ajuste=False):
+    contenido = json.dumps([activo, intervalo, bool(auto_ajuste)])
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+# 3. Proveedor con Caché
+class ProveedorConCache:
+    """Envuelve un proveedor (descargar(activo, inicio, fin)) y sirve desde disco
+    los rangos ya descargados de cada serie. El intervalo y auto_adjust forman parte
+    de la clave y se toman del proveedor envuelto (atributos `intervalo` y
+    `auto_ajuste`). Si algún tramo que falta vuelve vacío (puede ser un fallo
+    transitorio) la petición entera se pide al proveedor, como sin caché, y las
+    respuestas vacías no se guardan."""
+
+    def __init__(self, proveedor, directorio, max_bytes=MAX_BYTES, frescura_horas=FRESCURA_HORAS,
+                 dias_recientes=DIAS_RECIENTES):
+        self.proveedor = proveedor
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.frescura = frescura_horas * 3600
+        self.dias_recientes = dias_recientes
+        self.intervalo = getattr(proveedor, 'intervalo', '1d')
+        self.auto_ajuste = getattr(proveedor, 'auto_ajuste', False)
+        self.aciertos = self.fallos = 0
+        self._bytes = None
+        self._lock = threading.Lock()
+        # Un lock por serie: las tareas de un mismo activo (principio y final) no
+        # se pisan al ampliar su entrada
+        self._locks_serie = {}
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + SUFIJO_ENTRADA)
+
+    def _lock_serie(self, clave):
+        with self._lock:
+            return self._locks_serie.setdefault(clave, threading.Lock())
+
+    def _limite_reciente(self):
+        return pd.Timestamp.today().normalize() - pd.Timedelta(days=self.dias_recientes)
+
+    def _leer(self, ruta):
+        """(barras, desde, hasta, fecha de modificación) de la entrada, o None."""
+        import pyarrow.parquet as pq
+        try:
+            modificado = os.stat(ruta).st_mtime
+            tabla = pq.read_table(ruta)
+            desde, hasta = json.loads(tabla.schema.metadata[METADATOS_RANGO])
+            datos = tabla.to_pandas()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Entrada de caché ilegible %s, se descarta: %s", ruta, e)
+            self._borrar(ruta)
+            return None
+        return datos, pd.Timestamp(desde), pd.Timestamp(hasta), modificado
+
+    def _escribir(self, ruta, datos, desde, hasta):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        tabla = pa.Table.from_pandas(datos)
+        rango = json.dumps([desde.strftime('%Y-%m-%d'), hasta.strftime('%Y-%m-%d')]).encode()
+        tabla = tabla.replace_schema_metadata({**(tabla.schema.metadata or {}), METADATOS_RANGO: rango})
+        pq.write_table(tabla, temporal, compression=COMPRESION)
+        anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+        os.replace(temporal, ruta)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += os.path.getsize(ruta) - anterior
+        self.recortar()
+
+    def _borrar(self, ruta):
+        try:
+            tamaño = os.path.getsize(ruta)
+            os.remove(ruta)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= tamaño
+
+    @staticmethod
+    def _aplanar(datos):
+        if datos.columns.nlevels > 1:
+            datos = datos.copy()
+            datos.columns = [col[0] for col in datos.columns.values]
+        return datos
+
+    @staticmethod
+    def _cortar(datos, inicio, fin):
+        # yf.download excluye la fecha 'end'
+        return datos[(datos.index >= inicio) & (datos.index < fin)]
+
+    def descargar(self, activo, inicio, fin):
+        clave = clave_descarga(activo, self.intervalo, self.auto_ajuste)
+        ruta = self._ruta(clave)
+        inicio, fin = pd.Timestamp(inicio), pd.Timestamp(fin)
+        with self._lock_serie(clave):
+            entrada = self._leer(ruta)
+            if entrada is None:
+                datos, desde, hasta = None, inicio, inicio
+            else:
+                datos, desde, hasta, modificado = entrada
+                # Las barras de los últimos días de una entrada antigua pueden ser provisionales
+                if fin > self._limite_reciente() and time.time() - modificado > self.frescura:
+                    hasta = min(hasta, max(desde, self._limite_reciente()))
+            faltan = [(inicio, desde)] if inicio < desde else []
+            if fin > hasta:
+                faltan.append((hasta, fin))
+
+            if not faltan:
+                os.utime(ruta)
+                with self._lock:
+                    self.aciertos += 1
+                logger.debug("Caché: %s de %s a %s leído de %s", activo, inicio, fin, ruta)
+                return self._cortar(datos, inicio, fin)
+
+            with self._lock:
+                self.fallos += 1
+            partes = [self.proveedor.descargar(activo, a, b) for a, b in faltan]
+            if any(parte is None or parte.empty for parte in partes):
+                # Sin entrada el único tramo es la petición entera; con entrada se
+                # pide la petición entera y no se toca la entrada
+                if datos is None:
+                    return partes[0]
+                logger.debug("Caché: tramo vacío de %s, se descarga de %s a %s sin caché", activo, inicio, fin)
+                return self.proveedor.descargar(activo, inicio, fin)
+            partes = [self._aplanar(parte) for parte in partes]
+            if datos is not None:
+                # Las barras nuevas sustituyen a las guardadas en las mismas fechas
+                partes.insert(0, self._cortar(datos, desde, hasta))
+            datos = pd.concat(partes)
+            datos = datos[~datos.index.duplicated(keep='last')].sort_index()
+            desde, hasta = min(desde, inicio), max(hasta, fin)
+            try:
+                with tramo('escritura_cache', activo=activo):
+                    self._escribir(ruta, datos, desde, hasta)
+            except OSError as e:
+                logger.warning("No se pudo guardar %s en la caché: %s", activo, e)
+            return self._cortar(datos, inicio, fin)
+
+    # 3.1 Tamaño y desalojo
+    def entradas(self):
+        """(ruta, bytes, última modificación) de todas las entradas."""
+        resultado = []
+        if not os.path.isdir(self.directorio):
+            return resultado
+        for subdirectorio in os.scandir(self.directorio):
+            if not subdirectorio.is_dir():
+                continue
+            for entrada in os.scandir(subdirectorio.path):
+                if entrada.name.endswith(SUFIJO_ENTRADA):
+                    info = entrada.stat()
+                    resultado.append((entrada.path, info.st_size, info.st_mtime))
+        return resultado
+
+    def tamaño(self):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(tamaño for _, tamaño, _ in self.entradas())
+            return self._bytes
+
+    def recortar(self, max_bytes=None):
+        """Borra las entradas menos usadas hasta quedar por debajo de `max_bytes`.
+        Devuelve el número de entradas borradas."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if self.tamaño() <= max_bytes:
+            return 0
+        borradas = 0
+        for ruta, _, _ in sorted(self.entradas(), key=lambda entrada: entrada[2]):
+            if self.tamaño() <= max_bytes:
+                break
+            self._borrar(ruta)
+            borradas += 1
+        logger.info("Caché recortada: %d entradas borradas, %d bytes", borradas, self.tamaño())
+        return borradas
+
+    def vaciar(self):
+        return self.recortar(0)
+
+# 4. Main
+def main():
+    parser = argparse.ArgumentParser(description="Caché en disco de las descargas de precios")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    for comando, ayuda in [('estado', "Muestra el número de entradas y el tamaño"),
+                           ('recortar', "Borra las entradas menos usadas hasta el tamaño máximo"),
+                           ('vaciar', "Borra todas las entradas")]:
+        subparser = subparsers.add_parser(comando, help=ayuda)
+        subparser.add_argument('directorio')
+        if comando == 'recortar':
+            subparser.add_argument('--max-mb', type=float, default=MAX_BYTES / 1024 ** 2)
+    args = parser.parse_args()
+    configurar_logging()
+
+    cache = ProveedorConCache(None, args.directorio)
+    if args.comando == 'estado':
+        print(f"{len(cache.entradas())} entradas, {cache.tamaño() / 1024 ** 2:.1f} MB")
+    elif args.comando == 'recortar':
+        print(f"{cache.recortar(int(args.max_mb * 1024 ** 2))} entradas borradas")
+    else:
+        print(f"{cache.vaciar()} entradas borradas")
+
+if __name__ == '__main__':
+    main()
@@ -1,167 +1,268 @@
 # CARGA DE ACTIVOS A DB
 # 1. Importar Librerías
-import yfinance as yf
 import sqlite3
 from sqlite3 import Error
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import time
+import logging
+from estrategiamomento_almacen import (
+    TABLA_PRECIOS, TABLA_DIARIA, crear_tabla_precios, usa_tabla_precios, tablas_por_activo, migrar_base_datos
+)
+from estrategiamomento_cobertura import (
+    crear_tabla_estado, cargar_estado_descargas, guardar_estado_descargas, reconstruir_cobertura, planificar_descargas,
+    registrar_descarga
+)
+from estrategiamomento_cachedescargas import ProveedorConCache, ruta_cache
+from estrategiamomento_columnar import escribir_almacen_columnar, ruta_columnar
+from estrategiamomento_instrumentacion import conectar, tramo, medir, configurar_logging
 
-# 2. Obtener Datos
-def obtener_datos(activo, inicio, fin):
-    try:
-        # Ajustar fecha de inicio según el activo
-        inicio_minimo = {
-            'SPY': '1993-01-22',
-            'QQQ': '1999-03-10',
-            'GLD': '2004-11-18',
-            'EEM': '2003-04-07',
-            'FXI': '2004-10-05',
-            'EWZ': '2000-07-10',
-            'XLF': '1998-12-16',
-            'XLC': '2018-06-18',
-            'IEUR': '2014-06-10',
-            'XLY': '1998-12-16',
-            'VEA': '2007-07-20',
-            'XLRE': '2015-10-07',
-            'XLB': '1998-12-16',
-            'IVE': '2000-05-15',
-            'IVW': '2000-05-15'
-        }
-        inicio_activo = inicio_minimo.get(activo, inicio)
-        if datetime.strptime(inicio_activo, '%Y-%m-%d') > datetime.strptime(inicio, '%Y-%m-%d'):
-            inicio = inicio_activo
-            print(f"Ajustando inicio para {activo} a {inicio} debido a disponibilidad de datos")
+logger = logging.getLogger(__name__)
+
+# Primera fecha con datos de cada activo conocida de antemano. Sirve para no
+# pedir historia inexistente; la tabla fetch_state guarda además la primera barra
+# real de cada activo cuando una descarga empieza en esta fecha o antes.
+INICIO_MINIMO = {
+    'SPY': '1993-01-22',
+    'QQQ': '1999-03-10',
+    'GLD': '2004-11-18',
+    'EEM': '2003-04-07',
+    'FXI': '2004-10-05',
+    'EWZ': '2000-07-10',
+    'XLF': '1998-12-16',
+    'XLC': '2018-06-18',
+    'IEUR': '2014-06-10',
+    'XLY': '1998-12-16',
+    'VEA': '2007-07-20',
+    'XLRE': '2015-10-07',
+    'XLB': '1998-12-16',
+    'IVE': '2000-05-15',
+    'IVW': '2000-05-15'
+}
+
+# 2. Proveedores de Datos
+# Un proveedor expone descargar(activo, inicio, fin) y devuelve barras diarias con
+# el mismo formato que yf.download (columnas Open, High, Low, Close, Adj Close, Volume).
+class ProveedorYahoo:
+    """Descarga con un yf.Ticker por llamada: yf.download guarda los resultados y
+    errores de cada llamada en estado global del módulo (shared._DFS y
+    shared._ERRORS), que varios hilos de descargar_activos pisarían entre sí."""
+    def __init__(self, intervalo='1d', auto_ajuste=False):
+        self.intervalo = intervalo
+        self.auto_ajuste = auto_ajuste
+
+    def descargar(self, activo, inicio, fin):
+        import yfinance as yf
+        datos = yf.Ticker(activo).history(start=inicio, end=fin, interval=self.intervalo,
+                                          auto_adjust=self.auto_ajuste, actions=False)
+        # Mismo índice que yf.download: fechas sin zona horaria
+        if getattr(datos.index, 'tz', None) is not None:
+            datos.index = datos.index.tz_localize(None)
+        return datos
+
+class ProveedorMemoria:
+    """Proveedor local para ejecutar el cargador sin red a partir de DataFrames diarios por activo."""
+    def __init__(self, datos_por_activo):
+        self.datos_por_activo = datos_por_activo
+
+    def descargar(self, activo, inicio, fin):
+        datos = self.datos_por_activo.get(activo)
+        if datos is None:
+            return pd.DataFrame()
+        # yf.download excluye la fecha 'end'
+        return datos[(datos.index >= pd.Timestamp(inicio)) & (datos.index < pd.Timestamp(fin))].copy()
+
+def descargar_con_reintentos(proveedor, activo, inicio, fin, reintentos=3, espera=1.0):
+    for intento in range(reintentos + 1):
+        try:
+            return proveedor.descargar(activo, inicio, fin)
+        except Exception as e:
+            if intento == reintentos:
+                raise
+            pausa = espera * 2 ** intento + random.uniform(0, espera)
+            logger.warning("Error al descargar %s (intento %d/%d): %s. Reintentando en %.1f s", activo, intento + 1,
+                           reintentos + 1, e, pausa)
+            time.sleep(pausa)
+
+# 3. Obtener Datos
+# El cargador guarda las barras diarias tal como se descargan (tabla prices_daily)
+# y las mensuales derivadas de ellas (tabla prices): cambiar la frecuencia de
+# rebalanceo o calcular volatilidades diarias no necesita volver a descargar nada.
+COLUMNAS_PRECIOS = ['Open', 'High', 'Low', 'Close', 'Adj_Close', 'Volume']
+
+def normalizar_barras(datos, activo):
+    """Columnas planas Open, High, Low, Close, Adj_Close y Volume de las barras
+    devueltas por un proveedor, o None si falta alguna."""
+    # Manejar MultiIndex si existe
+    if datos.columns.nlevels > 1:
+        datos.columns = [col[0] for col in datos.columns.values]
+        logger.debug("Columnas aplanadas para %s: %s", activo, list(datos.columns))
 
+    # Intentar con nombres alternativos si 'Adj Close' no está
+    available_columns = list(datos.columns)
+    if 'Adj Close' not in available_columns and 'Adj_Close' in available_columns:
+        datos = datos.rename(columns={'Adj_Close': 'Adj Close'})
+        logger.debug("Renombrada 'Adj_Close' a 'Adj Close' para %s", activo)
+    elif 'Adj Close' not in available_columns and 'Close' in available_columns:
+        datos['Adj Close'] = datos['Close']
+        logger.warning("No se encontró 'Adj Close' para %s. Usando 'Close' como respaldo (puede no reflejar dividendos)",
+                       activo)
+
+    # Verificar que todas las columnas esperadas estén presentes
+    expected_columns = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+    missing_columns = [col for col in expected_columns if col not in datos.columns]
+    if missing_columns:
+        logger.error("Faltan columnas para %s: %s", activo, missing_columns)
+        return None
+    return datos[expected_columns].rename(columns={'Adj Close': 'Adj_Close'})
+
+def obtener_datos_diarios(activo, inicio, fin, proveedor=None, reintentos=3, espera=1.0):
+    """Barras diarias del activo entre `inicio` y `fin` (sin incluir `fin`, como
+    yf.download) con las columnas de COLUMNAS_PRECIOS. El rango se pide tal cual:
+    no pedir fechas anteriores a la primera del activo es cosa del planificador
+    (estrategiamomento_cobertura)."""
+    if proveedor is None:
+        proveedor = ProveedorYahoo()
+    try:
         # Descargar datos diarios con auto_adjust=False
-        datos = yf.download(activo, start=inicio, end=fin, progress=False, interval='1d', auto_adjust=False)
+        with tramo('descarga', activo=activo):
+            datos = descargar_con_reintentos(proveedor, activo, inicio, fin, reintentos, espera)
         if datos.empty:
-            print(f"No se encontraron datos para {activo} en el rango {inicio} a {fin}.")
+            logger.warning("No se encontraron datos para %s en el rango %s a %s.", activo, inicio, fin)
             return None
-        
+
         # Imprimir columnas y filas para depuración
-        print(f"Columnas originales para {activo}: {list(datos.columns)}")
-        print(f"Filas descargadas para {activo}: {len(datos)}")
-        
-        # Manejar MultiIndex si existe
-        if datos.columns.nlevels > 1:
-            datos.columns = [col[0] for col in datos.columns.values]
-            print(f"Columnas aplanadas para {activo}: {list(datos.columns)}")
-        
-        # Resamplear a mensuales, tomando el último día del mes
-        datos_mensuales = datos.resample('ME').last()
-        
-        # Verificar columnas disponibles
-        available_columns = list(datos_mensuales.columns)
-        print(f"Columnas después de resampleo para {activo}: {available_columns}")
-        
-        # Definir columnas esperadas
-        expected_columns = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
-        
-        # Intentar con nombres alternativos si 'Adj Close' no está
-        if 'Adj Close' not in available_columns and 'Adj_Close' in available_columns:
-            datos_mensuales = datos_mensuales.rename(columns={'Adj_Close': 'Adj Close'})
-            print(f"Renombrada 'Adj_Close' a 'Adj Close' para {activo}")
-        elif 'Adj Close' not in available_columns and 'Close' in available_columns:
-            datos_mensuales['Adj Close'] = datos_mensuales['Close']
-            print(f"No se encontró 'Adj Close' para {activo}. Usando 'Close' como respaldo (puede no reflejar dividendos)")
-        
-        # Verificar que todas las columnas esperadas estén presentes
-        missing_columns = [col for col in expected_columns if col not in datos_mensuales.columns]
-        if missing_columns:
-            print(f"Error: Faltan columnas para {activo}: {missing_columns}")
-            return None
-        
-        # Seleccionar y renombrar columnas
-        datos_mensuales = datos_mensuales[expected_columns].rename(
-            columns={'Adj Close': 'Adj_Close'}
-        )
-        
-        # Redondear columnas numéricas a 3 decimales
-        datos_mensuales[['Open', 'High', 'Low', 'Close', 'Adj_Close']] = datos_mensuales[['Open', 'High', 'Low', 'Close', 'Adj_Close']].round(3)
-        
-        # Filtrar datos hasta el último día del mes completo más reciente
-        datos_mensuales = datos_mensuales[datos_mensuales.index <= fin]
-        
-        # Eliminar filas con datos faltantes
-        datos_mensuales = datos_mensuales.dropna()
-        
-        if datos_mensuales.empty:
-            print(f"No se encontraron datos válidos para {activo} tras resampleo.")
-            return None
-        
-        print(f"Datos procesados para {activo}: {len(datos_mensuales)} filas")
-        return datos_mensuales
+        logger.debug("Columnas originales para %s: %s", activo, list(datos.columns))
+        logger.debug("Filas descargadas para %s: %d", activo, len(datos))
+        return normalizar_barras(datos, activo)
     except Exception as e:
-        print(f"Error al obtener datos para {activo}: {e}")
+        logger.error("Error al obtener datos para %s: %s", activo, e)
+        return None
+
+def mensualizar(diarios, fin, activo=''):
+    """Barras mensuales (último día de cada mes) a partir de las diarias, con los
+    precios redondeados a 3 decimales y hasta el último mes completo `fin`."""
+    if diarios is None:
+        return None
+    # Resamplear a mensuales, tomando el último día del mes
+    datos_mensuales = diarios.resample('ME').last()
+
+    # Redondear columnas numéricas a 3 decimales
+    datos_mensuales[['Open', 'High', 'Low', 'Close', 'Adj_Close']] = datos_mensuales[['Open', 'High', 'Low', 'Close', 'Adj_Close']].round(3)
+
+    # Filtrar datos hasta el último día del mes completo más reciente
+    datos_mensuales = datos_mensuales[datos_mensuales.index <= fin]
+
+    # Eliminar filas con datos faltantes
+    datos_mensuales = datos_mensuales.dropna()
+
+    if datos_mensuales.empty:
+        logger.warning("No se encontraron datos válidos para %s tras resampleo.", activo)
         return None
 
-# 3. Almacenar Datos
-# 3.1 Crear conexión a la base de datos
+    logger.debug("Datos procesados para %s: %d filas", activo, len(datos_mensuales))
+    return datos_mensuales
+
+def obtener_datos(activo, inicio, fin, proveedor=None, reintentos=3, espera=1.0):
+    return mensualizar(obtener_datos_diarios(activo, inicio, fin, proveedor, reintentos, espera), fin, activo)
+
+# 4. Descargar Activos en Paralelo
+def descargar_activos(tareas, proveedor=None, max_concurrencia=8, reintentos=3, espera=1.0, diarios=False):
+    """Ejecuta obtener_datos (u obtener_datos_diarios con diarios=True) para cada
+    (activo, inicio, fin) de `tareas` en un pool de como máximo `max_concurrencia`
+    hilos y va entregando (tarea, datos) a medida que terminan, para que la
+    escritura en la base de datos no espere a la descarga completa."""
+    if proveedor is None:
+        proveedor = ProveedorYahoo()
+    obtener = obtener_datos_diarios if diarios else obtener_datos
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrencia)) as executor:
+        futuros = {executor.submit(obtener, *tarea, proveedor, reintentos, espera): tuple(tarea) for tarea in tareas}
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
+
+# 5. Almacenar Datos
+# 5.1 Crear conexión a la base de datos
 def crear_conexion(db_file):
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexión establecida a {db_file}")
+        conn = conectar(db_file)
+        logger.debug("Conexión establecida a %s", db_file)
         return conn
     except Error as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        logger.error("Error al conectar a la base de datos: %s", e)
     return conn
 
-# 3.2 Crear tabla para el activo
-def crear_tabla(conn, activo):
+# 5.2 Crear tablas de precios mensuales y diarios (formato largo, una fila por activo y fecha)
+def crear_tabla(conn, diaria=False):
+    crear_tabla_precios(conn)
+    if diaria:
+        crear_tabla_precios(conn, TABLA_DIARIA)
+    logger.debug("Tablas de precios creadas o verificadas")
+
+# 5.3 Configurar la conexión para cargas masivas
+def configurar_conexion(conn):
     try:
         c = conn.cursor()
-        c.execute(f'''CREATE TABLE IF NOT EXISTS {activo} (
-                        date TEXT PRIMARY KEY,
-                        open REAL,
-                        high REAL,
-                        low REAL,
-                        close REAL,
-                        adj_close REAL,
-                        volume INTEGER
-                    )''')
-        print(f"Tabla creada o verificada para {activo}")
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute("PRAGMA temp_store=MEMORY")
+        c.execute("PRAGMA cache_size=-65536")  # 64 MB
     except sqlite3.Error as e:
-        print(f"Error al crear la tabla: {e}")
+        logger.error("Error al configurar la conexión: %s", e)
 
-# 3.3 Insertar datos en la tabla
-def insertar_datos(conn, activo, datos):
-    if datos is not None and not datos.empty:
-        try:
-            c = conn.cursor()
-            filas_insertadas = 0
-            required_columns = ['Open', 'High', 'Low', 'Close', 'Adj_Close', 'Volume']
-            if not all(col in datos.columns for col in required_columns):
-                print(f"Error: Faltan columnas necesarias: {required_columns}")
-                return
-            
-            for index, row in datos.iterrows():
-                c.execute(f'''INSERT OR IGNORE INTO {activo} (date, open, high, low, close, adj_close, volume)
-                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                          (index.strftime('%Y-%m-%d'),
-                           float(row['Open']),
-                           float(row['High']),
-                           float(row['Low']),
-                           float(row['Close']),
-                           float(row['Adj_Close']),
-                           int(row['Volume'])))
-                filas_insertadas += 1
+# 5.4 Insertar datos en la tabla
+@medir('insercion_bd')
+def insertar_datos(conn, activo, datos, commit=True, tabla=TABLA_PRECIOS, reemplazar=False, lanzar=False):
+    """Inserta el DataFrame completo con un único executemany en `tabla` (prices o
+    prices_daily). Con commit=False la escritura queda dentro de la transacción
+    abierta para que el llamador confirme toda la carga de una vez. Con
+    reemplazar=True las filas existentes se sobrescriben en lugar de omitirse.
+    Con lanzar=True los errores se propagan (para que el llamador deshaga la
+    transacción) en lugar de registrarse y devolver (0, 0).
+    Devuelve (filas_insertadas, filas_omitidas)."""
+    if datos is None or datos.empty:
+        logger.warning("No hay datos para insertar")
+        return 0, 0
+    required_columns = ['Open', 'High', 'Low', 'Close', 'Adj_Close', 'Volume']
+    if not all(col in datos.columns for col in required_columns):
+        logger.error("Faltan columnas necesarias: %s", required_columns)
+        return 0, 0
+    try:
+        filas = list(zip(
+            [activo] * len(datos),
+            datos.index.strftime('%Y-%m-%d'),
+            *(datos[col].to_numpy(dtype=float).tolist() for col in ['Open', 'High', 'Low', 'Close', 'Adj_Close']),
+            datos['Volume'].to_numpy(dtype=np.int64).tolist()
+        ))
+        cambios_previos = conn.total_changes
+        conflicto = 'REPLACE' if reemplazar else 'IGNORE'
+        conn.executemany(f'''INSERT OR {conflicto} INTO {tabla} (ticker, date, open, high, low, close, adj_close, volume)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', filas)
+        if commit:
             conn.commit()
-            print(f"{filas_insertadas} filas insertadas para {activo}")
-        except sqlite3.Error as e:
-            print(f"Error al insertar datos: {e}")
-        except Exception as e:
-            print(f"Error inesperado al insertar datos: {e}")
-            print("Fila problemática:", row.to_dict())
-    else:
-        print("No hay datos para insertar")
+        filas_insertadas = conn.total_changes - cambios_previos
+        filas_omitidas = len(filas) - filas_insertadas
+        logger.info("%d filas insertadas y %d omitidas (ya existentes) para %s en %s", filas_insertadas, filas_omitidas,
+                    activo, tabla)
+        return filas_insertadas, filas_omitidas
+    except sqlite3.Error as e:
+        if lanzar:
+            raise
+        logger.error("Error al insertar datos: %s", e)
+    except Exception as e:
+        if lanzar:
+            raise
+        logger.error("Error inesperado al insertar datos para %s: %s", activo, e)
+    return 0, 0
 
-# 4. Verificar Última Fecha Registrada
-def obtener_ultima_fecha(conn, activo):
+# 6. Verificar Última Fecha Registrada
+def obtener_ultima_fecha(conn, activo, tabla=TABLA_PRECIOS):
     try:
         c = conn.cursor()
-        c.execute(f"SELECT MAX(date) FROM {activo}")
+        c.execute(f"SELECT MAX(date) FROM {tabla} WHERE ticker = ?", (activo,))
         result = c.fetchone()[0]
         if result:
             return datetime.strptime(result, '%Y-%m-%d').date()
@@ -169,17 +270,92 @@ def obtener_ultima_fecha(conn, activo):
     except sqlite3.Error:
         return None
 
-# 5. Verificar Existencia de Tabla
-def tabla_existe(conn, activo):
+# 7. Verificar Existencia del Activo
+def tabla_existe(conn, activo, tabla=TABLA_PRECIOS):
     try:
         c = conn.cursor()
-        c.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{activo}'")
+        c.execute(f"SELECT 1 FROM {tabla} WHERE ticker = ? LIMIT 1", (activo,))
         return c.fetchone() is not None
     except sqlite3.Error:
         return False
 
-# 6. Integración
-def main():
+# 8. Leer Barras Diarias Almacenadas
+def leer_barras_diarias(conn, activos, desde=None):
+    """Barras diarias guardadas de `activos` (desde la fecha `desde`) con una sola
+    consulta: {activo: DataFrame con las columnas de COLUMNAS_PRECIOS}."""
+    query = f"""SELECT ticker, date, open, high, low, close, adj_close, volume FROM {TABLA_DIARIA}
+                WHERE ticker IN ({', '.join('?' * len(activos))})"""
+    params = list(activos)
+    if desde is not None:
+        query += " AND date >= ?"
+        params.append(desde)
+    df = pd.read_sql_query(query + " ORDER BY ticker, date", conn, params=params)
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    df.columns = ['ticker', 'Date'] + COLUMNAS_PRECIOS
+    return {activo: datos.drop(columns='ticker').set_index('Date') for activo, datos in df.groupby('ticker', sort=False)}
+
+# 9. Actualizar la Base de Datos
+def actualizar_base_datos(conn, activos, inicio_historico, fin, proveedor=None, max_concurrencia=8):
+    """Descarga solo los rangos de fechas que faltan en cada activo (el final de la
+    serie, los huecos intermedios y la historia nunca pedida) según la tabla
+    fetch_state, guarda las barras diarias y recalcula en prices los meses que han
+    recibido barras nuevas. Todo en una transacción. Devuelve
+    (filas_insertadas, filas_omitidas) de la tabla mensual."""
+    crear_tabla(conn, diaria=True)
+    crear_tabla_estado(conn)
+
+    # Estado de todo el universo en una consulta; los activos con barras diarias
+    # pero sin estado (bases anteriores a fetch_state) lo reconstruyen de prices_daily
+    estado = cargar_estado_descargas(conn)
+    estado.update(reconstruir_cobertura(conn, [activo for activo in activos if activo not in estado]))
+
+    # fin es el último día incluido; las tareas usan fin exclusivo como yf.download
+    fin_descarga = (datetime.strptime(fin, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    tareas = planificar_descargas(estado, activos, inicio_historico, fin_descarga, INICIO_MINIMO)
+    logger.info("%d rangos por descargar en %d activos", len(tareas), len({tarea[0] for tarea in tareas}))
+
+    # Descargar en paralelo y almacenar cada rango según termina, todo en una sola
+    # transacción: primero las barras diarias y al final las mensuales de los meses
+    # tocados, derivadas de la serie diaria completa de cada activo
+    configurar_conexion(conn)
+    total_insertadas = total_omitidas = 0
+    meses_tocados = {}
+    try:
+        for (activo, inicio, fin_tarea), diarios in descargar_activos(tareas, proveedor, max_concurrencia, diarios=True):
+            if diarios is None or diarios.empty:
+                continue
+            diarios = diarios.dropna()
+            # El rango solo se marca como cubierto cuando sus barras ya están escritas
+            insertar_datos(conn, activo, diarios, commit=False, tabla=TABLA_DIARIA, lanzar=True)
+            registrar_descarga(estado, activo, inicio, fin_tarea, diarios, INICIO_MINIMO.get(activo))
+            meses_tocados.setdefault(activo, set()).update(diarios.index.to_period('M'))
+
+        if meses_tocados:
+            desde = min(min(meses) for meses in meses_tocados.values()).start_time.strftime('%Y-%m-%d')
+            with tramo('mensualizar', activos=len(meses_tocados)):
+                barras = leer_barras_diarias(conn, list(meses_tocados), desde)
+            for activo, meses in meses_tocados.items():
+                diarios = barras.get(activo)
+                if diarios is not None:
+                    diarios = diarios[diarios.index.to_period('M').isin(meses)]
+                datos = mensualizar(diarios, fin, activo)
+                if datos is not None:
+                    # Un mes que ya existía y recibe barras se recalcula entero
+                    insertadas, omitidas = insertar_datos(conn, activo, datos, commit=False, reemplazar=True,
+                                                          lanzar=True)
+                    total_insertadas += insertadas
+                    total_omitidas += omitidas
+        guardar_estado_descargas(conn, estado, [activo for activo in activos if activo in estado])
+        conn.commit()
+    except Exception as e:
+        logger.error("Error durante la carga, se deshacen los cambios: %s", e)
+        conn.rollback()
+        total_insertadas = total_omitidas = 0
+    return total_insertadas, total_omitidas
+
+# 10. Integración
+def main(proveedor=None, max_concurrencia=8):
+    configurar_logging()
     # Configuración ACTIVOS y FECHA
     activos = ['SPY', 'QQQ', 'GLD', 'EEM', 'FXI', 'EWZ', 'XLF', 'XLC', 'IEUR', 'XLY', 'VEA', 'XLRE', 'XLB', 'IVE', 'IVW']
     inicio_historico = '2005-01-01'  # Fecha de inicio por defecto
@@ -187,44 +363,37 @@ def main():
     hoy = datetime.today()
     fin = (hoy.replace(day=1) - timedelta(days=1)).strftime('%Y-%m-%d')  # 2025-04-30
     db_file = '/content/drive/MyDrive/Colab Notebooks/EstrategiaMomento/precios_activos_mensual.db'
+    # Exportar además un almacén columnar (<db>.panel) para lecturas rápidas del panel
+    exportar_columnar = True
+    # Guardar las respuestas del proveedor en <db>.cache: repetir la carga o
+    # reconstruir la base de datos desde cero no vuelve a descargar nada
+    usar_cache = True
 
     # Crear conexión
     conn = crear_conexion(db_file)
     if conn is None:
-        print("No se pudo establecer conexión a la base de datos")
+        logger.error("No se pudo establecer conexión a la base de datos")
         return
 
-    # Procesar cada activo
-    for activo in activos:
-        print(f"\nProcesando {activo}...")
-        # Verificar si el activo ya existe
-        if tabla_existe(conn, activo):
-            # Activo existente: obtener última fecha registrada
-            ultima_fecha = obtener_ultima_fecha(conn, activo)
-            if ultima_fecha:
-                # Descargar datos desde el día siguiente a la última fecha
-                inicio = (ultima_fecha + timedelta(days=1)).strftime('%Y-%m-%d')
-                print(f"Activo existente. Descargando datos desde {inicio} hasta {fin}")
-            else:
-                # Si no hay datos previos, usar histórico completo
-                inicio = inicio_historico
-                print(f"No se encontraron datos previos. Descargando histórico desde {inicio} hasta {fin}")
-        else:
-            # Nuevo activo: usar histórico completo
-            inicio = inicio_historico
-            print(f"Nuevo activo. Descargando histórico desde {inicio} hasta {fin}")
-
-        # Obtener datos
-        datos = obtener_datos(activo, inicio, fin)
-
-        # Almacenar datos
-        if datos is not None:
-            crear_tabla(conn, activo)
-            insertar_datos(conn, activo, datos)
+    # Migrar una base de datos con una tabla por activo al formato largo
+    if not usa_tabla_precios(conn) and tablas_por_activo(conn):
+        logger.info("Migrando tablas por activo a la tabla prices...")
+        migrar_base_datos(conn)
+
+    if usar_cache:
+        proveedor = ProveedorConCache(proveedor or ProveedorYahoo(), ruta_cache(db_file))
+    total_insertadas, total_omitidas = actualizar_base_datos(conn, activos, inicio_historico, fin, proveedor,
+                                                             max_concurrencia)
+
+    if exportar_columnar:
+        escribir_almacen_columnar(conn, ruta_columnar(db_file))
 
     # Cerrar conexión
     conn.close()
-    print("\nProceso completado para todos los activos")
+    logger.info("Proceso completado para todos los activos: %d filas insertadas, %d omitidas", total_insertadas,
+                total_omitidas)
+    if usar_cache:
+        logger.info("Caché de descargas: %d aciertos, %d descargas", proveedor.aciertos, proveedor.fallos)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,162 @@
+# ESTADO DE DESCARGAS: FECHA DE INICIO, RANGOS CUBIERTOS Y ÚLTIMA DESCARGA POR ACTIVO
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+import json
+import logging
+from datetime import datetime, timedelta
+from estrategiamomento_almacen import TABLA_DIARIA, usa_tabla_precios
+
+logger = logging.getLogger(__name__)
+
+# La tabla fetch_state guarda, por activo, la primera fecha con datos, los rangos
+# de fechas ya descargados con éxito (lista JSON de [inicio, fin] inclusivos,
+# unidos y ordenados) y el momento de la última descarga con datos. Se lee
+# entera con una consulta al empezar y se escribe con un executemany al acabar.
+# A partir de ella se calculan los rangos que faltan de todo el universo y solo
+# se descargan esos: en una actualización mensual, el último mes de cada activo.
+TABLA_ESTADO = 'fetch_state'
+# Dos barras diarias consecutivas separadas por más días naturales que esto se
+# consideran un hueco al reconstruir los rangos a partir de prices_daily (los
+# cierres de mercado más largos, como el de 2001, son de 6 días)
+DIAS_HUECO = 7
+FORMATO_FECHA = '%Y-%m-%d'
+
+# 2. Esquema y Lectura
+def crear_tabla_estado(conn):
+    try:
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLA_ESTADO} (
+                            ticker TEXT PRIMARY KEY,
+                            inception TEXT,
+                            covered TEXT NOT NULL DEFAULT '[]',
+                            last_fetch TEXT
+                        )''')
+    except sqlite3.Error as e:
+        logger.error("Error al crear la tabla %s: %s", TABLA_ESTADO, e)
+
+def cargar_estado_descargas(conn):
+    """{ticker: {'inicio', 'rangos', 'ultima_descarga'}} de todos los activos en una consulta."""
+    c = conn.cursor()
+    c.execute(f"SELECT ticker, inception, covered, last_fetch FROM {TABLA_ESTADO}")
+    return {ticker: {'inicio': inicio, 'rangos': [tuple(r) for r in json.loads(cubiertos)], 'ultima_descarga': ultima}
+            for ticker, inicio, cubiertos, ultima in c.fetchall()}
+
+def guardar_estado_descargas(conn, estado, activos=None):
+    """Escribe el estado de `activos` (o de todos) sin confirmar la transacción."""
+    activos = estado.keys() if activos is None else activos
+    conn.executemany(f'''INSERT OR REPLACE INTO {TABLA_ESTADO} (ticker, inception, covered, last_fetch)
+                         VALUES (?, ?, ?, ?)''',
+                     [(activo, estado[activo]['inicio'], json.dumps([list(r) for r in estado[activo]['rangos']]),
+                       estado[activo]['ultima_descarga']) for activo in activos if activo in estado])
+
+def reconstruir_cobertura(conn, activos):
+    """Estado inicial de los activos que ya tienen barras diarias pero no figuran en
+    fetch_state (bases anteriores a la tabla): un rango por cada tramo de barras
+    sin huecos de más de DIAS_HUECO días, calculado en una sola consulta."""
+    if not activos or not usa_tabla_precios(conn, TABLA_DIARIA):
+        return {}
+    marcadores = ', '.join(f':a{i}' for i in range(len(activos)))
+    # Solo vuelven de SQLite las barras que abren o cierran un tramo
+    df = pd.read_sql_query(
+        f"""SELECT ticker, date, abre, cierra FROM (
+                SELECT ticker, date,
+                       COALESCE(julianday(date) - julianday(LAG(date) OVER w) > :hueco, 1) AS abre,
+                       COALESCE(julianday(LEAD(date) OVER w) - julianday(date) > :hueco, 1) AS cierra
+                FROM {TABLA_DIARIA} WHERE ticker IN ({marcadores})
+                WINDOW w AS (PARTITION BY ticker ORDER BY date))
+            WHERE abre OR cierra ORDER BY ticker, date""",
+        conn, params={**{f'a{i}': activo for i, activo in enumerate(activos)}, 'hueco': DIAS_HUECO})
+    estado = {}
+    for activo, df_activo in df.groupby('ticker', sort=False):
+        inicios = df_activo.loc[df_activo['abre'] == 1, 'date'].tolist()
+        fines = df_activo.loc[df_activo['cierra'] == 1, 'date'].tolist()
+        # La primera barra guardada no es la fecha de inicio del activo: puede ser
+        # solo la del inicio_historico con que se cargó la base de datos
+        estado[activo] = {'inicio': None, 'rangos': list(zip(inicios, fines)), 'ultima_descarga': None}
+        if len(inicios) > 1:
+            logger.info("%s: %d huecos en las barras diarias", activo, len(inicios) - 1)
+    return estado
+
+# 3. Rangos de Fechas
+def _fecha(texto):
+    return datetime.strptime(texto, FORMATO_FECHA).date()
+
+def _dias(desde, hasta):
+    return (_fecha(hasta) - _fecha(desde)).days
+
+def _texto(fecha):
+    return fecha.strftime(FORMATO_FECHA)
+
+def unir_rangos(rangos):
+    """Ordena y une los rangos [inicio, fin] que se solapan o son contiguos."""
+    unidos = []
+    for inicio, fin in sorted(rangos):
+        if unidos and _dias(unidos[-1][1], inicio) <= 1:
+            if fin > unidos[-1][1]:
+                unidos[-1] = (unidos[-1][0], fin)
+        else:
+            unidos.append((inicio, fin))
+    return unidos
+
+def rangos_faltantes(rangos, inicio, fin):
+    """Partes de [inicio, fin] (inclusivo) no cubiertas por `rangos` que contienen
+    al menos un día hábil."""
+    faltantes, cursor = [], _fecha(inicio)
+    fin = _fecha(fin)
+    for desde, hasta in rangos:
+        desde, hasta = _fecha(desde), _fecha(hasta)
+        if hasta < cursor:
+            continue
+        if desde > fin:
+            break
+        if desde > cursor:
+            faltantes.append((cursor, min(desde - timedelta(days=1), fin)))
+        cursor = max(cursor, hasta + timedelta(days=1))
+    if cursor <= fin:
+        faltantes.append((cursor, fin))
+    return [(_texto(a), _texto(b)) for a, b in faltantes if np.busday_count(a, b + timedelta(days=1)) > 0]
+
+# 4. Planificar y Registrar Descargas
+def planificar_descargas(estado, activos, inicio_historico, fin, inicios_conocidos=None):
+    """Tareas (activo, inicio, fin) de obtener_datos_diarios (fin exclusivo, como
+    yf.download) que cubren todo lo que falta de [inicio_historico, fin) en cada
+    activo, sin pedir fechas anteriores a su primera fecha con datos.
+    `inicios_conocidos` da la primera fecha de los activos que aún no tienen estado."""
+    inicios_conocidos = inicios_conocidos or {}
+    ultimo_dia = _texto(_fecha(fin) - timedelta(days=1))
+    tareas = []
+    for activo in activos:
+        estado_activo = estado.get(activo, {})
+        # Una fecha conocida anterior a la guardada gana: la guardada puede venir de
+        # un estado antiguo que tomaba la primera barra de la primera descarga
+        inicio_activo = min(filter(None, [estado_activo.get('inicio'), inicios_conocidos.get(activo)]), default=None)
+        inicio = max(inicio_historico, inicio_activo) if inicio_activo else inicio_historico
+        for desde, hasta in rangos_faltantes(estado_activo.get('rangos', []), inicio, ultimo_dia):
+            tareas.append((activo, desde, _texto(_fecha(hasta) + timedelta(days=1))))
+    return tareas
+
+def registrar_descarga(estado, activo, inicio, fin, datos, inicio_conocido=None):
+    """Marca [inicio, fin) como cubierto si la descarga devolvió barras. Una
+    descarga vacía no se registra (puede ser un fallo del proveedor) y se vuelve a
+    intentar en la siguiente ejecución. Devuelve True si se registró.
+
+    La primera barra solo se toma como fecha de inicio del activo si la petición
+    empezaba claramente antes de que cotizara: en su fecha conocida
+    (`inicio_conocido`) o antes, o más de DIAS_HUECO días antes de la primera barra.
+    Una petición que empieza en un inicio_historico cualquiera no fija nada, y
+    bajar después inicio_historico sigue descargando la historia anterior."""
+    if datos is None or datos.empty:
+        return False
+    estado_activo = estado.setdefault(activo, {'inicio': None, 'rangos': [], 'ultima_descarga': None})
+    primera = _texto(datos.index.min())
+    inicio_activo = estado_activo['inicio']
+    if inicio_activo is None or inicio <= inicio_activo:
+        if (inicio_conocido and inicio <= inicio_conocido) or _dias(inicio, primera) > DIAS_HUECO:
+            estado_activo['inicio'] = primera
+    if inicio_activo is not None and primera < inicio_activo:
+        estado_activo['inicio'] = primera
+    ultimo_dia = _texto(_fecha(fin) - timedelta(days=1))
+    estado_activo['rangos'] = unir_rangos(estado_activo['rangos'] + [(inicio, ultimo_dia)])
+    estado_activo['ultima_descarga'] = datetime.now().isoformat(timespec='seconds')
+    return True
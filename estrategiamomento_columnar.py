@@ -0,0 +1,121 @@
+# ALMACÉN COLUMNAR DE PRECIOS (MATRICES .npy MAPEADAS EN MEMORIA)
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+import argparse
+import logging
+from estrategiamomento_almacen import crear_conexion, usa_tabla_precios
+from estrategiamomento_instrumentacion import configurar_logging
+
+logger = logging.getLogger(__name__)
+
+# Un almacén columnar es un directorio con:
+#   fechas.npy        fechas del panel (datetime64[D], ordenadas)
+#   activos.json      tickers en el orden de las columnas
+#   <columna>.npy     matriz fechas x activos (float64, orden Fortran, NaN sin dato)
+# Al guardarse en orden Fortran cada activo es un bloque contiguo en disco, y
+# np.load(mmap_mode='r') lo expone a pandas sin copiar ni parsear fechas.
+EXTENSION_COLUMNAR = '.panel'
+COLUMNAS_OHLCV = ['open', 'high', 'low', 'close', 'adj_close', 'volume']
+
+# 2. Rutas y Detección
+def ruta_columnar(db_file):
+    return os.path.splitext(db_file)[0] + EXTENSION_COLUMNAR
+
+def es_almacen_columnar(ruta):
+    return os.path.isdir(ruta) and os.path.exists(os.path.join(ruta, 'fechas.npy'))
+
+def version_almacen(directorio):
+    """Identificador que cambia cada vez que se reescribe el almacén."""
+    return os.stat(os.path.join(directorio, 'fechas.npy')).st_mtime_ns
+
+# 3. Escribir Almacén desde SQLite
+def escribir_almacen_columnar(conn, directorio, columnas=COLUMNAS_OHLCV):
+    """Exporta la tabla prices a `directorio`. Se escribe en un directorio temporal
+    y se renombra al final, de modo que los lectores nunca ven un almacén a medias."""
+    if not usa_tabla_precios(conn):
+        logger.error("La base de datos no tiene tabla prices; migrarla antes de exportar")
+        return False
+    df = pd.read_sql_query(f"SELECT ticker, date, {', '.join(columnas)} FROM prices ORDER BY date, ticker", conn)
+    if df.empty:
+        logger.warning("No hay precios para exportar")
+        return False
+    fechas, fila = np.unique(pd.to_datetime(df['date'], format='%Y-%m-%d').to_numpy(dtype='datetime64[D]'),
+                             return_inverse=True)
+    activos, columna = np.unique(df['ticker'].to_numpy(dtype=str), return_inverse=True)
+    matrices = {}
+    for nombre in columnas:
+        matriz = np.full((len(fechas), len(activos)), np.nan, order='F')
+        matriz[fila, columna] = df[nombre].to_numpy(dtype=float)
+        matrices[nombre] = matriz
+    escribir_matrices(directorio, fechas, activos.tolist(), matrices)
+    return True
+
+def escribir_matrices(directorio, fechas, activos, matrices):
+    """Escribe un almacén a partir de las fechas, los activos y una matriz
+    fechas x activos por columna."""
+    temporal = directorio + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    np.save(os.path.join(temporal, 'fechas.npy'), np.asarray(fechas, dtype='datetime64[D]'))
+    with open(os.path.join(temporal, 'activos.json'), 'w') as f:
+        json.dump(list(activos), f)
+    for nombre, matriz in matrices.items():
+        np.save(os.path.join(temporal, f'{nombre}.npy'), np.asfortranarray(matriz, dtype=float))
+
+    anterior = directorio + '.old'
+    shutil.rmtree(anterior, ignore_errors=True)
+    if os.path.exists(directorio):
+        os.rename(directorio, anterior)
+    os.rename(temporal, directorio)
+    shutil.rmtree(anterior, ignore_errors=True)
+    logger.info("Almacén columnar escrito en %s: %d fechas x %d activos", directorio, len(fechas), len(activos))
+
+# 4. Leer Almacén
+def leer_activos_columnar(directorio):
+    with open(os.path.join(directorio, 'activos.json')) as f:
+        return json.load(f)
+
+def leer_panel_columnar(directorio, columna='adj_close', activos=None):
+    """Matriz fechas x activos respaldada por el fichero mapeado en memoria."""
+    fechas = pd.DatetimeIndex(np.load(os.path.join(directorio, 'fechas.npy')).astype('datetime64[ns]'))
+    matriz = np.load(os.path.join(directorio, f'{columna}.npy'), mmap_mode='r')
+    panel = pd.DataFrame(matriz, index=fechas, columns=leer_activos_columnar(directorio), copy=False)
+    if activos is not None:
+        panel = panel.reindex(columns=list(activos))
+    return panel
+
+def leer_serie_columnar(directorio, activo, columna='adj_close'):
+    """Serie de un activo sin las fechas anteriores a su inicio. Si no tiene huecos
+    intermedios el resultado es una vista del fichero mapeado."""
+    activos = leer_activos_columnar(directorio)
+    if activo not in activos:
+        return None
+    fechas = np.load(os.path.join(directorio, 'fechas.npy')).astype('datetime64[ns]')
+    valores = np.load(os.path.join(directorio, f'{columna}.npy'), mmap_mode='r')[:, activos.index(activo)]
+    posiciones = np.flatnonzero(~np.isnan(valores))
+    if len(posiciones) and posiciones[-1] - posiciones[0] + 1 == len(posiciones):
+        seleccion = slice(posiciones[0], posiciones[-1] + 1)
+    else:
+        seleccion = posiciones
+    return pd.Series(valores[seleccion], index=pd.DatetimeIndex(fechas[seleccion]), name=activo, copy=False)
+
+# 5. Main
+def main():
+    parser = argparse.ArgumentParser(description="Exporta la tabla prices a un almacén columnar")
+    parser.add_argument('db_file')
+    parser.add_argument('--destino', default=None, help="Directorio de salida (por defecto <db>.panel)")
+    args = parser.parse_args()
+    configurar_logging()
+
+    conn = crear_conexion(args.db_file)
+    if conn is None:
+        return
+    escribir_almacen_columnar(conn, args.destino or ruta_columnar(args.db_file))
+    conn.close()
+
+if __name__ == '__main__':
+    main()
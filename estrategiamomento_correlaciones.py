@@ -0,0 +1,152 @@
+# TENSOR DE CORRELACIONES MÓVILES DE 12 MESES (MESES x ACTIVOS x ACTIVOS)
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+import threading
+import time
+import logging
+from estrategiamomento_almacen import usa_tabla_precios
+from estrategiamomento_columnar import es_almacen_columnar, version_almacen
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_instrumentacion import conectar
+from estrategiamomento_backtesting_vectorizado import cargar_panel_precios, comprimir_panel, calcular_correlaciones_panel
+
+logger = logging.getLogger(__name__)
+
+# 2. Tensor de Correlaciones
+class TensorCorrelaciones:
+    """Correlaciones de todos los pares de activos para cada fin de mes del panel,
+    calculadas una sola vez en una pasada vectorizada. La matriz de un mes se
+    obtiene como un corte del tensor y, cuando el panel crece, extender() solo
+    calcula los meses nuevos (o todo, si cambió algún precio ya usado)."""
+
+    def __init__(self, panel, dtype=np.float64):
+        self.activos = list(panel.columns)
+        self.posiciones = {activo: j for j, activo in enumerate(self.activos)}
+        self.dtype = dtype
+        self.fechas = pd.DatetimeIndex([])
+        self.tensor = np.empty((0, len(self.activos), len(self.activos)), dtype=dtype)
+        self._precios = np.empty((0, len(self.activos)))
+        self.extender(panel)
+
+    def extender(self, panel):
+        """Añade los meses de `panel` que aún no están en el tensor. Devuelve el
+        número de meses calculados."""
+        if list(panel.columns) != self.activos:
+            raise ValueError("El panel debe tener los mismos activos que el tensor")
+        precios = panel.to_numpy(dtype=float)
+        desde = min(len(self.fechas), len(precios))
+        # Si cambia el comienzo del panel o algún precio anterior, se recalcula todo
+        if desde and (panel.index[0] != self.fechas[0] or
+                      not np.array_equal(precios[:desde], self._precios[:desde], equal_nan=True)):
+            desde = 0
+        validos, conteo, _, retornos = comprimir_panel(precios)
+        nuevos = calcular_correlaciones_panel(validos, conteo, retornos, np.arange(desde, len(precios)))
+        self.tensor = np.concatenate([self.tensor[:desde], nuevos.astype(self.dtype, copy=False)])
+        self.fechas = panel.index
+        self._precios = precios
+        return len(precios) - desde
+
+    def posicion(self, fecha):
+        """Posición del fin de mes `fecha` en el tensor (KeyError si no está)."""
+        return self.fechas.get_loc(pd.Timestamp(fecha))
+
+    def matriz(self, mes):
+        """Matriz activos x activos de un mes, por posición o por fecha (vista, sin copia)."""
+        return self.tensor[mes if isinstance(mes, (int, np.integer)) else self.posicion(mes)]
+
+    def submatriz(self, mes, activos):
+        """Correlaciones de `activos` entre sí en un mes, en el orden dado."""
+        indices = [self.posiciones[activo] for activo in activos]
+        return self.matriz(mes)[np.ix_(indices, indices)]
+
+# 3. Huella de los Precios
+# El tensor se reutiliza mientras no cambie la huella de los precios de sus
+# activos: número de filas, MAX(date) y suma de adj_close (que detecta también un
+# precio corregido o un hueco rellenado en mitad de la serie). Como en
+# PanelPrecios, se comprueba como mucho cada INTERVALO_VALIDACION segundos.
+INTERVALO_VALIDACION = 30
+
+def huella_precios(db_file, activos):
+    if es_almacen_columnar(db_file):
+        return version_almacen(db_file)
+    try:
+        conn = conectar(db_file)
+    except sqlite3.Error as e:
+        logger.error("Error al conectar a la base de datos: %s", e)
+        return None
+    try:
+        c = conn.cursor()
+        if usa_tabla_precios(conn):
+            c.execute(f"""SELECT COUNT(*), MAX(date), TOTAL(adj_close) FROM prices
+                          WHERE ticker IN ({', '.join('?' * len(activos))})""", list(activos))
+            return c.fetchone()
+        huella = []
+        for activo in activos:
+            try:
+                c.execute(f"SELECT COUNT(*), MAX(date), TOTAL(adj_close) FROM {activo}")
+                huella.append(c.fetchone())
+            except sqlite3.Error:
+                huella.append(None)
+        return tuple(huella)
+    except sqlite3.Error as e:
+        logger.error("Error al leer la huella de los precios: %s", e)
+        return None
+    finally:
+        conn.close()
+
+# 4. Registro de Tensores Compartidos por Base de Datos
+_tensores = {}
+_tensores_lock = threading.Lock()
+
+def obtener_correlaciones(db_file, activos, fecha=None):
+    """Tensor de `activos` en `db_file`, construido la primera vez, extendido
+    cuando se pide un mes posterior al último calculado y recalculado (solo los
+    meses afectados) cuando cambian los precios. Devuelve None si no hay precios."""
+    clave = (db_file, tuple(activos))
+    with _tensores_lock:
+        entrada = _tensores.get(clave)
+        tensor = None
+        huella = None
+        if entrada is not None:
+            tensor = entrada['tensor']
+            if time.monotonic() - entrada['validado'] > INTERVALO_VALIDACION:
+                huella = huella_precios(db_file, activos)
+                if huella != entrada['huella']:
+                    logger.info("Los precios de %s han cambiado, se actualizan las correlaciones", db_file)
+                    # El panel de precios solo detecta cambios de MAX(date): se fuerza la relectura
+                    panel_precios = obtener_panel(db_file)
+                    for activo in activos:
+                        panel_precios.invalidar(activo)
+                    entrada = None
+                else:
+                    entrada['validado'] = time.monotonic()
+            if entrada is not None and (fecha is None or pd.Timestamp(fecha) <= tensor.fechas[-1]):
+                return tensor
+        if huella is None:
+            huella = huella_precios(db_file, activos)
+        panel = cargar_panel_precios(db_file, list(activos))
+        if panel is None or panel.empty:
+            return None
+        panel = panel.reindex(columns=list(activos))
+        if fecha is not None and pd.Timestamp(fecha) > panel.index[-1]:
+            panel = panel.reindex(pd.date_range(start=panel.index[0], end=fecha, freq='ME'))
+        if tensor is None:
+            tensor = TensorCorrelaciones(panel)
+        else:
+            tensor.extender(panel)
+        _tensores[clave] = {'tensor': tensor, 'huella': huella, 'validado': time.monotonic()}
+        return tensor
+
+def registrar_correlaciones(db_file, activos, tensor):
+    """Registra un tensor ya calculado (p. ej. en el proceso padre) para que
+    obtener_correlaciones lo devuelva sin recalcularlo."""
+    with _tensores_lock:
+        _tensores[(db_file, tuple(activos))] = {'tensor': tensor, 'huella': huella_precios(db_file, activos),
+                                                'validado': time.monotonic()}
+
+def invalidar_correlaciones(db_file=None):
+    with _tensores_lock:
+        for clave in [clave for clave in _tensores if db_file is None or clave[0] == db_file]:
+            del _tensores[clave]
@@ -0,0 +1,298 @@
+# DATOS Y GRÁFICOS DEL DASHBOARD (SIN DEPENDER DE STREAMLIT)
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import plotly.express as px
+from collections import OrderedDict
+import threading
+from estrategiamomento_backtesting_vectorizado import (
+    preparar_datos, calcular_correlaciones_panel, calcular_caracteristicas, calcular_momentum_panel,
+    ejecutar_configuracion
+)
+
+# Los gráficos nunca dibujan más puntos por serie de los que caben en su ancho en
+# píxeles ni más de PUNTOS_MAXIMOS en total: con históricos largos o muchos activos
+# las series se reducen (LTTB para las líneas, mínimo/máximo por tramo para las
+# barras, un punto por celda de una rejilla para la dispersión) antes de construir
+# la figura, y por encima de UMBRAL_WEBGL puntos se usan trazas WebGL (scattergl).
+ANCHO_GRAFICO_PX = 1200
+ALTO_GRAFICO_PX = 450
+PUNTOS_MAXIMOS = 20000
+UMBRAL_WEBGL = 1000
+
+# 2. Preparar DataFrames
+def preparar_dataframes(registros_mes, registros_activo):
+    """DataFrames de las pestañas 'Por Mes' y 'Por Activo' a partir de sus registros
+    (lo que devuelve get_all_records), con la columna 'fecha' convertida a datetime."""
+    df_selecciones = pd.DataFrame(registros_mes)
+    df_metricas_activos = pd.DataFrame(registros_activo)
+    for df in [df_selecciones, df_metricas_activos]:
+        if 'fecha' in df.columns:
+            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    return df_selecciones, df_metricas_activos
+
+# 3. Filtrar por Fechas y Activos
+def filtrar_datos(df_selecciones, df_metricas_activos, fecha_inicio, fecha_fin, activos):
+    fecha_inicio, fecha_fin = pd.to_datetime(fecha_inicio), pd.to_datetime(fecha_fin)
+    df_selecciones_filtrado = df_selecciones[(df_selecciones['fecha'] >= fecha_inicio) &
+                                            (df_selecciones['fecha'] <= fecha_fin)]
+    df_metricas_filtrado = df_metricas_activos[(df_metricas_activos['fecha'] >= fecha_inicio) &
+                                              (df_metricas_activos['fecha'] <= fecha_fin) &
+                                              (df_metricas_activos['activo'].isin(activos))]
+    return df_selecciones_filtrado, df_metricas_filtrado
+
+# 4. Filtrado Indexado con Caché
+class DatosDashboard:
+    """Los DataFrames del dashboard ordenados una sola vez (por fecha y por
+    (fecha, activo)), con las fechas como arrays para cortar rangos por búsqueda
+    binaria y, para cada activo, las posiciones de sus filas en orden de fecha.
+    filtrar() y kpis() guardan sus resultados por (rango de fechas, conjunto de
+    activos) en una caché LRU de `max_entradas`, de modo que volver a una
+    selección anterior no recalcula nada. Es seguro compartir una instancia entre
+    sesiones (p. ej. desde st.cache_resource)."""
+
+    def __init__(self, df_selecciones, df_metricas_activos, max_entradas=128):
+        self.df_selecciones = df_selecciones.sort_values('fecha', kind='stable').reset_index(drop=True)
+        self.df_metricas_activos = df_metricas_activos.sort_values(['fecha', 'activo'],
+                                                                   kind='stable').reset_index(drop=True)
+        self._fechas_mes = self.df_selecciones['fecha'].to_numpy(dtype='datetime64[ns]')
+        self._fechas_activo = self.df_metricas_activos['fecha'].to_numpy(dtype='datetime64[ns]')
+        self._filas_activo = {activo: np.asarray(filas, dtype=np.int64) for activo, filas in
+                              self.df_metricas_activos.groupby('activo', sort=False).indices.items()}
+        self.activos = sorted(self._filas_activo)
+        # Sumas acumuladas para el Sharpe promedio de cualquier rango en O(1)
+        self._sharpe_acumulado = np.concatenate([[0.0], np.cumsum(self.df_selecciones['sharpe'].to_numpy(dtype=float))])
+        self._rentabilidad = self.df_selecciones['rentabilidad_mensual'].to_numpy(dtype=float)
+        self.max_entradas = max_entradas
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _rango(fechas, fecha_inicio, fecha_fin):
+        i = np.searchsorted(fechas, np.datetime64(pd.Timestamp(fecha_inicio), 'ns'), side='left')
+        j = np.searchsorted(fechas, np.datetime64(pd.Timestamp(fecha_fin), 'ns'), side='right')
+        return int(i), int(j)
+
+    def _memorizar(self, clave, calcular):
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+        valor = calcular()
+        with self._lock:
+            self._cache[clave] = valor
+            while len(self._cache) > self.max_entradas:
+                self._cache.popitem(last=False)
+        return valor
+
+    def filtrar(self, fecha_inicio, fecha_fin, activos):
+        """Mismo resultado que filtrar_datos (salvo el orden de las filas por
+        activo dentro de un mes)."""
+        fecha_inicio, fecha_fin = pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin)
+        activos = frozenset(activos)
+        return self._memorizar(('filtrar', fecha_inicio, fecha_fin, activos),
+                               lambda: self._filtrar(fecha_inicio, fecha_fin, activos))
+
+    def _filtrar(self, fecha_inicio, fecha_fin, activos):
+        i, j = self._rango(self._fechas_mes, fecha_inicio, fecha_fin)
+        df_selecciones_filtrado = self.df_selecciones.iloc[i:j]
+        i, j = self._rango(self._fechas_activo, fecha_inicio, fecha_fin)
+        # Las posiciones de cada activo están ordenadas: el rango de fechas es otro corte
+        filas = [self._filas_activo[activo] for activo in activos if activo in self._filas_activo]
+        filas = [f[np.searchsorted(f, i):np.searchsorted(f, j)] for f in filas]
+        filas = np.sort(np.concatenate(filas)) if filas else np.arange(0)
+        return df_selecciones_filtrado, self.df_metricas_activos.iloc[filas]
+
+    def kpis(self, fecha_inicio, fecha_fin):
+        """(rentabilidad acumulada, sharpe promedio) del rango, como calcular_kpis
+        (0.0 y NaN si el rango no tiene meses)."""
+        fecha_inicio, fecha_fin = pd.Timestamp(fecha_inicio), pd.Timestamp(fecha_fin)
+        return self._memorizar(('kpis', fecha_inicio, fecha_fin), lambda: self._kpis(fecha_inicio, fecha_fin))
+
+    def _kpis(self, fecha_inicio, fecha_fin):
+        i, j = self._rango(self._fechas_mes, fecha_inicio, fecha_fin)
+        if j <= i:
+            return 0.0, float('nan')
+        rentabilidad_acumulada = float(np.prod(1 + self._rentabilidad[i:j]) - 1)
+        return rentabilidad_acumulada, float((self._sharpe_acumulado[j] - self._sharpe_acumulado[i]) / (j - i))
+
+# 5. Reducción de Series para Gráficos
+def _numerico(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+def indices_lttb(x, y, puntos):
+    """Posiciones de los `puntos` puntos que conserva Largest-Triangle-Three-Buckets:
+    el primero, el último y, en cada tramo intermedio, el que forma el triángulo de
+    mayor área con el punto elegido en el tramo anterior y la media del siguiente.
+    `x` debe estar ordenado."""
+    n = len(y)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+    x, y = _numerico(x), np.nan_to_num(_numerico(y), nan=0.0)
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    indices = np.empty(puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        if i + 2 < len(bordes):
+            media_x, media_y = x[fin:bordes[i + 2]].mean(), y[fin:bordes[i + 2]].mean()
+        else:
+            media_x, media_y = x[-1], y[-1]
+        area = np.abs((x[a] - media_x) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (media_y - y[a]))
+        a = inicio + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def indices_minmax(y, puntos):
+    """Posiciones del mínimo y el máximo de cada uno de `puntos` / 2 tramos (más
+    el primer y el último punto): conserva los extremos, útil para barras."""
+    n = len(y)
+    if puntos >= n or puntos < 4:
+        return np.arange(n)
+    y = np.nan_to_num(_numerico(y), nan=0.0)
+    bordes = np.linspace(0, n, puntos // 2 + 1).astype(np.int64)
+    indices = [0, n - 1]
+    for inicio, fin in zip(bordes[:-1], bordes[1:]):
+        if fin > inicio:
+            indices += [inicio + int(np.argmin(y[inicio:fin])), inicio + int(np.argmax(y[inicio:fin]))]
+    return np.unique(indices)
+
+def indices_rejilla(x, y, celdas_x, celdas_y):
+    """Primer punto de cada celda de una rejilla celdas_x x celdas_y sobre el
+    rango de los datos: mantiene la forma de una nube de puntos."""
+    x, y = _numerico(x), _numerico(y)
+    def celda(v, celdas):
+        minimo, maximo = np.nanmin(v), np.nanmax(v)
+        escala = (celdas - 1) / (maximo - minimo) if maximo > minimo else 0.0
+        return np.nan_to_num((v - minimo) * escala, nan=0.0).astype(np.int64)
+    if len(x) == 0:
+        return np.arange(0)
+    _, indices = np.unique(celda(x, celdas_x) * celdas_y + celda(y, celdas_y), return_index=True)
+    return np.sort(indices)
+
+def reducir_serie(df, x, y, puntos, metodo='lttb', grupo=None):
+    """Filas de `df` (ordenado por `x`) que se dibujan con `puntos` puntos por
+    serie; con `grupo` cada valor de esa columna es una serie independiente."""
+    if grupo is None:
+        if len(df) <= puntos:
+            return df
+        indices = indices_lttb(df[x], df[y], puntos) if metodo == 'lttb' else indices_minmax(df[y], puntos)
+        return df.iloc[indices]
+    if df.empty or df[grupo].value_counts().max() <= puntos:
+        return df
+    return pd.concat([reducir_serie(df_grupo, x, y, puntos, metodo)
+                      for _, df_grupo in df.groupby(grupo, sort=False)])
+
+def puntos_por_serie(num_series, ancho_px=ANCHO_GRAFICO_PX):
+    return max(min(ancho_px, PUNTOS_MAXIMOS // max(num_series, 1)), 3)
+
+def reducir_dispersion(df, x, y, grupo, ancho_px=ANCHO_GRAFICO_PX, alto_px=ALTO_GRAFICO_PX):
+    """Filas de `df` que se dibujan en la dispersión: una por celda de una rejilla
+    por cada valor de `grupo` (cada color conserva su forma), con celdas de al
+    menos 4x4 píxeles y PUNTOS_MAXIMOS celdas en total."""
+    if len(df) <= UMBRAL_WEBGL:
+        return df
+    celdas = min(ancho_px * alto_px // 16, PUNTOS_MAXIMOS // max(df[grupo].nunique(), 1))
+    celdas_x = max(int(np.sqrt(celdas * ancho_px / alto_px)), 1)
+    celdas_y = max(celdas // celdas_x, 1)
+    return pd.concat([df_grupo.iloc[indices_rejilla(df_grupo[x], df_grupo[y], celdas_x, celdas_y)]
+                      for _, df_grupo in df.groupby(grupo, sort=False)])
+
+def modo_render(puntos):
+    return 'webgl' if puntos > UMBRAL_WEBGL else 'svg'
+
+# 6. KPIs y Gráficos
+def calcular_kpis(df_selecciones_filtrado):
+    """(rentabilidad acumulada, sharpe promedio) del periodo filtrado."""
+    rentabilidad_acumulada = (1 + df_selecciones_filtrado['rentabilidad_mensual']).cumprod().iloc[-1] - 1
+    return rentabilidad_acumulada, df_selecciones_filtrado['sharpe'].mean()
+
+def graficos_por_mes(df_selecciones_filtrado, ancho_px=ANCHO_GRAFICO_PX):
+    df = df_selecciones_filtrado.sort_values('fecha')
+    df_capital = reducir_serie(df, 'fecha', 'capitalizacion_final', ancho_px)
+    fig_capital = px.line(df_capital, x='fecha', y='capitalizacion_final',
+                          title="Evolución de la Capitalización Final", render_mode=modo_render(len(df_capital)))
+    # Más de una barra por píxel no se distingue: se conservan el mínimo y el máximo de cada tramo
+    df_rentabilidad = reducir_serie(df, 'fecha', 'rentabilidad_mensual', ancho_px, metodo='minmax')
+    fig_rentabilidad = px.bar(df_rentabilidad, x='fecha', y='rentabilidad_mensual',
+                              title="Rentabilidad Mensual")
+    return fig_capital, fig_rentabilidad
+
+def graficos_por_activo(df_metricas_filtrado, ancho_px=ANCHO_GRAFICO_PX):
+    df = df_metricas_filtrado.sort_values(['activo', 'fecha'], kind='stable')
+    df_momentum = reducir_serie(df, 'fecha', 'momentum_score', puntos_por_serie(df['activo'].nunique(), ancho_px),
+                                grupo='activo')
+    fig_momentum = px.line(df_momentum, x='fecha', y='momentum_score', color='activo',
+                           title="Momentum Score por Activo", render_mode=modo_render(len(df_momentum)))
+    # El tamaño de los puntos no admite valores negativos: se usa el retorno en valor absoluto
+    df_volatilidad = reducir_dispersion(df, 'volatilidad_corta', 'volatilidad_larga', 'activo', ancho_px)
+    fig_volatilidad = px.scatter(df_volatilidad, x='volatilidad_corta', y='volatilidad_larga',
+                                 color='activo', size=df_volatilidad['retorno_activo'].abs(),
+                                 hover_data=['fecha', 'activo', 'retorno_activo'],
+                                 title="Volatilidad Corta vs Larga", render_mode=modo_render(len(df_volatilidad)))
+    return fig_momentum, fig_volatilidad
+
+# 7. Simulador de Parámetros
+class Simulador:
+    """Backtesting vectorizado sobre un panel de precios preparado una sola vez.
+    Las correlaciones no dependen de los parámetros y se calculan al crear el
+    simulador; las características se memorizan por ventanas de volatilidad y los
+    resultados por combinación de parámetros (LRU de `max_entradas`)."""
+
+    def __init__(self, db_file, inicio, fin, activos=None, capital_inicial=10000, max_entradas=64):
+        self.capital_inicial = capital_inicial
+        self.datos = preparar_datos(db_file, inicio, fin, activos=activos)
+        if self.datos is not None:
+            self.datos['correlacion'] = calcular_correlaciones_panel(self.datos['validos'], self.datos['conteo'],
+                                                                     self.datos['retornos'], self.datos['meses'])
+            self._momentum = calcular_momentum_panel(self.datos['conteo'], self.datos['comprimido'],
+                                                     self.datos['meses'])
+        self._caracteristicas = {}
+        self.max_entradas = max_entradas
+        self._resultados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def simular(self, momentum_min=0.7, momentum_max=3, max_activos=3, vol_corta_meses=4, vol_larga_meses=12,
+                comision=0.0025):
+        """(df_selecciones, df_metricas_activos) de la configuración, con 'fecha'
+        como datetime. Vacíos si no hay datos suficientes."""
+        if self.datos is None:
+            return pd.DataFrame(), pd.DataFrame()
+        clave = (float(momentum_min), float(momentum_max), int(max_activos), int(vol_corta_meses),
+                 int(vol_larga_meses), float(comision))
+        with self._lock:
+            if clave in self._resultados:
+                self._resultados.move_to_end(clave)
+                return self._resultados[clave]
+            ventanas = (int(vol_corta_meses), int(vol_larga_meses))
+            if ventanas not in self._caracteristicas:
+                self._caracteristicas[ventanas] = calcular_caracteristicas(self.datos, *ventanas)
+            caracteristicas = self._caracteristicas[ventanas]
+        df_selecciones, df_metricas_activos = ejecutar_configuracion(
+            self.datos, caracteristicas, *self._momentum, self.capital_inicial, clave[0], clave[1], clave[2], clave[5])
+        for df in [df_selecciones, df_metricas_activos]:
+            if 'fecha' in df.columns:
+                df['fecha'] = pd.to_datetime(df['fecha'], format='%Y-%m-%d')
+        with self._lock:
+            self._resultados[clave] = (df_selecciones, df_metricas_activos)
+            while len(self._resultados) > self.max_entradas:
+                self._resultados.popitem(last=False)
+        return df_selecciones, df_metricas_activos
+
+# 8. Paginar Tablas
+# Las tablas se envían al navegador por páginas: serializar un DataFrame completo
+# de decenas de miles de filas en cada interacción cuesta más que filtrarlo.
+FILAS_POR_PAGINA = 100
+
+def numero_paginas(num_filas, filas_por_pagina=FILAS_POR_PAGINA):
+    return max((num_filas + filas_por_pagina - 1) // filas_por_pagina, 1)
+
+def paginar(df, pagina, filas_por_pagina=FILAS_POR_PAGINA):
+    """Filas de la página `pagina` (desde 1), sin copiar el DataFrame."""
+    pagina = min(max(pagina, 1), numero_paginas(len(df), filas_por_pagina))
+    inicio = (pagina - 1) * filas_por_pagina
+    return df.iloc[inicio:inicio + filas_por_pagina]
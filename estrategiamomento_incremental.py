@@ -0,0 +1,179 @@
+# BACKTESTING INCREMENTAL CON ESTADO PERSISTENTE
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import logging
+from estrategiamomento_backtesting_vectorizado import (
+    PESOS_MOMENTUM, preparar_datos, recortar_meses, calcular_caracteristicas, calcular_momentum_panel,
+    simular_selecciones, construir_resultados
+)
+from estrategiamomento_metricas import MetricasAcumuladas, columnas_metricas
+
+logger = logging.getLogger(__name__)
+
+# El estado es un directorio con:
+#   estado.json            parámetros, huellas, último mes procesado y métricas acumuladas (capital incluido)
+#   selecciones.pkl        df_selecciones acumulado
+#   metricas_activos.pkl   df_metricas_activos acumulado
+# estado.json se escribe el último: si la ejecución se interrumpe antes, el
+# estado anterior sigue siendo coherente con los DataFrames que lo acompañan.
+EXTENSION_ESTADO = '.estado'
+# Cambia cuando cambia el contenido del estado o las columnas de los resultados
+VERSION_ESTADO = 3
+
+# 2. Rutas y Huellas
+def ruta_estado(db_file):
+    return os.path.splitext(db_file.rstrip(os.sep))[0] + EXTENSION_ESTADO
+
+def huella_parametros(parametros):
+    return hashlib.sha256(json.dumps(parametros, sort_keys=True).encode()).hexdigest()
+
+def huella_precios(datos, meses_procesados):
+    """Huella de los precios usados por los `meses_procesados` primeros meses: todas
+    las filas del panel hasta la fecha de venta del último de ellos."""
+    hasta = datos['indice'].get_loc(datos['fechas'][meses_procesados]) + 1
+    h = hashlib.sha256()
+    h.update(json.dumps(datos['activos']).encode())
+    h.update(datos['indice'][:hasta].asi8.tobytes())
+    h.update(np.ascontiguousarray(datos['precios'][:hasta]).tobytes())
+    return h.hexdigest()
+
+# 3. Leer y Guardar el Estado
+def cargar_estado(directorio):
+    """(estado, df_selecciones, df_metricas_activos) o (None, None, None) si no hay un estado legible."""
+    try:
+        with open(os.path.join(directorio, 'estado.json')) as f:
+            estado = json.load(f)
+        df_selecciones = pd.read_pickle(os.path.join(directorio, 'selecciones.pkl'))
+        df_metricas_activos = pd.read_pickle(os.path.join(directorio, 'metricas_activos.pkl'))
+    except (OSError, ValueError, EOFError) as e:
+        if os.path.exists(directorio):
+            logger.warning("No se pudo leer el estado en %s, se recalcula desde el inicio: %s", directorio, e)
+        return None, None, None
+    return estado, df_selecciones, df_metricas_activos
+
+def _escribir(ruta, escribir):
+    temporal = ruta + '.tmp'
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+def guardar_estado(directorio, estado, df_selecciones=None, df_metricas_activos=None):
+    os.makedirs(directorio, exist_ok=True)
+    if df_selecciones is not None:
+        _escribir(os.path.join(directorio, 'selecciones.pkl'), df_selecciones.to_pickle)
+    if df_metricas_activos is not None:
+        _escribir(os.path.join(directorio, 'metricas_activos.pkl'), df_metricas_activos.to_pickle)
+
+    def escribir_json(ruta):
+        with open(ruta, 'w') as f:
+            json.dump(estado, f, indent=2)
+    _escribir(os.path.join(directorio, 'estado.json'), escribir_json)
+
+def registrar_publicacion(directorio, spreadsheet_url):
+    """Guarda en el estado la hoja de Google Sheets donde se publicaron los resultados
+    y marca la publicación como hecha."""
+    estado, _, _ = cargar_estado(directorio)
+    if estado is not None:
+        estado['spreadsheet_url'] = spreadsheet_url
+        estado['publicacion_pendiente'] = False
+        guardar_estado(directorio, estado)
+
+# 4. Backtesting Incremental
+def backtesting_incremental(db_file, inicio, fin, directorio_estado=None, capital_inicial=10000, momentum_min=0.7,
+                            momentum_max=3, max_activos=3, vol_corta_meses=4, vol_larga_meses=12, comision=0.0025,
+                            pesos_momentum=PESOS_MOMENTUM, activos=None, panel=None):
+    """Mismo resultado que backtesting_vectorizado, pero calculando solo los meses
+    posteriores al último guardado en `directorio_estado` y añadiendo sus filas a
+    los DataFrames ya calculados. Se recalcula todo cuando cambian los parámetros
+    o alguno de los precios usados por los meses ya procesados.
+
+    Devuelve (df_selecciones, df_metricas_activos, resumen), con resumen =
+    {'meses_nuevos', 'recalculo_completo', 'spreadsheet_url', 'publicacion_pendiente'}."""
+    directorio_estado = directorio_estado or ruta_estado(db_file)
+    datos = preparar_datos(db_file, inicio, fin, activos=activos, panel=panel)
+    if datos is None:
+        return pd.DataFrame(), pd.DataFrame(), {'meses_nuevos': 0, 'recalculo_completo': True, 'spreadsheet_url': None,
+                                                'publicacion_pendiente': False}
+
+    parametros = {
+        'version_estado': VERSION_ESTADO,
+        'inicio': datos['inicio'].strftime('%Y-%m-%d'),
+        'capital_inicial': capital_inicial,
+        'momentum_min': momentum_min,
+        'momentum_max': momentum_max,
+        'max_activos': max_activos,
+        'vol_corta_meses': vol_corta_meses,
+        'vol_larga_meses': vol_larga_meses,
+        'comision': comision,
+        'pesos_momentum': list(pesos_momentum)
+    }
+    huella = huella_parametros(parametros)
+
+    # Meses ya procesados que siguen siendo válidos
+    estado, df_selecciones, df_metricas_activos = cargar_estado(directorio_estado)
+    procesados = 0
+    if estado is not None and estado['huella_parametros'] == huella:
+        procesados = int(np.searchsorted(datos['fechas_meses'], estado['ultima_fecha'], side='right'))
+        if procesados != estado['meses'] or huella_precios(datos, procesados) != estado['huella_precios']:
+            logger.info("Los precios ya procesados han cambiado, se recalcula el backtesting completo")
+            procesados = 0
+    elif estado is not None:
+        logger.info("Los parámetros han cambiado, se recalcula el backtesting completo")
+
+    total = len(datos['meses'])
+    resumen = {
+        'meses_nuevos': total - procesados,
+        'recalculo_completo': procesados == 0,
+        # La hoja se conserva tras un recálculo completo: la publicación solo
+        # reescribe las filas que hayan cambiado
+        'spreadsheet_url': estado.get('spreadsheet_url') if estado is not None else None,
+        'publicacion_pendiente': True
+    }
+    if procesados == total:
+        resumen['publicacion_pendiente'] = estado.get('publicacion_pendiente', False)
+        logger.info("Sin meses nuevos desde %s", estado['ultima_fecha'])
+        return df_selecciones, df_metricas_activos, resumen
+
+    acumulador = (MetricasAcumuladas.desde_estado(estado['metricas']) if procesados
+                  else MetricasAcumuladas(capital_inicial))
+    logger.info("Calculando %d meses desde %s", total - procesados, datos['fechas_meses'][procesados])
+
+    # Solo los meses nuevos
+    nuevos = recortar_meses(datos, procesados)
+    ind = calcular_caracteristicas(nuevos, vol_corta_meses, vol_larga_meses)
+    momentum, tiene_momentum = calcular_momentum_panel(nuevos['conteo'], nuevos['comprimido'], nuevos['meses'],
+                                                       pesos_momentum)
+    selecciones_idx, rentabilidad = simular_selecciones(nuevos, ind, momentum, tiene_momentum, momentum_min,
+                                                        momentum_max, max_activos, comision)
+    capitales = np.cumprod(np.concatenate([[acumulador.capital], 1 + rentabilidad]))
+    capital_previo, capitales = capitales[:-1], capitales[1:]
+
+    # Las métricas acumuladas continúan desde las estadísticas guardadas
+    filas_metricas = []
+    for capital, retorno, años in zip(capitales, rentabilidad, nuevos['años']):
+        acumulador.actualizar_capital(capital)
+        filas_metricas.append(acumulador.metricas(años))
+        acumulador.añadir_retorno(retorno)
+    metricas = pd.DataFrame(filas_metricas, columns=columnas_metricas()).to_dict('list')
+    df_nuevas, df_nuevas_metricas = construir_resultados(nuevos, ind, momentum, selecciones_idx, rentabilidad,
+                                                         capital_previo, capitales, metricas)
+    if procesados:
+        df_selecciones = pd.concat([df_selecciones, df_nuevas], ignore_index=True)
+        df_metricas_activos = pd.concat([df_metricas_activos, df_nuevas_metricas], ignore_index=True)
+    else:
+        df_selecciones, df_metricas_activos = df_nuevas, df_nuevas_metricas
+
+    guardar_estado(directorio_estado, {
+        'parametros': parametros,
+        'huella_parametros': huella,
+        'huella_precios': huella_precios(datos, total),
+        'ultima_fecha': datos['fechas_meses'][-1],
+        'meses': total,
+        'metricas': acumulador.estado(),
+        'spreadsheet_url': resumen['spreadsheet_url'],
+        'publicacion_pendiente': True
+    }, df_selecciones, df_metricas_activos)
+    return df_selecciones, df_metricas_activos, resumen
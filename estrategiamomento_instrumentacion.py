@@ -0,0 +1,220 @@
+# INSTRUMENTACIÓN: TRAMOS CRONOMETRADOS, CONTADORES DE SQLITE Y LOGGING
+# 1. Importar Librerías
+import logging
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+import atexit
+import weakref
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Con ESTRATEGIAMOMENTO_TRAZA=<ruta> la instrumentación se activa al importar el
+# módulo y al terminar el proceso se escriben <ruta>.json y <ruta>.trace.json.
+# ESTRATEGIAMOMENTO_LOG fija el nivel de logging de los scripts (INFO por defecto).
+VARIABLE_TRAZA = 'ESTRATEGIAMOMENTO_TRAZA'
+VARIABLE_LOG = 'ESTRATEGIAMOMENTO_LOG'
+FORMATO_LOG = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# 2. Configurar Logging
+def configurar_logging(nivel=None):
+    """Configura el logging de los scripts. Los módulos escriben con
+    logging.getLogger(__name__): los mensajes de depuración (columnas descargadas,
+    filas por activo...) son DEBUG y el progreso INFO, así que con WARNING una
+    ejecución de producción no paga la salida por consola."""
+    nivel = nivel or os.environ.get(VARIABLE_LOG, 'INFO')
+    if isinstance(nivel, str):
+        nivel = logging.getLevelName(nivel.upper())
+    logging.basicConfig(format=FORMATO_LOG)
+    logging.getLogger().setLevel(nivel)
+
+# 3. Estado Global
+class _Estado:
+    def __init__(self):
+        self.activa = False
+        self.lock = threading.Lock()
+        self.origen = time.perf_counter()
+        self.eventos = []
+        self.contadores = {}
+        self.conexiones = weakref.WeakSet()
+
+_estado = _Estado()
+
+def esta_activa():
+    return _estado.activa
+
+def reiniciar():
+    """Descarta los tramos y contadores registrados hasta ahora."""
+    with _estado.lock:
+        _estado.origen = time.perf_counter()
+        _estado.eventos = []
+        _estado.contadores = {}
+
+def activar(reiniciar_datos=True):
+    if reiniciar_datos:
+        reiniciar()
+    _estado.activa = True
+    for conn in list(_estado.conexiones):
+        _trazar_consultas(conn, True)
+
+def desactivar():
+    _estado.activa = False
+    for conn in list(_estado.conexiones):
+        _trazar_consultas(conn, False)
+
+# 4. Tramos y Contadores
+# Con la instrumentación desactivada, tramo() devuelve siempre el mismo contexto
+# vacío y @medir solo añade una comprobación de la bandera: no se toma el tiempo
+# ni se reserva memoria.
+_NULO = contextlib.nullcontext()
+
+class _Tramo:
+    __slots__ = ('nombre', 'args', 'inicio')
+
+    def __init__(self, nombre, args):
+        self.nombre = nombre
+        self.args = args
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        fin = time.perf_counter()
+        _estado.eventos.append((self.nombre, self.inicio, fin, threading.get_ident(), self.args))
+        return False
+
+def tramo(nombre, **args):
+    """Context manager que registra la duración del bloque con el nombre dado y,
+    opcionalmente, argumentos que aparecen en la traza (p. ej. fecha=...)."""
+    if not _estado.activa:
+        return _NULO
+    return _Tramo(nombre, args or None)
+
+def medir(nombre=None):
+    """Decorador equivalente a envolver cada llamada en tramo(nombre)."""
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _estado.activa:
+                return funcion(*args, **kwargs)
+            with _Tramo(etiqueta, None):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+def contar(contador, cantidad=1):
+    if not _estado.activa:
+        return
+    with _estado.lock:
+        _estado.contadores[contador] = _estado.contadores.get(contador, 0) + cantidad
+
+def extraer_traza():
+    """Tramos y contadores registrados en este proceso, que se descartan de él.
+    Los procesos trabajadores los devuelven con sus resultados para que el padre
+    los añada a su traza con incorporar_traza (el hilo de cada tramo pasa a ser
+    el pid del trabajador)."""
+    with _estado.lock:
+        eventos, contadores = _estado.eventos, _estado.contadores
+        _estado.eventos = []
+        _estado.contadores = {}
+    pid = os.getpid()
+    return [(nombre, inicio, fin, pid, args) for nombre, inicio, fin, _, args in eventos], contadores
+
+def incorporar_traza(traza):
+    if traza is None or not _estado.activa:
+        return
+    eventos, contadores = traza
+    with _estado.lock:
+        _estado.eventos.extend(eventos)
+        for contador, cantidad in contadores.items():
+            _estado.contadores[contador] = _estado.contadores.get(contador, 0) + cantidad
+
+# 5. Conexiones SQLite Instrumentadas
+class ConexionInstrumentada(sqlite3.Connection):
+    """sqlite3.Connection que admite referencias débiles, para poder activar y
+    desactivar el recuento de consultas de las conexiones ya abiertas."""
+
+def _contar_consulta(sentencia):
+    contar('consultas_sqlite')
+
+def _trazar_consultas(conn, activa):
+    try:
+        conn.set_trace_callback(_contar_consulta if activa else None)
+    except sqlite3.ProgrammingError:
+        # Conexión cerrada o creada en otro hilo con check_same_thread=True
+        pass
+
+def conectar(db_file, **kwargs):
+    """sqlite3.connect que cuenta las conexiones abiertas y, mientras la
+    instrumentación está activa, las sentencias ejecutadas (consultas_sqlite:
+    cada SELECT, BEGIN/COMMIT y cada fila de un executemany)."""
+    conn = sqlite3.connect(db_file, factory=ConexionInstrumentada, **kwargs)
+    _estado.conexiones.add(conn)
+    contar('conexiones_sqlite')
+    if _estado.activa:
+        _trazar_consultas(conn, True)
+    return conn
+
+# 6. Resumen y Exportación
+def resumen():
+    """{'tramos': {nombre: {llamadas, total, min, max, media}}, 'contadores': {...}}
+    con los tiempos en segundos."""
+    with _estado.lock:
+        eventos = list(_estado.eventos)
+        contadores = dict(_estado.contadores)
+    tramos = {}
+    for nombre, inicio, fin, _, _ in eventos:
+        duracion = fin - inicio
+        t = tramos.setdefault(nombre, {'llamadas': 0, 'total': 0.0, 'min': duracion, 'max': duracion})
+        t['llamadas'] += 1
+        t['total'] += duracion
+        t['min'] = min(t['min'], duracion)
+        t['max'] = max(t['max'], duracion)
+    for t in tramos.values():
+        t['media'] = t['total'] / t['llamadas']
+    return {'tramos': tramos, 'contadores': contadores}
+
+def eventos_chrome():
+    """Tramos y contadores en el formato de eventos de traza de Chrome
+    (chrome://tracing, Perfetto), con los tiempos en microsegundos."""
+    with _estado.lock:
+        eventos = list(_estado.eventos)
+        contadores = dict(_estado.contadores)
+        origen = _estado.origen
+    pid = os.getpid()
+    traza = []
+    for nombre, inicio, fin, hilo, args in eventos:
+        evento = {'name': nombre, 'cat': 'estrategiamomento', 'ph': 'X', 'pid': pid, 'tid': hilo,
+                  'ts': (inicio - origen) * 1e6, 'dur': (fin - inicio) * 1e6}
+        if args:
+            evento['args'] = {clave: str(valor) for clave, valor in args.items()}
+        traza.append(evento)
+    if contadores:
+        final = max((fin for _, _, fin, _, _ in eventos), default=time.perf_counter())
+        traza.append({'name': 'contadores', 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': (final - origen) * 1e6,
+                      'args': contadores})
+    return {'traceEvents': traza, 'displayTimeUnit': 'ms'}
+
+def exportar_json(ruta):
+    with open(ruta, 'w') as f:
+        json.dump(resumen(), f, indent=2)
+
+def exportar_chrome(ruta):
+    with open(ruta, 'w') as f:
+        json.dump(eventos_chrome(), f)
+
+def _exportar_al_salir(ruta):
+    exportar_json(f'{ruta}.json')
+    exportar_chrome(f'{ruta}.trace.json')
+    logger.info("Traza escrita en %s.json y %s.trace.json", ruta, ruta)
+
+if os.environ.get(VARIABLE_TRAZA):
+    activar()
+    atexit.register(_exportar_al_salir, os.environ[VARIABLE_TRAZA])
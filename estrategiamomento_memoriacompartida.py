@@ -0,0 +1,107 @@
+# PANEL DE PRECIOS EN MEMORIA COMPARTIDA PARA PROCESOS TRABAJADORES
+# 1. Importar Librerías
+import numpy as np
+import os
+import shutil
+import tempfile
+import contextlib
+import logging
+from estrategiamomento_almacen import crear_conexion, usa_tabla_precios, leer_panel
+from estrategiamomento_columnar import es_almacen_columnar, escribir_matrices, leer_activos_columnar
+from estrategiamomento_instrumentacion import tramo
+
+logger = logging.getLogger(__name__)
+
+# El proceso padre lee una vez las matrices fechas x activos (adj_close y, si se
+# piden, el resto de OHLCV) y las escribe como almacén columnar en un directorio
+# de /dev/shm (tmpfs: los ficheros viven en memoria, igual que los bloques de
+# multiprocessing.shared_memory). Los trabajadores reciben solo el descriptor
+# (un diccionario pequeño con la ruta) y abren las matrices con np.load(mmap_mode='r'):
+# todos comparten las mismas páginas físicas, sin copiar ni volver a leer SQLite,
+# así que la memoria no crece con el número de procesos. Como el directorio es un
+# almacén columnar, la ruta del descriptor sirve en cualquier sitio que acepte un
+# db_file (PanelPrecios, cargar_panel_precios, seleccionar_activos...).
+# Si la fuente ya es un almacén columnar se comparte tal cual. publicar_arrays
+# comparte igual cualquier otro conjunto de arrays (las matrices del barrido).
+DIRECTORIO_MEMORIA = '/dev/shm'
+PREFIJO = 'estrategiamomento_panel_'
+
+# 2. Publicar y Liberar
+def publicar_panel(db_file, activos=None, columnas=('adj_close',), directorio=None):
+    """Publica el panel de `db_file` (de `activos` o de todos) y devuelve su
+    descriptor. Hay que liberarlo con liberar_panel (o usar panel_compartido)."""
+    columnas = list(columnas)
+    if es_almacen_columnar(db_file):
+        return {'ruta': db_file, 'activos': leer_activos_columnar(db_file), 'columnas': columnas, 'propio': False}
+
+    conn = crear_conexion(db_file)
+    if conn is None:
+        return None
+    try:
+        if not usa_tabla_precios(conn):
+            logger.warning("La base de datos no tiene tabla prices; migrarla para compartir el panel")
+            return None
+        with tramo('publicar_panel', columnas=len(columnas)):
+            paneles = {columna: leer_panel(conn, activos, columna=columna) for columna in columnas}
+    finally:
+        conn.close()
+    referencia = paneles[columnas[0]]
+    if referencia.empty:
+        logger.warning("No hay precios para compartir")
+        return None
+
+    if directorio is None:
+        directorio = DIRECTORIO_MEMORIA if os.path.isdir(DIRECTORIO_MEMORIA) else None
+    ruta = tempfile.mkdtemp(prefix=PREFIJO, dir=directorio)
+    # escribir_matrices escribe en <ruta>.tmp y renombra: el directorio vacío sobra
+    os.rmdir(ruta)
+    escribir_matrices(ruta, referencia.index.to_numpy(dtype='datetime64[D]'), list(referencia.columns),
+                      {columna: panel.reindex(index=referencia.index, columns=referencia.columns).to_numpy(dtype=float)
+                       for columna, panel in paneles.items()})
+    tamaño = sum(os.path.getsize(os.path.join(ruta, nombre)) for nombre in os.listdir(ruta))
+    logger.info("Panel compartido en %s: %d fechas x %d activos, %.1f MB", ruta, len(referencia),
+                referencia.shape[1], tamaño / 1024 ** 2)
+    return {'ruta': ruta, 'activos': list(referencia.columns), 'columnas': columnas, 'propio': True}
+
+def publicar_arrays(arrays, directorio=None):
+    """Publica arrays NumPy cualesquiera ({nombre: array}, p. ej. las matrices
+    derivadas del panel que usa el barrido de parámetros) en un directorio de
+    /dev/shm, uno por fichero .npy. Devuelve el descriptor."""
+    if directorio is None:
+        directorio = DIRECTORIO_MEMORIA if os.path.isdir(DIRECTORIO_MEMORIA) else None
+    ruta = tempfile.mkdtemp(prefix=PREFIJO, dir=directorio)
+    for nombre, array in arrays.items():
+        np.save(os.path.join(ruta, f'{nombre}.npy'), array)
+    logger.info("%d arrays compartidos en %s, %.1f MB", len(arrays), ruta,
+                sum(array.nbytes for array in arrays.values()) / 1024 ** 2)
+    return {'ruta': ruta, 'arrays': list(arrays), 'propio': True}
+
+def liberar_panel(descriptor):
+    """Borra el panel o los arrays publicados (los procesos que aún lo tengan abierto conservan
+    sus mapeos hasta cerrarlos)."""
+    if descriptor is not None and descriptor['propio']:
+        shutil.rmtree(descriptor['ruta'], ignore_errors=True)
+
+@contextlib.contextmanager
+def arrays_compartidos(arrays, directorio=None):
+    descriptor = publicar_arrays(arrays, directorio)
+    try:
+        yield descriptor
+    finally:
+        liberar_panel(descriptor)
+
+@contextlib.contextmanager
+def panel_compartido(db_file, activos=None, columnas=('adj_close',), directorio=None):
+    descriptor = publicar_panel(db_file, activos, columnas, directorio)
+    try:
+        yield descriptor
+    finally:
+        liberar_panel(descriptor)
+
+# 3. Adjuntar desde un Trabajador
+# El panel se adjunta pasando descriptor['ruta'] como db_file (es un almacén
+# columnar); los arrays, con adjuntar_arrays.
+def adjuntar_arrays(descriptor):
+    """{nombre: array} de solo lectura sobre los ficheros compartidos, sin copia."""
+    return {nombre: np.load(os.path.join(descriptor['ruta'], f'{nombre}.npy'), mmap_mode='r')
+            for nombre in descriptor['arrays']}
@@ -0,0 +1,153 @@
+# MÉTRICAS DE RENDIMIENTO: ACUMULADOR MES A MES Y CÁLCULO SOBRE SERIES COMPLETAS
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+from collections import deque
+
+TASA_LIBRE_RIESGO = 0.02
+# Ventanas (en periodos) de los Sharpe móviles
+VENTANAS_SHARPE = (12, 36)
+
+def columnas_metricas(ventanas=VENTANAS_SHARPE):
+    return (['sharpe', 'volatilidad_final', 'cagr', 'max_drawdown', 'sortino', 'calmar'] +
+            [f'sharpe_{v}m' for v in ventanas])
+
+# Convenciones comunes a las dos implementaciones (las de calcular_metricas):
+# - las métricas de un periodo usan el capital tras ese periodo y los retornos
+#   de los periodos anteriores (volatilidad con ddof=0);
+# - todas valen 0 en el primer periodo, con años <= 0 o si no son finitas;
+# - los Sharpe móviles valen 0 hasta tener una ventana completa.
+
+# 2. Acumulador con Coste Constante por Periodo
+class MetricasAcumuladas:
+    """Mantiene media y varianza de los retornos (Welford), la semivarianza
+    bajista, el máximo del capital para el drawdown y la media/varianza de las
+    últimas `ventanas` observaciones, de modo que cada periodo cuesta O(1) sea cual
+    sea la longitud del histórico. Orden de uso en cada periodo:
+    actualizar_capital(capital), metricas(años), añadir_retorno(retorno)."""
+
+    def __init__(self, capital_inicial, tasa_libre_riesgo=TASA_LIBRE_RIESGO, periodos_por_año=12,
+                 ventanas=VENTANAS_SHARPE):
+        self.capital_inicial = capital_inicial
+        self.tasa_libre_riesgo = tasa_libre_riesgo
+        self.periodos_por_año = periodos_por_año
+        self.capital = capital_inicial
+        self.pico = capital_inicial
+        self.max_drawdown = 0.0
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.suma_bajista = 0.0
+        self.ventanas = {v: {'retornos': deque(), 'media': 0.0, 'm2': 0.0} for v in ventanas}
+
+    def actualizar_capital(self, capital):
+        self.capital = capital
+        self.pico = max(self.pico, capital)
+        self.max_drawdown = min(self.max_drawdown, capital / self.pico - 1 if self.pico > 0 else 0.0)
+
+    def añadir_retorno(self, retorno):
+        self.n += 1
+        delta = retorno - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (retorno - self.media)
+        self.suma_bajista += min(retorno, 0.0) ** 2
+        for v, ventana in self.ventanas.items():
+            ventana['retornos'].append(retorno)
+            n = len(ventana['retornos'])
+            delta = retorno - ventana['media']
+            ventana['media'] += delta / n
+            ventana['m2'] += delta * (retorno - ventana['media'])
+            if n > v:
+                saliente = ventana['retornos'].popleft()
+                delta = saliente - ventana['media']
+                ventana['media'] -= delta / (n - 1)
+                ventana['m2'] = max(ventana['m2'] - delta * (saliente - ventana['media']), 0.0)
+
+    def metricas(self, años):
+        columnas = columnas_metricas(self.ventanas)
+        if años <= 0 or self.n == 0:
+            return dict.fromkeys(columnas, 0.0)
+        raiz = np.sqrt(self.periodos_por_año)
+        cagr = (self.capital / self.capital_inicial) ** (1 / años) - 1 if self.capital > 0 else 0.0
+        exceso = cagr - self.tasa_libre_riesgo
+        volatilidad = np.sqrt(self.m2 / self.n) * raiz
+        bajista = np.sqrt(self.suma_bajista / self.n) * raiz
+        valores = {
+            'sharpe': exceso / volatilidad if volatilidad > 0 else 0.0,
+            'volatilidad_final': volatilidad,
+            'cagr': cagr,
+            'max_drawdown': self.max_drawdown,
+            'sortino': exceso / bajista if bajista > 0 else 0.0,
+            'calmar': cagr / -self.max_drawdown if self.max_drawdown < 0 else 0.0
+        }
+        for v, ventana in self.ventanas.items():
+            desviacion = np.sqrt(ventana['m2'] / v) * raiz
+            completa = len(ventana['retornos']) == v and desviacion > 0
+            valores[f'sharpe_{v}m'] = ((ventana['media'] * self.periodos_por_año - self.tasa_libre_riesgo) / desviacion
+                                       if completa else 0.0)
+        return {c: float(valores[c]) if np.isfinite(valores[c]) else 0.0 for c in columnas}
+
+    def estado(self):
+        """Diccionario serializable en JSON con todo lo necesario para continuar."""
+        return {
+            'capital_inicial': self.capital_inicial,
+            'tasa_libre_riesgo': self.tasa_libre_riesgo,
+            'periodos_por_año': self.periodos_por_año,
+            'capital': self.capital,
+            'pico': self.pico,
+            'max_drawdown': self.max_drawdown,
+            'n': self.n,
+            'media': self.media,
+            'm2': self.m2,
+            'suma_bajista': self.suma_bajista,
+            'ventanas': {str(v): {**ventana, 'retornos': list(ventana['retornos'])}
+                         for v, ventana in self.ventanas.items()}
+        }
+
+    @classmethod
+    def desde_estado(cls, estado):
+        acumulador = cls(estado['capital_inicial'], estado['tasa_libre_riesgo'], estado['periodos_por_año'],
+                         [int(v) for v in estado['ventanas']])
+        for clave in ['capital', 'pico', 'max_drawdown', 'n', 'media', 'm2', 'suma_bajista']:
+            setattr(acumulador, clave, estado[clave])
+        for v, ventana in estado['ventanas'].items():
+            acumulador.ventanas[int(v)] = {**ventana, 'retornos': deque(ventana['retornos'])}
+        return acumulador
+
+# 3. Métricas de Todos los Periodos de una Serie
+def metricas_serie(capital_inicial, capitales, retornos, años, tasa_libre_riesgo=TASA_LIBRE_RIESGO,
+                   periodos_por_año=12, ventanas=VENTANAS_SHARPE):
+    """Versión vectorizada de MetricasAcumuladas: las métricas de cada periodo de
+    la serie en tiempo lineal. `capitales` es el capital tras cada periodo y
+    `años` los años transcurridos en cada uno. Devuelve columna -> array."""
+    retornos = np.asarray(retornos, dtype=float)
+    capitales = np.asarray(capitales, dtype=float)
+    años = np.asarray(años, dtype=float)
+    serie = pd.Series(retornos)
+    raiz = np.sqrt(periodos_por_año)
+    previos = np.arange(len(retornos))
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        volatilidad = serie.expanding().std(ddof=0).shift(1).to_numpy() * raiz
+        cuadrados_bajistas = np.minimum(retornos, 0.0) ** 2
+        bajista = np.sqrt(np.maximum(np.cumsum(cuadrados_bajistas) - cuadrados_bajistas, 0.0) / previos) * raiz
+        cagr = np.where(capitales > 0, (capitales / capital_inicial) ** (1 / años) - 1, 0.0)
+        exceso = cagr - tasa_libre_riesgo
+        picos = np.maximum.accumulate(np.concatenate([[capital_inicial], capitales]))[1:]
+        max_drawdown = np.minimum.accumulate(np.minimum(np.where(picos > 0, capitales / picos - 1, 0.0), 0.0))
+        valores = {
+            'sharpe': np.where(volatilidad > 0, exceso / volatilidad, 0.0),
+            'volatilidad_final': volatilidad,
+            'cagr': cagr,
+            'max_drawdown': max_drawdown,
+            'sortino': np.where(bajista > 0, exceso / bajista, 0.0),
+            'calmar': np.where(max_drawdown < 0, cagr / -max_drawdown, 0.0)
+        }
+        for v in ventanas:
+            ventana = serie.rolling(v)
+            media = ventana.mean().shift(1).to_numpy() * periodos_por_año
+            desviacion = ventana.std(ddof=0).shift(1).to_numpy() * raiz
+            valores[f'sharpe_{v}m'] = np.where(desviacion > 0, (media - tasa_libre_riesgo) / desviacion, 0.0)
+
+    sin_datos = (años <= 0) | (previos == 0)
+    return {c: np.where(sin_datos | ~np.isfinite(valores[c]), 0.0, valores[c]) for c in columnas_metricas(ventanas)}
@@ -0,0 +1,137 @@
+# PANEL DE PRECIOS DIARIOS CON RESAMPLEO A CUALQUIER FRECUENCIA DE REBALANCEO
+# 1. Importar Librerías
+import pandas as pd
+import sqlite3
+from sqlite3 import Error
+import threading
+import time
+import logging
+from estrategiamomento_almacen import TABLA_DIARIA, usa_tabla_precios, leer_panel
+from estrategiamomento_instrumentacion import conectar, tramo
+
+logger = logging.getLogger(__name__)
+
+# Frecuencias admitidas y su regla de pandas: los días son hábiles, las semanas
+# terminan el viernes y los meses y trimestres en su último día natural (como la
+# tabla prices mensual). El panel de una frecuencia toma el último precio de cada
+# periodo, igual que resample(...).last() al cargar los precios mensuales.
+FRECUENCIAS = {'D': 'B', 'W': 'W-FRI', 'ME': 'ME', 'QE': 'QE'}
+PERIODOS_POR_AÑO = {'D': 252, 'W': 52, 'ME': 12, 'QE': 4}
+
+# 2. Resamplear
+def regla_frecuencia(frecuencia):
+    if frecuencia not in FRECUENCIAS:
+        raise ValueError(f"Frecuencia no admitida: {frecuencia} (se admiten {', '.join(FRECUENCIAS)})")
+    return FRECUENCIAS[frecuencia]
+
+def resamplear_panel(diario, frecuencia):
+    """Panel fechas x activos a la frecuencia dada a partir del panel diario, con
+    una sola operación para todos los activos. Los periodos sin ningún dato de un
+    activo quedan en NaN."""
+    return diario.resample(regla_frecuencia(frecuencia)).last()
+
+# 3. Panel Diario con Caché por Frecuencia
+class PanelDiario:
+    """Lee una sola vez la tabla prices_daily completa (una consulta para todos los
+    activos) y guarda el resultado de cada resampleo: pedir otra frecuencia cuesta
+    un resampleo y volver a una ya pedida, nada. Si la tabla cambia (filas nuevas o
+    una fecha máxima distinta, comprobado como mucho cada `intervalo_validacion`
+    segundos) se vuelve a leer."""
+
+    def __init__(self, db_file, intervalo_validacion=30):
+        self.db_file = db_file
+        self.intervalo_validacion = intervalo_validacion
+        self._conn = None
+        self._version = None
+        self._validado = None
+        self._paneles = {}
+        self._lock = threading.RLock()
+
+    def _conexion(self):
+        if self._conn is None:
+            try:
+                self._conn = conectar(self.db_file, check_same_thread=False)
+            except Error as e:
+                logger.error("Error al conectar a la base de datos: %s", e)
+        return self._conn
+
+    def _leer_version(self, conn):
+        c = conn.cursor()
+        c.execute(f"SELECT COUNT(*), MAX(date) FROM {TABLA_DIARIA}")
+        return c.fetchone()
+
+    def _validar(self, conn):
+        if self._validado is not None and time.monotonic() - self._validado <= self.intervalo_validacion:
+            return
+        version = self._leer_version(conn)
+        if version != self._version:
+            if self._version is not None:
+                logger.info("La tabla %s ha cambiado, se vuelve a leer", TABLA_DIARIA)
+            self._paneles.clear()
+            self._version = version
+        self._validado = time.monotonic()
+
+    def disponible(self):
+        conn = self._conexion()
+        return conn is not None and usa_tabla_precios(conn, TABLA_DIARIA)
+
+    def panel(self, frecuencia='D', activos=None, columna='adj_close'):
+        """Matriz fechas x activos de `columna` a la frecuencia dada (D, W, ME o QE).
+        Con `activos` las columnas siguen ese orden (NaN para los que no tienen
+        datos). Devuelve None si la base no tiene barras diarias."""
+        regla_frecuencia(frecuencia)
+        with self._lock:
+            conn = self._conexion()
+            if conn is None:
+                return None
+            try:
+                self._validar(conn)
+                panel = self._paneles.get((frecuencia, columna))
+                if panel is None:
+                    diario = self._paneles.get(('D', columna))
+                    if diario is None:
+                        with tramo('lectura_diaria', columna=columna):
+                            diario = leer_panel(conn, columna=columna, tabla=TABLA_DIARIA)
+                        self._paneles[('D', columna)] = diario
+                    panel = diario
+                    if frecuencia != 'D':
+                        with tramo('resampleo', frecuencia=frecuencia):
+                            panel = resamplear_panel(diario, frecuencia)
+                        self._paneles[(frecuencia, columna)] = panel
+            except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                logger.error("Error al leer %s: %s", TABLA_DIARIA, e)
+                return None
+        if activos is not None:
+            panel = panel.reindex(columns=list(activos))
+        return panel
+
+    def retornos(self, frecuencia='D', activos=None):
+        """Retornos simples entre periodos consecutivos (p. ej. diarios para calcular
+        volatilidades), con NaN donde falta alguno de los dos precios."""
+        panel = self.panel(frecuencia, activos)
+        return None if panel is None else panel.pct_change(fill_method=None)
+
+    def invalidar(self):
+        with self._lock:
+            self._paneles.clear()
+            self._version = None
+            self._validado = None
+
+    def cerrar(self):
+        with self._lock:
+            self.invalidar()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# 4. Registro de Paneles Compartidos por Base de Datos
+_paneles = {}
+_paneles_lock = threading.Lock()
+
+def obtener_panel_diario(db_file):
+    with _paneles_lock:
+        panel = _paneles.get(db_file)
+        if panel is None:
+            panel = PanelDiario(db_file)
+            _paneles[db_file] = panel
+        return panel
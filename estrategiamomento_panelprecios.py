@@ -0,0 +1,223 @@
+# PANEL DE PRECIOS EN MEMORIA COMPARTIDO ENTRE MÓDULOS
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+from sqlite3 import Error
+from collections import OrderedDict
+import threading
+import time
+import logging
+from estrategiamomento_almacen import usa_tabla_precios, leer_corte_transversal
+from estrategiamomento_columnar import es_almacen_columnar, version_almacen, leer_serie_columnar
+from estrategiamomento_instrumentacion import conectar
+
+logger = logging.getLogger(__name__)
+
+# 2. Panel de Precios con Caché LRU
+class PanelPrecios:
+    """Carga una sola vez el histórico completo de cada activo y sirve rangos
+    [fecha_inicio, fecha_fin] como cortes del DataFrame en memoria (búsqueda
+    binaria sobre el índice de fechas). Mantiene como máximo `max_activos`
+    históricos (LRU) y recarga un activo cuando cambia el MAX(date) de su tabla
+    (o la versión del almacén columnar), comprobándolo como mucho cada
+    `intervalo_validacion` segundos. `db_file` puede ser una base SQLite o un
+    directorio escrito por escribir_almacen_columnar."""
+
+    def __init__(self, db_file, max_activos=256, intervalo_validacion=30):
+        self.db_file = db_file
+        self.max_activos = max_activos
+        self.intervalo_validacion = intervalo_validacion
+        self._conn = None
+        self._tabla_larga = False
+        self._columnar = es_almacen_columnar(db_file)
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _conexion(self):
+        if self._conn is None:
+            try:
+                self._conn = conectar(self.db_file, check_same_thread=False)
+                self._tabla_larga = usa_tabla_precios(self._conn)
+            except Error as e:
+                logger.error("Error al conectar a la base de datos: %s", e)
+        return self._conn
+
+    def _version(self, conn, activo):
+        if self._columnar:
+            return version_almacen(self.db_file)
+        c = conn.cursor()
+        if self._tabla_larga:
+            c.execute("SELECT MAX(date) FROM prices WHERE ticker = ?", (activo,))
+        else:
+            c.execute(f"SELECT MAX(date) FROM {activo}")
+        return c.fetchone()[0]
+
+    def _crear_entrada(self, df, version=None):
+        if not self._columnar:
+            df = df[['date', 'Adj_Close']].copy()
+            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+            df.set_index('date', inplace=True)
+            version = df.index[-1].strftime('%Y-%m-%d') if len(df) else None
+        fechas = df.index.to_numpy(dtype='datetime64[ns]')
+        return {'version': version, 'validado': time.monotonic(), 'fechas': fechas, 'df': df}
+
+    def _guardar(self, activo, entrada):
+        self._cache[activo] = entrada
+        self._cache.move_to_end(activo)
+        while len(self._cache) > self.max_activos:
+            self._cache.popitem(last=False)
+
+    def _cargar(self, conn, activo):
+        if self._columnar:
+            version = version_almacen(self.db_file)
+            serie = leer_serie_columnar(self.db_file, activo)
+            if serie is None:
+                raise LookupError(f"{activo} no está en el almacén columnar")
+            df = serie.rename('Adj_Close').rename_axis('date').to_frame()
+            return self._crear_entrada(df, version)
+        if self._tabla_larga:
+            df = pd.read_sql_query("SELECT date, adj_close AS Adj_Close FROM prices WHERE ticker = ? ORDER BY date",
+                                   conn, params=(activo,))
+            if df.empty:
+                raise sqlite3.OperationalError(f"no such ticker: {activo}")
+        else:
+            df = pd.read_sql_query(f"SELECT date, adj_close AS Adj_Close FROM {activo} ORDER BY date", conn)
+        return self._crear_entrada(df)
+
+    def precargar(self, activos):
+        """Carga en una sola consulta los activos que aún no están en memoria
+        (solo con la tabla prices; con tablas por activo se leen de uno en uno)."""
+        with self._lock:
+            conn = None if self._columnar else self._conexion()
+            if conn is None and not self._columnar:
+                return
+            faltantes = [activo for activo in activos if activo not in self._cache]
+            if not faltantes:
+                return
+            if not self._tabla_larga:
+                for activo in faltantes:
+                    self._entrada(activo)
+                return
+            try:
+                df = pd.read_sql_query(
+                    f"""SELECT ticker, date, adj_close AS Adj_Close FROM prices
+                        WHERE ticker IN ({', '.join('?' * len(faltantes))})
+                        ORDER BY ticker, date""", conn, params=faltantes)
+            except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                logger.error("Error al precargar activos: %s", e)
+                return
+            for activo, df_activo in df.groupby('ticker', sort=False):
+                self._guardar(activo, self._crear_entrada(df_activo))
+
+    def _entrada(self, activo):
+        with self._lock:
+            conn = None if self._columnar else self._conexion()
+            if conn is None and not self._columnar:
+                return None
+            try:
+                entrada = self._cache.get(activo)
+                if entrada is not None and time.monotonic() - entrada['validado'] > self.intervalo_validacion:
+                    if self._version(conn, activo) != entrada['version']:
+                        entrada = None
+                    else:
+                        entrada['validado'] = time.monotonic()
+                if entrada is None:
+                    entrada = self._cargar(conn, activo)
+                self._guardar(activo, entrada)
+                return entrada
+            except (sqlite3.Error, pd.errors.DatabaseError, LookupError, OSError) as e:
+                logger.error("Error al leer datos de %s: %s", activo, e)
+                return None
+
+    def historico(self, activo):
+        """Histórico completo del activo (columna Adj_Close indexada por fecha)."""
+        entrada = self._entrada(activo)
+        return None if entrada is None else entrada['df']
+
+    def leer(self, activo, fecha_inicio, fecha_fin):
+        """Equivalente a `WHERE date BETWEEN fecha_inicio AND fecha_fin`, sin copiar datos."""
+        entrada = self._entrada(activo)
+        if entrada is None:
+            return None
+        fechas = entrada['fechas']
+        i = np.searchsorted(fechas, np.datetime64(pd.Timestamp(fecha_inicio)), side='left')
+        j = np.searchsorted(fechas, np.datetime64(pd.Timestamp(fecha_fin)), side='right')
+        return entrada['df'].iloc[i:j]
+
+    def corte(self, fecha, activos):
+        """Adj_Close de `activos` en `fecha` (Serie indexada por activo, sin los que
+        no tienen barra ese día). Con la tabla prices es una consulta sobre el
+        índice (date, ticker); con tablas por activo o un almacén columnar sale de
+        los históricos en memoria."""
+        if not self._columnar:
+            with self._lock:
+                conn = self._conexion()
+                if conn is not None and self._tabla_larga:
+                    try:
+                        return leer_corte_transversal(conn, fecha, activos)['adj_close'].reindex(activos).dropna()
+                    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+                        logger.error("Error al leer el corte de %s: %s", fecha, e)
+                        return pd.Series(dtype=float)
+        fecha = pd.Timestamp(fecha)
+        precios = {}
+        for activo in activos:
+            df = self.historico(activo)
+            if df is not None and fecha in df.index:
+                precios[activo] = df.at[fecha, 'Adj_Close']
+        return pd.Series(precios, index=list(precios), dtype=float)
+
+    def instantanea(self, activos):
+        """Históricos en memoria de `activos` (cargándolos si hace falta) para
+        instalarlos en otro proceso con cargar_instantanea sin volver a leerlos."""
+        self.precargar(activos)
+        entradas = {}
+        for activo in activos:
+            entrada = self._entrada(activo)
+            if entrada is not None:
+                entradas[activo] = entrada
+        return entradas
+
+    def cargar_instantanea(self, entradas):
+        with self._lock:
+            for activo, entrada in entradas.items():
+                self._guardar(activo, {**entrada, 'validado': time.monotonic()})
+
+    def invalidar(self, activo=None):
+        with self._lock:
+            if activo is None:
+                self._cache.clear()
+                if self._conn is not None:
+                    self._tabla_larga = usa_tabla_precios(self._conn)
+            else:
+                self._cache.pop(activo, None)
+
+    def cerrar(self):
+        with self._lock:
+            self._cache.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# 3. Registro de Paneles Compartidos por Base de Datos
+_paneles = {}
+_paneles_lock = threading.Lock()
+
+def obtener_panel(db_file):
+    with _paneles_lock:
+        panel = _paneles.get(db_file)
+        if panel is None:
+            panel = PanelPrecios(db_file)
+            _paneles[db_file] = panel
+        return panel
+
+def instalar_panel(db_file, entradas, intervalo_validacion=float('inf')):
+    """Sustituye el panel registrado de `db_file` por uno nuevo con los históricos
+    de una instantánea. Lo usan los procesos del backtesting paralelo: el panel no
+    hereda la conexión SQLite del proceso padre (abre la suya solo si le piden un
+    activo que no tiene) y, por defecto, no revalida la instantánea."""
+    panel = PanelPrecios(db_file, max_activos=max(256, len(entradas)), intervalo_validacion=intervalo_validacion)
+    panel.cargar_instantanea(entradas)
+    with _paneles_lock:
+        _paneles[db_file] = panel
+    return panel
@@ -0,0 +1,297 @@
+# PUBLICACIÓN INCREMENTAL DE RESULTADOS EN GOOGLE SHEETS
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import random
+import re
+import time
+import functools
+import logging
+from collections import Counter
+from estrategiamomento_instrumentacion import tramo, contar
+
+logger = logging.getLogger(__name__)
+
+# La publicación reutiliza una hoja existente: lee una vez el contenido de cada
+# pestaña, lo compara fila a fila con los resultados y solo escribe los tramos de
+# filas nuevas o modificadas, agrupados en llamadas batch_update de como mucho
+# MAX_CELDAS_POR_LOTE celdas (la API limita el tamaño de cada petición y el número
+# de escrituras por minuto). Los errores de cuota (429) y los errores transitorios
+# del servidor se reintentan con espera exponencial.
+PESTAÑAS = ('Por Mes', 'Por Activo')
+MAX_CELDAS_POR_LOTE = 40000
+CODIGOS_REINTENTABLES = (429, 500, 502, 503)
+# Valores sin formato: los números vuelven como números y se comparan sin redondeo
+RENDER_SIN_FORMATO = 'UNFORMATTED_VALUE'
+
+# 2. Convertir DataFrames en Valores de la Hoja
+def _columna_hoja(serie):
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return serie.tolist()
+    if pd.api.types.is_numeric_dtype(serie):
+        # NaN, inf y -inf se publican como 0.0
+        valores = serie.to_numpy(dtype=float)
+        return np.where(np.isfinite(valores), valores, 0.0).tolist()
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime('%Y-%m-%d').fillna('').tolist()
+    # Las listas se publican como su representación en texto y los nulos como ''
+    return [str(x) if isinstance(x, list) else ('' if x is None or x != x else x) for x in serie.tolist()]
+
+def valores_hoja(df):
+    """Cabecera y filas del DataFrame como listas de valores nativos de Python,
+    con la misma limpieza que se aplicaba antes de publicar."""
+    columnas = [_columna_hoja(df[col]) for col in df.columns]
+    return [[str(col) for col in df.columns]] + [list(fila) for fila in zip(*columnas)]
+
+# 3. Diferencias y Lotes de Escritura
+def letra_columna(numero):
+    """1 -> 'A', 27 -> 'AA'."""
+    letras = ''
+    while numero > 0:
+        numero, resto = divmod(numero - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+def rango_a1(fila_inicio, fila_fin, num_columnas):
+    """Rango A1 de las filas [fila_inicio, fila_fin) (base 0) y las primeras num_columnas columnas."""
+    return f"A{fila_inicio + 1}:{letra_columna(num_columnas)}{fila_fin}"
+
+def _normalizar_fila(fila, num_columnas):
+    fila = list(fila[:num_columnas])
+    return fila + [''] * (num_columnas - len(fila))
+
+def filas_modificadas(existentes, nuevas):
+    """Índices de las filas de `nuevas` que no coinciden con las de `existentes`
+    (incluidas las que no existen todavía)."""
+    num_columnas = len(nuevas[0]) if nuevas else 0
+    return [i for i, fila in enumerate(nuevas)
+            if i >= len(existentes) or _normalizar_fila(existentes[i], num_columnas) != fila]
+
+def tramos_contiguos(indices):
+    """[(inicio, fin)] de las series de índices consecutivos, con fin exclusivo."""
+    tramos = []
+    for i in indices:
+        if tramos and tramos[-1][1] == i:
+            tramos[-1][1] = i + 1
+        else:
+            tramos.append([i, i + 1])
+    return [tuple(t) for t in tramos]
+
+def lotes_escritura(valores, indices, max_celdas=MAX_CELDAS_POR_LOTE):
+    """Lista de lotes para batch_update: cada lote es una lista de
+    {'range', 'values'} con como mucho `max_celdas` celdas en total. Los tramos
+    más largos que un lote se dividen."""
+    num_columnas = max(len(valores[0]), 1)
+    max_filas = max(max_celdas // num_columnas, 1)
+    lotes, lote, filas_lote = [], [], 0
+    for inicio, fin in tramos_contiguos(indices):
+        while inicio < fin:
+            if filas_lote == max_filas:
+                lotes.append(lote)
+                lote, filas_lote = [], 0
+            corte = min(fin, inicio + max_filas - filas_lote)
+            lote.append({'range': rango_a1(inicio, corte, num_columnas), 'values': valores[inicio:corte]})
+            filas_lote += corte - inicio
+            inicio = corte
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+# 4. Llamadas con Espera Exponencial
+def _codigo_error(error):
+    """Código HTTP de un gspread.exceptions.APIError (o del error simulado)."""
+    codigo = getattr(error, 'code', None)
+    if codigo is None:
+        codigo = getattr(getattr(error, 'response', None), 'status_code', None)
+    return codigo
+
+def llamar_con_reintentos(funcion, *args, reintentos=5, espera=1.0, **kwargs):
+    for intento in range(reintentos + 1):
+        try:
+            return funcion(*args, **kwargs)
+        except Exception as e:
+            if intento == reintentos or _codigo_error(e) not in CODIGOS_REINTENTABLES:
+                raise
+            pausa = espera * 2 ** intento + random.uniform(0, espera)
+            contar('sheets_reintentos')
+            logger.warning("Error %s de la API de Sheets (intento %d/%d). Reintentando en %.1f s", _codigo_error(e),
+                           intento + 1, reintentos + 1, pausa)
+            time.sleep(pausa)
+
+# 5. Publicar en una Hoja Existente
+def publicar_pestaña(spreadsheet, titulo, df, pestañas=None, max_celdas=MAX_CELDAS_POR_LOTE, reintentos=5,
+                     espera=1.0):
+    """Deja la pestaña `titulo` con el contenido de `df` escribiendo solo las filas
+    que han cambiado. Devuelve el número de filas escritas (cabecera incluida)."""
+    llamar = functools.partial(llamar_con_reintentos, reintentos=reintentos, espera=espera)
+    if df.columns.empty:
+        logger.warning("Sin columnas para publicar en '%s'", titulo)
+        return 0
+    valores = valores_hoja(df)
+    num_filas, num_columnas = len(valores), len(valores[0])
+    if pestañas is None:
+        pestañas = {hoja.title: hoja for hoja in llamar(spreadsheet.worksheets)}
+    hoja = pestañas.get(titulo)
+    if hoja is None:
+        hoja = llamar(spreadsheet.add_worksheet, title=titulo, rows=max(num_filas, 1), cols=max(num_columnas, 1))
+        existentes = []
+    else:
+        existentes = llamar(hoja.get_all_values, value_render_option=RENDER_SIN_FORMATO)
+
+    # Si cambian las columnas se reescribe la pestaña completa
+    if existentes and [v for v in existentes[0] if v != ''] != valores[0]:
+        logger.info("Las columnas de '%s' han cambiado, se reescribe la pestaña completa", titulo)
+        llamar(hoja.clear)
+        existentes = []
+
+    # La rejilla debe tener exactamente las filas y columnas de los resultados:
+    # al reducirla se eliminan las filas sobrantes de una publicación anterior
+    if hoja.row_count != num_filas or hoja.col_count != num_columnas:
+        llamar(hoja.resize, rows=max(num_filas, 1), cols=max(num_columnas, 1))
+        existentes = [_normalizar_fila(fila, num_columnas) for fila in existentes[:num_filas]]
+
+    indices = filas_modificadas(existentes, valores)
+    for lote in lotes_escritura(valores, indices, max_celdas):
+        with tramo('sheets_lote', pestaña=titulo, rangos=len(lote)):
+            llamar(hoja.batch_update, lote, value_input_option='RAW')
+        contar('sheets_escrituras')
+    contar('sheets_filas_escritas', len(indices))
+    logger.info("Pestaña '%s': %d de %d filas escritas", titulo, len(indices), num_filas)
+    return len(indices)
+
+def publicar_resultados(spreadsheet, df_selecciones, df_metricas_activos, max_celdas=MAX_CELDAS_POR_LOTE,
+                        reintentos=5, espera=1.0):
+    """Publica 'Por Mes' y 'Por Activo' en la hoja dada y devuelve las filas
+    escritas en cada pestaña. La pestaña inicial de una hoja recién creada
+    ('Sheet1') se reutiliza como 'Por Mes'."""
+    llamar = functools.partial(llamar_con_reintentos, reintentos=reintentos, espera=espera)
+    pestañas = {hoja.title: hoja for hoja in llamar(spreadsheet.worksheets)}
+    if PESTAÑAS[0] not in pestañas and 'Sheet1' in pestañas:
+        hoja = pestañas.pop('Sheet1')
+        llamar(hoja.update_title, PESTAÑAS[0])
+        pestañas[PESTAÑAS[0]] = hoja
+    return {titulo: publicar_pestaña(spreadsheet, titulo, df, pestañas, max_celdas, reintentos, espera)
+            for titulo, df in zip(PESTAÑAS, (df_selecciones, df_metricas_activos))}
+
+# 6. Cliente de Google Sheets en Memoria
+class ErrorApiSimulado(Exception):
+    """Error con el mismo atributo `code` que gspread.exceptions.APIError."""
+    def __init__(self, code, mensaje):
+        super().__init__(mensaje)
+        self.code = code
+
+class PestañaMemoria:
+    """Pestaña con la parte de la interfaz de gspread.Worksheet que usa la publicación.
+    Como la API, rechaza escrituras fuera de la rejilla y guarda los valores tal
+    cual se escriben (equivalente a leer con UNFORMATTED_VALUE)."""
+
+    def __init__(self, hoja, title, rows, cols):
+        self._hoja = hoja
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.celdas = {}
+
+    def update_title(self, title):
+        self._hoja._llamada('update_title')
+        self.title = title
+
+    def get_all_values(self, value_render_option=None):
+        self._hoja._llamada('get_all_values')
+        if not self.celdas:
+            return []
+        num_filas = max(f for f, _ in self.celdas) + 1
+        num_columnas = max(c for _, c in self.celdas) + 1
+        return [[self.celdas.get((f, c), '') for c in range(num_columnas)] for f in range(num_filas)]
+
+    def batch_update(self, data, value_input_option=None):
+        self._hoja._llamada('batch_update', escritura=True)
+        for bloque in data:
+            fila, columna = _parsear_rango(bloque['range'])
+            for i, valores in enumerate(bloque['values']):
+                for j, valor in enumerate(valores):
+                    if fila + i >= self.row_count or columna + j >= self.col_count:
+                        raise ErrorApiSimulado(400, f"El rango {bloque['range']} excede la rejilla de {self.title}")
+                    if valor == '' or valor is None:
+                        self.celdas.pop((fila + i, columna + j), None)
+                    else:
+                        self.celdas[(fila + i, columna + j)] = valor
+
+    def resize(self, rows=None, cols=None):
+        self._hoja._llamada('resize', escritura=True)
+        self.row_count = rows if rows is not None else self.row_count
+        self.col_count = cols if cols is not None else self.col_count
+        self.celdas = {(f, c): v for (f, c), v in self.celdas.items() if f < self.row_count and c < self.col_count}
+
+    def clear(self):
+        self._hoja._llamada('clear', escritura=True)
+        self.celdas = {}
+
+def _parsear_rango(rango):
+    """(fila, columna) en base 0 de la esquina superior izquierda de un rango A1."""
+    coincidencia = re.match(r"([A-Z]+)(\d+)", rango.split('!')[-1])
+    columna = 0
+    for letra in coincidencia.group(1):
+        columna = columna * 26 + ord(letra) - ord('A') + 1
+    return int(coincidencia.group(2)) - 1, columna - 1
+
+class HojaMemoria:
+    """Hoja de cálculo en memoria (gspread.Spreadsheet). `fallos_cuota` hace que
+    las primeras escrituras fallen con un error 429 para ejercitar los reintentos."""
+
+    def __init__(self, title, id, fallos_cuota=0):
+        self.title = title
+        self.id = id
+        self.url = f'https://docs.google.com/spreadsheets/d/{id}'
+        self.fallos_cuota = fallos_cuota
+        self.llamadas = Counter()
+        self.compartida = []
+        self._pestañas = [PestañaMemoria(self, 'Sheet1', 1000, 26)]
+
+    def _llamada(self, nombre, escritura=False):
+        if escritura and self.fallos_cuota > 0:
+            self.fallos_cuota -= 1
+            self.llamadas['errores_cuota'] += 1
+            raise ErrorApiSimulado(429, 'Quota exceeded for quota metric Write requests')
+        self.llamadas[nombre] += 1
+
+    def worksheets(self):
+        self._llamada('worksheets')
+        return list(self._pestañas)
+
+    def worksheet(self, title):
+        self._llamada('worksheet')
+        for pestaña in self._pestañas:
+            if pestaña.title == title:
+                return pestaña
+        raise LookupError(title)
+
+    def add_worksheet(self, title, rows, cols):
+        self._llamada('add_worksheet', escritura=True)
+        pestaña = PestañaMemoria(self, title, rows, cols)
+        self._pestañas.append(pestaña)
+        return pestaña
+
+    def share(self, email, perm_type, role):
+        self.compartida.append((email, perm_type, role))
+
+class ClienteSheetsMemoria:
+    """Sustituto de gspread.Client para publicar sin red: las hojas creadas se
+    guardan en `hojas` y pueden volver a abrirse por URL o por clave."""
+
+    def __init__(self, fallos_cuota=0):
+        self.fallos_cuota = fallos_cuota
+        self.hojas = {}
+
+    def create(self, title, folder_id=None):
+        hoja = HojaMemoria(title, f'memoria{len(self.hojas)}', self.fallos_cuota)
+        self.hojas[hoja.id] = hoja
+        return hoja
+
+    def open_by_key(self, key):
+        if key not in self.hojas:
+            raise LookupError(key)
+        return self.hojas[key]
+
+    def open_by_url(self, url):
+        return self.open_by_key(url.rstrip('/').split('/d/')[-1].split('/')[0])
@@ -0,0 +1,130 @@
+# RESULTADOS DEL BACKTESTING EN UN ARTEFACTO LOCAL (PARQUET, FEATHER O SQLITE)
+# 1. Importar Librerías
+import pandas as pd
+import sqlite3
+import json
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# El artefacto guarda las dos tablas que se publican en Google Sheets ('Por Mes' y
+# 'Por Activo') con sus tipos: 'fecha' como datetime, 'activos_seleccionados'
+# como lista y las métricas como float, de modo que el dashboard no tiene que
+# volver a parsear nada. El formato se deduce de la extensión de la ruta:
+#   resultados.parquet/   directorio con por_mes.parquet y por_activo.parquet
+#   resultados.feather/   directorio con por_mes.feather y por_activo.feather
+#   resultados.db         base SQLite con las tablas por_mes y por_activo
+# Parquet y Feather necesitan pyarrow; SQLite no necesita nada adicional.
+EXTENSIONES_SQLITE = ('.db', '.sqlite')
+FORMATOS_DIRECTORIO = ('parquet', 'feather')
+TABLAS = ('por_mes', 'por_activo')
+SUFIJO_RESULTADOS = '_resultados.parquet'
+
+# 2. Rutas y Formato
+def ruta_resultados(db_file):
+    return os.path.splitext(db_file.rstrip(os.sep))[0] + SUFIJO_RESULTADOS
+
+def formato_artefacto(ruta):
+    extension = os.path.splitext(ruta.rstrip(os.sep))[1].lower()
+    if extension in EXTENSIONES_SQLITE:
+        return 'sqlite'
+    if extension.lstrip('.') in FORMATOS_DIRECTORIO:
+        return extension.lstrip('.')
+    raise ValueError(f"Formato de artefacto no reconocido: {ruta}")
+
+def _ficheros(ruta):
+    formato = formato_artefacto(ruta)
+    if formato == 'sqlite':
+        return [ruta]
+    return [os.path.join(ruta, f'{tabla}.{formato}') for tabla in TABLAS]
+
+def huella_artefacto(ruta):
+    """(fichero, mtime_ns, tamaño) de cada fichero del artefacto, o None si no
+    existe. Cambia cada vez que se reescribe y sirve como clave de caché."""
+    try:
+        estados = [(os.path.basename(f), os.stat(f)) for f in _ficheros(ruta)]
+    except (OSError, ValueError):
+        return None
+    return tuple((nombre, estado.st_mtime_ns, estado.st_size) for nombre, estado in estados)
+
+# 3. Escribir Artefacto
+def _normalizar(df_selecciones, df_metricas_activos):
+    df_selecciones = df_selecciones.copy()
+    df_metricas_activos = df_metricas_activos.copy()
+    for df in [df_selecciones, df_metricas_activos]:
+        if 'fecha' in df.columns:
+            df['fecha'] = pd.to_datetime(df['fecha'], format='%Y-%m-%d')
+    if 'activos_seleccionados' in df_selecciones.columns:
+        df_selecciones['activos_seleccionados'] = df_selecciones['activos_seleccionados'].apply(list)
+    return df_selecciones.reset_index(drop=True), df_metricas_activos.reset_index(drop=True)
+
+def escribir_resultados(df_selecciones, df_metricas_activos, ruta):
+    """Escribe el artefacto en una ruta temporal y lo renombra al final, de modo
+    que el dashboard nunca lee un artefacto a medias."""
+    formato = formato_artefacto(ruta)
+    tablas = dict(zip(TABLAS, _normalizar(df_selecciones, df_metricas_activos)))
+    temporal = ruta.rstrip(os.sep) + '.tmp'
+    if formato == 'sqlite':
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        conn = sqlite3.connect(temporal)
+        try:
+            for tabla, df in tablas.items():
+                # SQLite no admite tablas sin columnas (backtesting sin ninguna selección)
+                if df.columns.empty:
+                    continue
+                df = df.copy()
+                if 'fecha' in df.columns:
+                    df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
+                if 'activos_seleccionados' in df.columns:
+                    df['activos_seleccionados'] = df['activos_seleccionados'].apply(json.dumps)
+                df.to_sql(tabla, conn, index=False)
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(temporal, ruta)
+    else:
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for tabla, df in tablas.items():
+            destino = os.path.join(temporal, f'{tabla}.{formato}')
+            if formato == 'parquet':
+                df.to_parquet(destino, index=False)
+            else:
+                df.to_feather(destino)
+        anterior = ruta.rstrip(os.sep) + '.old'
+        shutil.rmtree(anterior, ignore_errors=True)
+        if os.path.exists(ruta):
+            os.rename(ruta, anterior)
+        os.rename(temporal, ruta)
+        shutil.rmtree(anterior, ignore_errors=True)
+    logger.info("Resultados escritos en %s: %d meses, %d filas por activo", ruta, len(tablas['por_mes']),
+                len(tablas['por_activo']))
+
+# 4. Leer Artefacto
+def leer_resultados(ruta):
+    """(df_selecciones, df_metricas_activos) con los mismos tipos con los que se
+    escribieron."""
+    formato = formato_artefacto(ruta)
+    if formato == 'sqlite':
+        conn = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+        try:
+            existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            tablas = [pd.read_sql_query(f"SELECT * FROM {tabla}", conn) if tabla in existentes else pd.DataFrame()
+                      for tabla in TABLAS]
+        finally:
+            conn.close()
+        for df in tablas:
+            if 'fecha' in df.columns:
+                df['fecha'] = pd.to_datetime(df['fecha'], format='%Y-%m-%d')
+        if 'activos_seleccionados' in tablas[0].columns:
+            tablas[0]['activos_seleccionados'] = tablas[0]['activos_seleccionados'].apply(json.loads)
+        return tablas[0], tablas[1]
+    lector = pd.read_parquet if formato == 'parquet' else pd.read_feather
+    df_selecciones, df_metricas_activos = (lector(f) for f in _ficheros(ruta))
+    if 'activos_seleccionados' in df_selecciones.columns:
+        # pyarrow devuelve las listas como arrays de numpy
+        df_selecciones['activos_seleccionados'] = df_selecciones['activos_seleccionados'].apply(list)
+    return df_selecciones, df_metricas_activos
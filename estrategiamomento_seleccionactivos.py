@@ -14,19 +14,26 @@ import pandas as pd
 import sqlite3
 from sqlite3 import Error
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
 from dateutil.relativedelta import relativedelta
 from scipy.stats import pearsonr
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_almacen import obtener_tickers, usa_tabla_precios, leer_panel
+from estrategiamomento_columnar import es_almacen_columnar
+from estrategiamomento_instrumentacion import conectar, tramo, medir, configurar_logging
+
+logger = logging.getLogger(__name__)
 
 # 2. Crear Conexión a la Base de Datos
 def crear_conexion(db_file):
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
-        print(f"Conexión establecida a {db_file}")
+        conn = conectar(db_file)
+        logger.debug("Conexión establecida a %s", db_file)
         return conn
     except Error as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        logger.error("Error al conectar a la base de datos: %s", e)
     return conn
 
 # 3. Obtener Lista de Activos
@@ -35,44 +42,49 @@ def obtener_activos(db_file):
     if conn is None:
         return []
     try:
-        c = conn.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        activos = [row[0] for row in c.fetchall()]
+        activos = obtener_tickers(conn)
         conn.close()
-        print(f"Activos encontrados: {activos}")
+        logger.debug("Activos encontrados: %s", activos)
         return activos
     except sqlite3.Error as e:
-        print(f"Error al obtener activos: {e}")
+        logger.error("Error al obtener activos: %s", e)
         conn.close()
         return []
 
 # 4. Leer Datos de un Activo
+@medir('lectura_bd')
 def leer_datos_activo(db_file, activo, fecha_inicio, fecha_fin):
-    conn = crear_conexion(db_file)
-    if conn is None:
-        return None
+    df = obtener_panel(db_file).leer(activo, fecha_inicio, fecha_fin)
+    if df is not None:
+        logger.debug("Datos leídos para %s desde %s hasta %s: %d filas", activo, fecha_inicio, fecha_fin, len(df))
+    return df
+
+def leer_ventana(db_file, activos, fecha_inicio, fecha_fin):
+    """{activo: DataFrame Adj_Close} de todos los activos entre las dos fechas. Con
+    la tabla prices son los cortes de fin de mes de la ventana leídos en una sola
+    consulta sobre el índice (date, ticker), sin cargar el histórico completo de
+    cada activo; con tablas por activo o un almacén columnar, desde el panel."""
+    conn = None if es_almacen_columnar(db_file) else crear_conexion(db_file)
+    if conn is None or not usa_tabla_precios(conn):
+        if conn is not None:
+            conn.close()
+        with tramo('lectura_bd'):
+            obtener_panel(db_file).precargar(activos)
+        return {activo: leer_datos_activo(db_file, activo, fecha_inicio, fecha_fin) for activo in activos}
     try:
-        query = f"""
-            SELECT date, adj_close AS Adj_Close
-            FROM {activo}
-            WHERE date BETWEEN ? AND ?
-            ORDER BY date
-        """
-        df = pd.read_sql_query(query, conn, params=(fecha_inicio, fecha_fin), parse_dates=['date'])
-        df.set_index('date', inplace=True)
-        print(f"Datos leídos para {activo} desde {fecha_inicio} hasta {fecha_fin}: {len(df)} filas")
+        with tramo('lectura_bd'):
+            panel = leer_panel(conn, activos, fecha_inicio, fecha_fin)
+    finally:
         conn.close()
-        return df
-    except sqlite3.Error as e:
-        print(f"Error al leer datos de {activo}: {e}")
-        conn.close()
-        return None
+    panel.index.name = 'date'
+    return {activo: panel[[activo]].dropna().rename(columns={activo: 'Adj_Close'}) for activo in activos}
 
 # 5. Calcular Momentum Score
+@medir('momentum')
 def calcular_momentum(df, activo):
     try:
         if len(df) < 13:
-            print(f"No hay suficientes datos para {activo}: {len(df)} filas disponibles")
+            logger.debug("No hay suficientes datos para %s: %d filas disponibles", activo, len(df))
             return None
 
         p0 = df['Adj_Close'].iloc[-1]  # Mes actual
@@ -91,14 +103,16 @@ def calcular_momentum(df, activo):
 
         return {'activo': activo, 'momentum_score': momentum_score}
     except Exception as e:
-        print(f"Error al calcular momentum para {activo}: {e}")
+        logger.error("Error al calcular momentum para %s: %s", activo, e)
         return None
 
 # 6. Calcular Volatilidades
+@medir('volatilidad')
 def calcular_volatilidad(df, activo, meses):
     try:
         if len(df) < meses:
-            print(f"No hay suficientes datos para calcular volatilidad de {meses} meses para {activo}: {len(df)} filas")
+            logger.debug("No hay suficientes datos para calcular volatilidad de %d meses para %s: %d filas", meses,
+                         activo, len(df))
             return None
 
         # Calcular retornos mensuales
@@ -109,10 +123,11 @@ def calcular_volatilidad(df, activo, meses):
         volatilidad = retornos.std()
         return volatilidad
     except Exception as e:
-        print(f"Error al calcular volatilidad para {activo}: {e}")
+        logger.error("Error al calcular volatilidad para %s: %s", activo, e)
         return None
 
 # 7. Calcular Matriz de Correlación
+@medir('correlacion')
 def calcular_correlaciones(datos_activos, activos):
     try:
         # Crear DataFrame con retornos mensuales
@@ -123,18 +138,55 @@ def calcular_correlaciones(datos_activos, activos):
                 retornos[activo] = df['Adj_Close'].pct_change().dropna()
 
         if retornos.empty:
-            print("No hay datos suficientes para calcular correlaciones")
+            logger.info("No hay datos suficientes para calcular correlaciones")
             return None
 
         # Calcular matriz de correlación
         matriz_correlacion = retornos.corr(method='pearson')
-        print("\nMatriz de correlación:\n", matriz_correlacion)
+        logger.debug("Matriz de correlación:\n%s", matriz_correlacion)
         return matriz_correlacion
     except Exception as e:
-        print(f"Error al calcular correlaciones: {e}")
+        logger.error("Error al calcular correlaciones: %s", e)
         return None
 
-# 8. Seleccionar Activos
+# 8. Selección Greedy por Correlación
+@medir('seleccion_greedy')
+def seleccionar_por_correlacion(df_momentum, matriz_correlacion):
+    seleccionados = []
+    activos_restantes = df_momentum['activo'].tolist()
+
+    # Seleccionar el primero (mayor momentum)
+    if activos_restantes:
+        primer_activo = df_momentum.iloc[0]['activo']
+        seleccionados.append(primer_activo)
+        activos_restantes.remove(primer_activo)
+        logger.debug("Primer activo seleccionado: %s", primer_activo)
+
+    # Seleccionar hasta 2 más, minimizando correlación promedio
+    while len(seleccionados) < 3 and activos_restantes:
+        mejor_activo = None
+        menor_correlacion_promedio = float('inf')
+
+        for candidato in activos_restantes:
+            if candidato in matriz_correlacion.columns:
+                correlaciones = [matriz_correlacion.loc[candidato, seleccionado] for seleccionado in seleccionados if seleccionado in matriz_correlacion.index]
+                if correlaciones:
+                    correlacion_promedio = np.mean(correlaciones)
+                    if correlacion_promedio < menor_correlacion_promedio:
+                        menor_correlacion_promedio = correlacion_promedio
+                        mejor_activo = candidato
+
+        if mejor_activo:
+            seleccionados.append(mejor_activo)
+            activos_restantes.remove(mejor_activo)
+            logger.debug("Activo seleccionado: %s (correlación promedio: %.3f)", mejor_activo,
+                         menor_correlacion_promedio)
+        else:
+            break
+    return seleccionados
+
+# 9. Seleccionar Activos
+@medir()
 def seleccionar_activos(db_file, fecha_fin):
     # Calcular fechas
     fecha_inicio_12m = (fecha_fin - relativedelta(months=13)).strftime('%Y-%m-%d')
@@ -144,23 +196,24 @@ def seleccionar_activos(db_file, fecha_fin):
     # Obtener lista de activos
     activos = obtener_activos(db_file)
     if not activos:
-        print("No se encontraron activos en la base de datos")
+        logger.warning("No se encontraron activos en la base de datos")
         return None
 
     # Leer datos y calcular indicadores
     datos_activos = {}
     momentum_results = []
     volatilidades = []
+    # Datos de 13 meses de todos los activos (momentum y correlaciones); los de
+    # 4 meses (volatilidad corta) son su final
+    ventana = leer_ventana(db_file, activos, fecha_inicio_12m, fecha_fin_str)
 
     for activo in activos:
-        print(f"\nProcesando {activo} para {fecha_fin_str}...")
-        # Leer datos para 12 meses (momentum y correlaciones)
-        df_12m = leer_datos_activo(db_file, activo, fecha_inicio_12m, fecha_fin_str)
-        # Leer datos para 4 meses (volatilidad corta)
-        df_4m = leer_datos_activo(db_file, activo, fecha_inicio_4m, fecha_fin_str)
+        logger.debug("Procesando %s para %s...", activo, fecha_fin_str)
+        df_12m = ventana[activo]
+        df_4m = None if df_12m is None else df_12m[df_12m.index >= pd.Timestamp(fecha_inicio_4m)]
 
         if df_12m is None or df_4m is None or df_12m.empty or df_4m.empty:
-            print(f"No se pudieron obtener datos para {activo}")
+            logger.debug("No se pudieron obtener datos para %s", activo)
             continue
 
         datos_activos[activo] = df_12m
@@ -170,7 +223,7 @@ def seleccionar_activos(db_file, fecha_fin):
         vol_larga = calcular_volatilidad(df_12m, activo, 12)
 
         if vol_corta is None or vol_larga is None:
-            print(f"No se pudo calcular volatilidad para {activo}")
+            logger.debug("No se pudo calcular volatilidad para %s", activo)
             continue
 
         volatilidades.append({
@@ -185,14 +238,14 @@ def seleccionar_activos(db_file, fecha_fin):
             momentum_results.append(momentum_data)
 
     if not momentum_results:
-        print("No hay datos de momentum disponibles")
+        logger.info("No hay datos de momentum disponibles para %s", fecha_fin_str)
         return None
 
     # Filtrar por volatilidad (corta <= larga)
     df_volatilidades = pd.DataFrame(volatilidades)
     df_volatilidades = df_volatilidades[df_volatilidades['vol_corta'] <= df_volatilidades['vol_larga']]
     activos_validos = df_volatilidades['activo'].tolist()
-    print(f"\nActivos con volatilidad corta <= larga: {activos_validos}")
+    logger.debug("Activos con volatilidad corta <= larga: %s", activos_validos)
 
     # Filtrar momentum por activos válidos
     df_momentum = pd.DataFrame(momentum_results)
@@ -200,10 +253,10 @@ def seleccionar_activos(db_file, fecha_fin):
 
     # Filtrar por momentum score (0 <= score <= 3)
     df_momentum = df_momentum[(df_momentum['momentum_score'] >= 0.7) & (df_momentum['momentum_score'] <= 3)]
-    print("\nMomentum filtrado (0.7 <= score <= 3):\n", df_momentum)
+    logger.debug("Momentum filtrado (0.7 <= score <= 3):\n%s", df_momentum)
 
     if df_momentum.empty:
-        print("No hay activos con momentum score entre 0 y 3. No se seleccionan activos.")
+        logger.info("No hay activos con momentum score entre 0.7 y 3 para %s. No se seleccionan activos.", fecha_fin_str)
         return pd.DataFrame({'fecha': [fecha_fin_str], 'activos_seleccionados': [[]]})
 
     # Ordenar por momentum
@@ -212,53 +265,25 @@ def seleccionar_activos(db_file, fecha_fin):
     # Calcular correlaciones
     matriz_correlacion = calcular_correlaciones(datos_activos, activos_validos)
     if matriz_correlacion is None:
-        print("No se pudo calcular la matriz de correlación. Seleccionando solo por momentum.")
+        logger.warning("No se pudo calcular la matriz de correlación. Seleccionando solo por momentum.")
         seleccionados = df_momentum.head(3)[['activo']]
         seleccionados['fecha'] = fecha_fin_str
         return seleccionados
 
     # Seleccionar activos
-    seleccionados = []
-    activos_restantes = df_momentum['activo'].tolist()
-
-    # Seleccionar el primero (mayor momentum)
-    if activos_restantes:
-        primer_activo = df_momentum.iloc[0]['activo']
-        seleccionados.append(primer_activo)
-        activos_restantes.remove(primer_activo)
-        print(f"Primer activo seleccionado: {primer_activo}")
-
-    # Seleccionar hasta 2 más, minimizando correlación promedio
-    while len(seleccionados) < 3 and activos_restantes:
-        mejor_activo = None
-        menor_correlacion_promedio = float('inf')
-
-        for candidato in activos_restantes:
-            if candidato in matriz_correlacion.columns:
-                correlaciones = [matriz_correlacion.loc[candidato, seleccionado] for seleccionado in seleccionados if seleccionado in matriz_correlacion.index]
-                if correlaciones:
-                    correlacion_promedio = np.mean(correlaciones)
-                    if correlacion_promedio < menor_correlacion_promedio:
-                        menor_correlacion_promedio = correlacion_promedio
-                        mejor_activo = candidato
-
-        if mejor_activo:
-            seleccionados.append(mejor_activo)
-            activos_restantes.remove(mejor_activo)
-            print(f"Activo seleccionado: {mejor_activo} (correlación promedio: {menor_correlacion_promedio:.3f})")
-        else:
-            break
+    seleccionados = seleccionar_por_correlacion(df_momentum, matriz_correlacion)
 
     # Preparar resultado
     resultado = pd.DataFrame({
         'fecha': [fecha_fin_str],
         'activos_seleccionados': [seleccionados]
     })
-    print(f"\nActivos seleccionados para {fecha_fin_str}: {seleccionados}")
+    logger.info("Activos seleccionados para %s: %s", fecha_fin_str, seleccionados)
     return resultado
 
-# 9. Main
+# 10. Main
 def main():
+    configurar_logging()
     # Configuración
     db_file = 'precios_activos_mensual.db'
     # Último día del mes completo más reciente
@@ -266,7 +291,7 @@ def main():
     fecha_fin = (hoy.replace(day=1) - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
     fecha_fin_str = fecha_fin.strftime('%Y-%m-%d')
 
-    print(f"Ejecutando estrategia para {fecha_fin_str}...")
+    logger.info("Ejecutando estrategia para %s...", fecha_fin_str)
 
     # Seleccionar activos
     seleccionados = seleccionar_activos(db_file, fecha_fin)
@@ -275,9 +300,9 @@ def main():
         # Guardar resultados
         output_file = 'seleccion_momentum_mensual.csv'
         seleccionados.to_csv(output_file, index=False)
-        print(f"\nResultados guardados en '{output_file}'")
+        logger.info("Resultados guardados en %s", output_file)
     else:
-        print("No se generaron selecciones")
+        logger.warning("No se generaron selecciones")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,159 @@
+# DATOS DE MERCADO SINTÉTICOS PARA EJECUTAR Y MEDIR SIN RED
+# 1. Importar Librerías
+import pandas as pd
+import numpy as np
+import sqlite3
+import argparse
+import contextlib
+import io
+import threading
+import zlib
+from estrategiamomento_cargaprecios_mensual import (
+    INICIO_MINIMO, obtener_datos_diarios, mensualizar, crear_tabla, configurar_conexion, insertar_datos
+)
+from estrategiamomento_almacen import TABLA_DIARIA
+from estrategiamomento_columnar import escribir_almacen_columnar, ruta_columnar
+
+# Los precios siguen un movimiento browniano geométrico diario con un factor de
+# mercado común (para que las correlaciones sean realistas) más un componente
+# propio de cada activo. Cada activo usa un generador sembrado con (semilla,
+# ticker), de modo que un mismo ticker tiene siempre la misma serie sea cual sea
+# el tamaño del universo o el rango pedido.
+INICIO_CALENDARIO = '1993-01-01'
+FIN_DEFECTO = '2025-04-30'
+
+# 2. Universo Sintético
+def activos_sinteticos(num_activos):
+    """Los tickers reales de INICIO_MINIMO seguidos de SIN0001, SIN0002, ..."""
+    reales = list(INICIO_MINIMO)
+    return reales[:num_activos] + [f'SIN{i:04d}' for i in range(1, num_activos - len(reales) + 1)]
+
+def _generador(semilla, activo):
+    return np.random.default_rng([semilla, zlib.crc32(activo.encode())])
+
+# 3. Proveedor Sintético
+class ProveedorSintetico:
+    """Proveedor compatible con obtener_datos (descargar(activo, inicio, fin)) que
+    sirve barras diarias generadas en memoria con el formato de yf.download,
+    incluidas las columnas MultiIndex (campo, ticker) de yfinance reciente. Los
+    tickers de INICIO_MINIMO empiezan en su fecha real; el resto tiene fechas de
+    inicio escalonadas: la mitad antes de `inicio_calendario` + 10 años y la otra
+    mitad repartida hasta dos años antes de `fin`."""
+
+    def __init__(self, semilla=0, fin=FIN_DEFECTO, inicio_calendario=INICIO_CALENDARIO, inicios=None,
+                 multiindex=True):
+        self.semilla = semilla
+        self.fin = pd.Timestamp(fin)
+        self.inicio_calendario = pd.Timestamp(inicio_calendario)
+        self.inicios = {**INICIO_MINIMO, **(inicios or {})}
+        self.multiindex = multiindex
+        self.calendario = pd.bdate_range(self.inicio_calendario, self.fin, name='Date')
+        rng = np.random.default_rng([semilla, 0])
+        volatilidad_mercado = 0.16 / np.sqrt(252)
+        self._mercado = rng.normal(0.0, volatilidad_mercado, len(self.calendario))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inicio(self, activo):
+        """Fecha de inicio de datos del activo."""
+        if activo in self.inicios:
+            return max(pd.Timestamp(self.inicios[activo]), self.inicio_calendario)
+        rng = _generador(self.semilla, activo + ':inicio')
+        if rng.random() < 0.5:
+            limite = min(self.inicio_calendario + pd.DateOffset(years=10), self.fin)
+        else:
+            limite = self.fin - pd.DateOffset(years=2)
+        dias = max((limite - self.inicio_calendario).days, 0)
+        return self.inicio_calendario + pd.Timedelta(days=int(rng.integers(0, dias + 1)))
+
+    def serie(self, activo):
+        """Histórico diario completo del activo (columnas planas)."""
+        with self._lock:
+            datos = self._series.get(activo)
+            if datos is None:
+                datos = self._generar(activo)
+                self._series[activo] = datos
+            return datos
+
+    def _generar(self, activo):
+        rng = _generador(self.semilla, activo)
+        desde = self.calendario.searchsorted(self.inicio(activo))
+        fechas = self.calendario[desde:]
+        n = len(fechas)
+        deriva = rng.normal(0.07, 0.04)
+        volatilidad = rng.uniform(0.12, 0.45)
+        beta = rng.uniform(0.5, 1.5)
+        propia = np.sqrt(max(volatilidad ** 2 - (beta * 0.16) ** 2, 0.05 ** 2)) / np.sqrt(252)
+        log_retornos = ((deriva - 0.5 * volatilidad ** 2) / 252 + beta * self._mercado[desde:] +
+                        rng.normal(0.0, propia, n))
+        cierre = rng.uniform(20, 200) * np.exp(np.cumsum(log_retornos))
+        apertura = np.concatenate([[cierre[0]], cierre[:-1]]) * (1 + rng.normal(0, 0.002, n))
+        maximo = np.maximum(apertura, cierre) * (1 + np.abs(rng.normal(0, 0.005, n)))
+        minimo = np.minimum(apertura, cierre) * (1 - np.abs(rng.normal(0, 0.005, n)))
+        # Ajuste por dividendos: el precio ajustado es menor cuanto más antiguo
+        dividendo = rng.uniform(0.0, 0.03)
+        ajuste = np.exp(-dividendo * (n - 1 - np.arange(n)) / 252)
+        return pd.DataFrame({
+            'Open': apertura,
+            'High': maximo,
+            'Low': minimo,
+            'Close': cierre,
+            'Adj Close': cierre * ajuste,
+            'Volume': rng.lognormal(13, 1, n).astype(np.int64)
+        }, index=fechas)
+
+    def descargar(self, activo, inicio, fin):
+        datos = self.serie(activo)
+        # yf.download excluye la fecha 'end'
+        datos = datos[(datos.index >= pd.Timestamp(inicio)) & (datos.index < pd.Timestamp(fin))].copy()
+        if self.multiindex:
+            datos.columns = pd.MultiIndex.from_product([datos.columns, [activo]], names=['Price', 'Ticker'])
+        return datos
+
+# 4. Escribir Bases de Datos Sintéticas
+def generar_base_datos(db_file, num_activos=15, activos=None, inicio='2005-01-01', fin=FIN_DEFECTO, semilla=0,
+                       diario=False, columnar=False, proveedor=None):
+    """Escribe en `db_file` la tabla prices mensual que produciría el cargador
+    (pasando cada activo por obtener_datos_diarios y mensualizar) y, con
+    `diario`, también las barras diarias en prices_daily. Devuelve
+    {activo: filas mensuales}."""
+    activos = activos or activos_sinteticos(num_activos)
+    proveedor = proveedor or ProveedorSintetico(semilla=semilla, fin=fin, multiindex=False)
+    conn = sqlite3.connect(db_file)
+    configurar_conexion(conn)
+    filas = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        crear_tabla(conn, diaria=diario)
+        for activo in activos:
+            diarios = obtener_datos_diarios(activo, inicio, fin, proveedor)
+            datos = mensualizar(diarios, fin, activo)
+            if datos is None:
+                continue
+            insertar_datos(conn, activo, datos, commit=False)
+            filas[activo] = len(datos)
+            if diario:
+                insertar_datos(conn, activo, diarios.dropna(), commit=False, tabla=TABLA_DIARIA)
+        conn.commit()
+        if columnar:
+            escribir_almacen_columnar(conn, ruta_columnar(db_file))
+    conn.close()
+    return filas
+
+# 5. Main
+def main():
+    parser = argparse.ArgumentParser(description="Genera bases de datos de precios sintéticas")
+    parser.add_argument('db_file', nargs='?', default='precios_activos_mensual.db')
+    parser.add_argument('--activos', type=int, default=15, help="Número de activos (los 15 reales primero)")
+    parser.add_argument('--inicio', default='2005-01-01')
+    parser.add_argument('--fin', default=FIN_DEFECTO)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--diario', action='store_true', help="Guardar también las barras diarias (prices_daily)")
+    parser.add_argument('--columnar', action='store_true', help="Exportar también el almacén columnar")
+    args = parser.parse_args()
+
+    filas = generar_base_datos(args.db_file, args.activos, inicio=args.inicio, fin=args.fin, semilla=args.semilla,
+                               diario=args.diario, columnar=args.columnar)
+    print(f"{len(filas)} activos y {sum(filas.values())} filas mensuales escritos en {args.db_file}")
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,29 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 import json
 import os
+from estrategiamomento_dashboard import (
+    preparar_dataframes, DatosDashboard, Simulador, graficos_por_mes, graficos_por_activo, numero_paginas, paginar
+)
+from estrategiamomento_resultados import leer_resultados, huella_artefacto
+from estrategiamomento_backtesting import obtener_activos
+
+# Segundos que se mantiene en caché un artefacto local aunque no haya cambiado
+TTL_ARTEFACTO = 3600
+# Periodo del simulador (el mismo que el backtesting publicado)
+INICIO_SIMULACION = datetime(2005, 5, 31)
+FIN_SIMULACION = datetime(2025, 4, 30)
 
 # Configuración de la página
 st.set_page_config(page_title="Momentum Estrategia Dashboard", layout="wide")
 st.title("📈 Momentum Estrategia Dashboard (2005-2025)")
 
-# Autenticación con Google Sheets usando secrets
+# Autenticación con Google Sheets usando secrets (las librerías de Google solo se
+# importan aquí, para poder usar el artefacto local sin tenerlas instaladas)
 def autenticar_google_sheets():
+    import gspread
+    from google.oauth2.service_account import Credentials
     scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
     creds_dict = {
         "type": "service_account",
@@ -39,9 +50,9 @@ def cargar_datos_google_sheets(spreadsheet_url):
         sheet_mes = spreadsheet.worksheet("Por Mes")
         sheet_activo = spreadsheet.worksheet("Por Activo")
         
-        # Cargar datos como DataFrame
-        df_selecciones = pd.DataFrame(sheet_mes.get_all_records())
-        df_metricas_activos = pd.DataFrame(sheet_activo.get_all_records())
+        # Cargar datos como DataFrame (con 'fecha' convertida a datetime)
+        df_selecciones, df_metricas_activos = preparar_dataframes(sheet_mes.get_all_records(),
+                                                                  sheet_activo.get_all_records())
         
         # Verificar columnas
         if 'fecha' not in df_selecciones.columns:
@@ -51,16 +62,6 @@ def cargar_datos_google_sheets(spreadsheet_url):
             st.error(f"Columna 'fecha' no encontrada en 'Por Activo'. Columnas disponibles: {list(df_metricas_activos.columns)}")
             st.stop()
         
-        # Depuración: Mostrar primeras filas de 'fecha'
-        st.write("Primeras filas de 'fecha' en 'Por Mes':")
-        st.write(df_selecciones['fecha'].head())
-        st.write("Primeras filas de 'fecha' en 'Por Activo':")
-        st.write(df_metricas_activos['fecha'].head())
-        
-        # Convertir 'fecha' a datetime, manejando errores
-        df_selecciones['fecha'] = pd.to_datetime(df_selecciones['fecha'], errors='coerce')
-        df_metricas_activos['fecha'] = pd.to_datetime(df_metricas_activos['fecha'], errors='coerce')
-        
         # Verificar si hay fechas no parseadas
         if df_selecciones['fecha'].isna().any():
             st.warning(f"Algunas fechas en 'Por Mes' no se pudieron parsear. Filas con NaT: {df_selecciones[df_selecciones['fecha'].isna()]['fecha'].index.tolist()}")
@@ -72,18 +73,86 @@ def cargar_datos_google_sheets(spreadsheet_url):
         st.error(f"Error al cargar datos: {str(e)}")
         raise e
 
-# Cargar spreadsheet_url desde secrets
-try:
-    spreadsheet_url = st.secrets["google_sheets"]["spreadsheet_url"]
-except KeyError:
-    st.error("No se encontró 'spreadsheet_url' en st.secrets. Configura los secrets en Streamlit Community Cloud.")
-    st.stop()
+# Leer datos de un artefacto local (Parquet, Feather o SQLite) escrito por el backtesting.
+# La huella (mtime y tamaño de los ficheros) forma parte de la clave de la caché: si
+# el backtesting reescribe el artefacto la siguiente ejecución lo vuelve a leer.
+@st.cache_data(ttl=TTL_ARTEFACTO)
+def cargar_datos_locales(ruta, huella):
+    return leer_resultados(ruta)
+
+def ruta_artefacto_local():
+    ruta = os.environ.get("ESTRATEGIAMOMENTO_RESULTADOS")
+    if ruta is None:
+        try:
+            ruta = st.secrets["artefacto_local"]["ruta"]
+        except (KeyError, FileNotFoundError):
+            return None
+    return ruta
+
+# Cargar datos: el artefacto local si está configurado y existe; si no, Google Sheets
+ruta_local = ruta_artefacto_local()
+huella_local = huella_artefacto(ruta_local) if ruta_local else None
+if huella_local is not None:
+    try:
+        df_selecciones, df_metricas_activos = cargar_datos_locales(ruta_local, huella_local)
+        clave_datos = huella_local
+    except Exception as e:
+        st.error(f"Error al leer el artefacto local {ruta_local}: {str(e)}")
+        st.stop()
+else:
+    if ruta_local:
+        st.warning(f"No se encontró el artefacto local {ruta_local}; se leen los datos de Google Sheets.")
+    # Cargar spreadsheet_url desde secrets
+    try:
+        spreadsheet_url = st.secrets["google_sheets"]["spreadsheet_url"]
+    except (KeyError, FileNotFoundError):
+        st.error("No se encontró 'spreadsheet_url' en st.secrets. Configura los secrets en Streamlit Community Cloud "
+                 "o indica un artefacto local en ESTRATEGIAMOMENTO_RESULTADOS.")
+        st.stop()
+
+    try:
+        df_selecciones, df_metricas_activos = cargar_datos_google_sheets(spreadsheet_url)
+        clave_datos = spreadsheet_url
+    except Exception as e:
+        st.stop()
+
+# Índice de filtrado compartido entre sesiones, uno por versión de los datos
+@st.cache_resource(max_entries=4)
+def indexar_datos(clave_datos, _df_selecciones, _df_metricas_activos):
+    return DatosDashboard(_df_selecciones, _df_metricas_activos)
+
+datos = indexar_datos(clave_datos, df_selecciones, df_metricas_activos)
 
-# Cargar datos
-try:
-    df_selecciones, df_metricas_activos = cargar_datos_google_sheets(spreadsheet_url)
-except Exception as e:
-    st.stop()
+# Figuras cacheadas por pestaña y estado de los filtros: al volver a una pestaña o a
+# un filtro anterior no se reconstruyen. Los DataFrames filtrados no forman parte de
+# la clave (empiezan por '_'); los identifican los datos cargados y los filtros.
+@st.cache_data(ttl=TTL_ARTEFACTO, max_entries=32)
+def construir_graficos_mes(clave_datos, filtros, _df_selecciones_filtrado):
+    return graficos_por_mes(_df_selecciones_filtrado)
+
+@st.cache_data(ttl=TTL_ARTEFACTO, max_entries=32)
+def construir_graficos_activo(clave_datos, filtros, _df_metricas_filtrado):
+    return graficos_por_activo(_df_metricas_filtrado)
+
+# Cada gráfico y cada tabla es un fragmento: sus propios controles (escala, página)
+# solo vuelven a ejecutar el fragmento, no el resto del dashboard
+@st.fragment
+def mostrar_grafico(fig, clave, escala_logaritmica=False):
+    if escala_logaritmica:
+        logaritmica = st.toggle("Escala logarítmica", key=f"escala_{clave}")
+        fig.update_yaxes(type="log" if logaritmica else "linear")
+    st.plotly_chart(fig, width="stretch", key=clave)
+
+@st.fragment
+def mostrar_tabla(df, clave):
+    paginas = numero_paginas(len(df))
+    # Al filtrar puede haber menos páginas que la que estaba seleccionada
+    if st.session_state.get(f"pagina_{clave}", 1) > paginas:
+        st.session_state[f"pagina_{clave}"] = paginas
+    col1, col2 = st.columns([1, 4], vertical_alignment="bottom")
+    pagina = col1.number_input("Página", min_value=1, max_value=paginas, value=1, step=1, key=f"pagina_{clave}")
+    col2.caption(f"{len(df)} filas · página {pagina} de {paginas}")
+    st.dataframe(paginar(df, pagina))
 
 # Sidebar para filtros
 st.sidebar.header("Filtros")
@@ -91,59 +160,104 @@ fecha_inicio = st.sidebar.date_input("Fecha Inicio", datetime(2005, 5, 31))
 fecha_fin = st.sidebar.date_input("Fecha Fin", datetime(2025, 4, 30))
 activos_disponibles = df_metricas_activos['activo'].unique()
 activo_seleccionado = st.sidebar.multiselect("Seleccionar Activos", activos_disponibles, default=activos_disponibles[:3])
+filtros = (fecha_inicio, fecha_fin, tuple(sorted(activo_seleccionado)))
+
+# Filtrar datos (cortes por búsqueda binaria, memorizados por fechas y activos)
+df_selecciones_filtrado, df_metricas_filtrado = datos.filtrar(fecha_inicio, fecha_fin, activo_seleccionado)
+
+# Panel de precios del simulador, preparado una vez por versión de la base de datos
+def ruta_precios():
+    ruta = os.environ.get("ESTRATEGIAMOMENTO_PRECIOS")
+    if ruta is None:
+        try:
+            ruta = st.secrets["precios"]["db_file"]
+        except (KeyError, FileNotFoundError):
+            return None
+    return ruta if os.path.exists(ruta) else None
+
+@st.cache_resource(max_entries=2)
+def cargar_simulador(db_file, version):
+    # Mismo universo que el backtesting que genera los resultados del resto de pestañas
+    return Simulador(db_file, INICIO_SIMULACION, FIN_SIMULACION, activos=obtener_activos(db_file))
 
-# Filtrar datos
-df_selecciones_filtrado = df_selecciones[(df_selecciones['fecha'] >= pd.to_datetime(fecha_inicio)) & 
-                                        (df_selecciones['fecha'] <= pd.to_datetime(fecha_fin))]
-df_metricas_filtrado = df_metricas_activos[(df_metricas_activos['fecha'] >= pd.to_datetime(fecha_inicio)) & 
-                                          (df_metricas_activos['fecha'] <= pd.to_datetime(fecha_fin)) & 
-                                          (df_metricas_activos['activo'].isin(activo_seleccionado))]
+# Los parámetros del simulador están dentro de su fragmento: moverlos solo vuelve a
+# simular, sin recalcular las otras pestañas
+@st.fragment
+def mostrar_simulador(db_precios):
+    col1, col2, col3 = st.columns(3)
+    momentum_min, momentum_max = col1.slider("Rango de Momentum Score", 0.0, 5.0, (0.7, 3.0), step=0.1)
+    max_activos = col1.slider("Máximo de Activos", 1, 10, 3)
+    vol_corta_meses = col2.slider("Volatilidad Corta (meses)", 2, 12, 4)
+    vol_larga_meses = col2.slider("Volatilidad Larga (meses)", 3, 13, 12)
+    # Parámetros de seleccionar_activos y la comisión de calcular_retorno_portafolio
+    comision = col3.slider("Comisión por Operación (%)", 0.0, 1.0, 0.25, step=0.05) / 100
+    if vol_corta_meses > vol_larga_meses:
+        st.warning("La volatilidad corta no puede superar a la larga.")
+        return
+    simulador = cargar_simulador(db_precios, os.stat(db_precios).st_mtime_ns)
+    df_simulacion, df_simulacion_activos = simulador.simular(momentum_min, momentum_max, max_activos,
+                                                             vol_corta_meses, vol_larga_meses, comision)
+    if df_simulacion.empty:
+        st.warning("No hay datos suficientes para simular esta configuración.")
+        return
+    ultimo = df_simulacion.iloc[-1]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Capital Final", f"{ultimo['capitalizacion_final']:,.0f}")
+    col2.metric("CAGR", f"{ultimo['cagr']:.2%}")
+    col3.metric("Sharpe", f"{ultimo['sharpe']:.2f}")
+    col4.metric("Máximo Drawdown", f"{ultimo['max_drawdown']:.2%}")
+    fig_capital_simulado, fig_rentabilidad_simulada = graficos_por_mes(df_simulacion)
+    st.plotly_chart(fig_capital_simulado, width="stretch", key="capital_simulado")
+    st.plotly_chart(fig_rentabilidad_simulada, width="stretch", key="rentabilidad_simulada")
+    st.subheader("Selecciones Simuladas")
+    mostrar_tabla(df_simulacion, "simulacion")
 
-# Pestañas para navegación
-tab1, tab2 = st.tabs(["Por Mes", "Por Activo"])
+# Pestañas para navegación: solo se ejecuta el contenido de la pestaña abierta
+tab1, tab2, tab3 = st.tabs(["Por Mes", "Por Activo", "Simulador"], key="pestaña", on_change="rerun")
 
 # Pestaña "Por Mes"
-with tab1:
-    st.header("Resultados Mensuales")
-    
-    # KPI: Rentabilidad Acumulada
-    rentabilidad_acumulada = (1 + df_selecciones_filtrado['rentabilidad_mensual']).cumprod().iloc[-1] - 1
-    sharpe_promedio = df_selecciones_filtrado['sharpe'].mean()
-    col1, col2 = st.columns(2)
-    col1.metric("Rentabilidad Acumulada", f"{rentabilidad_acumulada:.2%}")
-    col2.metric("Sharpe Promedio", f"{sharpe_promedio:.2f}")
-    
-    # Gráfico: Capitalización Final
-    fig_capital = px.line(df_selecciones_filtrado, x='fecha', y='capitalizacion_final', 
-                         title="Evolución de la Capitalización Final")
-    st.plotly_chart(fig_capital, use_container_width=True)
-    
-    # Gráfico: Rentabilidad Mensual
-    fig_rentabilidad = px.bar(df_selecciones_filtrado, x='fecha', y='rentabilidad_mensual', 
-                             title="Rentabilidad Mensual")
-    st.plotly_chart(fig_rentabilidad, use_container_width=True)
-    
-    # Tabla de datos
-    st.subheader("Datos Mensuales")
-    st.dataframe(df_selecciones_filtrado)
+if tab1.open:
+    with tab1:
+        st.header("Resultados Mensuales")
+
+        # KPI: Rentabilidad Acumulada
+        rentabilidad_acumulada, sharpe_promedio = datos.kpis(fecha_inicio, fecha_fin)
+        col1, col2 = st.columns(2)
+        col1.metric("Rentabilidad Acumulada", f"{rentabilidad_acumulada:.2%}")
+        col2.metric("Sharpe Promedio", f"{sharpe_promedio:.2f}")
+
+        # Gráficos: Capitalización Final y Rentabilidad Mensual
+        fig_capital, fig_rentabilidad = construir_graficos_mes(clave_datos, filtros, df_selecciones_filtrado)
+        mostrar_grafico(fig_capital, "capital", escala_logaritmica=True)
+        mostrar_grafico(fig_rentabilidad, "rentabilidad")
+
+        # Tabla de datos
+        st.subheader("Datos Mensuales")
+        mostrar_tabla(df_selecciones_filtrado, "mes")
 
 # Pestaña "Por Activo"
-with tab2:
-    st.header("Métricas por Activo")
-    
-    # Gráfico: Momentum Score por Activo
-    fig_momentum = px.line(df_metricas_filtrado, x='fecha', y='momentum_score', color='activo', 
-                          title="Momentum Score por Activo")
-    st.plotly_chart(fig_momentum, use_container_width=True)
-    
-    # Gráfico: Volatilidad Corta vs Larga
-    fig_volatilidad = px.scatter(df_metricas_filtrado, x='volatilidad_corta', y='volatilidad_larga', 
-                                color='activo', size='retorno_activo', hover_data=['fecha', 'activo'],
-                                title="Volatilidad Corta vs Larga")
-    st.plotly_chart(fig_volatilidad, use_container_width=True)
-    
-    # Tabla de datos
-    st.subheader("Datos por Activo")
-    st.dataframe(df_metricas_filtrado)
+if tab2.open:
+    with tab2:
+        st.header("Métricas por Activo")
+
+        # Gráficos: Momentum Score por Activo y Volatilidad Corta vs Larga
+        fig_momentum, fig_volatilidad = construir_graficos_activo(clave_datos, filtros, df_metricas_filtrado)
+        mostrar_grafico(fig_momentum, "momentum")
+        mostrar_grafico(fig_volatilidad, "volatilidad")
+
+        # Tabla de datos
+        st.subheader("Datos por Activo")
+        mostrar_tabla(df_metricas_filtrado, "activo")
+
+# Pestaña "Simulador"
+if tab3.open:
+    with tab3:
+        st.header("Simulador de Parámetros")
+        db_precios = ruta_precios()
+        if db_precios is None:
+            st.info("Indica la base de datos de precios en ESTRATEGIAMOMENTO_PRECIOS o en st.secrets['precios']['db_file'] "
+                    "para simular otras configuraciones.")
+        else:
+            mostrar_simulador(db_precios)
 
 st.sidebar.markdown("Creado con [Streamlit](https://streamlit.io/)")
@@ -0,0 +1,55 @@
+# TABLA LARGA prices: CORTES TRANSVERSALES, ÚLTIMAS FECHAS Y TABLAS POR ACTIVO
+import sqlite3
+import pandas as pd
+import pytest
+
+from estrategiamomento_sintetico import generar_base_datos
+from estrategiamomento_almacen import leer_corte_transversal, leer_panel, ultimas_fechas, tablas_por_activo
+from estrategiamomento_columnar import ruta_columnar
+from estrategiamomento_panelprecios import PanelPrecios
+
+FECHA = '2015-06-30'
+
+@pytest.fixture(scope='module')
+def db_file(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('almacen') / 'precios.db')
+    generar_base_datos(ruta, 15, inicio='2010-01-01', fin='2020-12-31', semilla=0, columnar=True)
+    return ruta
+
+@pytest.fixture
+def conn(db_file):
+    conn = sqlite3.connect(db_file)
+    yield conn
+    conn.close()
+
+def test_corte_transversal_coincide_con_el_panel(conn):
+    corte = leer_corte_transversal(conn, FECHA)
+    fila = leer_panel(conn).loc[FECHA].dropna()
+    pd.testing.assert_series_equal(corte['adj_close'].sort_index(), fila.sort_index(), check_names=False)
+
+def test_corte_transversal_de_algunos_activos(conn):
+    corte = leer_corte_transversal(conn, pd.Timestamp(FECHA), ['SPY', 'XLC', 'GLD'], columnas=('close', 'volume'))
+    # XLC aún no cotizaba en 2015
+    assert sorted(corte.index) == ['GLD', 'SPY']
+    assert list(corte.columns) == ['close', 'volume']
+
+def test_ultimas_fechas(conn):
+    fechas = ultimas_fechas(conn)
+    assert list(fechas) == sorted(ticker for (ticker,) in conn.execute("SELECT DISTINCT ticker FROM prices"))
+    assert set(fechas.values()) == {'2020-12-31'}
+
+def test_corte_del_panel_igual_en_sqlite_y_columnar(db_file):
+    activos = ['SPY', 'QQQ', 'XLC', 'IEUR']
+    for fecha in ['2013-01-31', '2019-12-31']:
+        sqlite = PanelPrecios(db_file).corte(fecha, activos)
+        columnar = PanelPrecios(ruta_columnar(db_file)).corte(fecha, activos)
+        pd.testing.assert_series_equal(sqlite, columnar, check_names=False)
+    assert list(PanelPrecios(db_file).corte('2013-01-31', activos).index) == ['SPY', 'QQQ']
+
+def test_tablas_por_activo_solo_con_esquema_de_precios(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'antigua.db'))
+    conn.execute("CREATE TABLE SPY (date TEXT, open REAL, high REAL, low REAL, close REAL, adj_close REAL, volume INTEGER)")
+    conn.execute("CREATE TABLE fetch_state (ticker TEXT PRIMARY KEY, inception TEXT, covered TEXT, last_fetch TEXT)")
+    conn.execute("CREATE TABLE notas (date TEXT, texto TEXT)")
+    assert tablas_por_activo(conn) == ['SPY']
+    conn.close()
@@ -0,0 +1,51 @@
+# BARRIDO DE PARÁMETROS FRENTE A BACKTESTINGS VECTORIZADOS INDIVIDUALES
+import pytest
+from datetime import datetime
+
+from estrategiamomento_sintetico import generar_base_datos
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado, PESOS_MOMENTUM
+from estrategiamomento_barrido import barrido_parametros, expandir_grilla, GRILLA_DEFECTO
+
+INICIO = datetime(2012, 1, 31)
+FIN = datetime(2016, 12, 31)
+GRILLA = {
+    'momentum_min': [0.5, 0.7],
+    'max_activos': [2, 3],
+    'vol_corta_meses': [3, 4],
+    'pesos_momentum': [PESOS_MOMENTUM, (1, 1, 1, 1)]
+}
+# Columnas del barrido y su nombre en df_selecciones
+METRICAS = {
+    'cagr': 'cagr',
+    'sharpe': 'sharpe',
+    'volatilidad': 'volatilidad_final',
+    'max_drawdown': 'max_drawdown',
+    'sortino': 'sortino',
+    'calmar': 'calmar',
+    'capital_final': 'capitalizacion_final'
+}
+
+@pytest.fixture(scope='module')
+def db_file(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('barrido') / 'precios.db')
+    generar_base_datos(ruta, 15, inicio='2010-01-01', fin='2017-01-31', semilla=0)
+    return ruta
+
+def test_grilla_por_defecto_es_la_configuracion_de_produccion():
+    assert expandir_grilla({}) == [{nombre: valores[0] for nombre, valores in GRILLA_DEFECTO.items()}]
+
+def test_barrido_igual_a_backtesting_vectorizado(db_file):
+    df_barrido = barrido_parametros(db_file, INICIO, FIN, GRILLA, procesos=1)
+    configuraciones = expandir_grilla(GRILLA)
+    assert len(df_barrido) == len(configuraciones) == 16
+    assert df_barrido['sharpe'].is_monotonic_decreasing
+    assert df_barrido['sharpe'].nunique() > 1
+
+    pesos = {'/'.join(f"{p:g}" for p in c['pesos_momentum']): c['pesos_momentum'] for c in configuraciones}
+    for fila in df_barrido.to_dict('records'):
+        config = {nombre: fila[nombre] for nombre in GRILLA_DEFECTO}
+        config['pesos_momentum'] = pesos[fila['pesos_momentum']]
+        df_selecciones, _ = backtesting_vectorizado(db_file, INICIO, FIN, **config)
+        ultimo = df_selecciones.iloc[-1]
+        for columna, columna_backtesting in METRICAS.items():
+            assert fila[columna] == pytest.approx(ultimo[columna_backtesting], rel=1e-9, abs=1e-12), (config, columna)
@@ -0,0 +1,85 @@
+# CACHÉ DE DESCARGAS: RANGOS SERVIDOS DESDE DISCO Y TRAMOS QUE FALTAN
+import os
+import time
+import pandas as pd
+import pytest
+
+from estrategiamomento_sintetico import ProveedorSintetico
+from estrategiamomento_cachedescargas import ProveedorConCache
+
+class ProveedorContador:
+    def __init__(self, proveedor):
+        self.proveedor = proveedor
+        self.peticiones = []
+
+    def descargar(self, activo, inicio, fin):
+        self.peticiones.append((activo, str(inicio)[:10], str(fin)[:10]))
+        return self.proveedor.descargar(activo, inicio, fin)
+
+@pytest.fixture
+def proveedor():
+    return ProveedorContador(ProveedorSintetico(semilla=0, fin='2020-12-31', multiindex=False))
+
+@pytest.fixture
+def cache(proveedor, tmp_path):
+    return ProveedorConCache(proveedor, str(tmp_path / 'cache'))
+
+def _directa(proveedor, activo, inicio, fin):
+    return proveedor.proveedor.descargar(activo, inicio, fin)
+
+def test_misma_peticion_y_subrango_desde_disco(cache, proveedor):
+    cache.descargar('SPY', '2010-01-01', '2015-01-01')
+    pd.testing.assert_frame_equal(cache.descargar('SPY', '2010-01-01', '2015-01-01'),
+                                  _directa(proveedor, 'SPY', '2010-01-01', '2015-01-01'), check_freq=False)
+    pd.testing.assert_frame_equal(cache.descargar('SPY', '2012-03-01', '2013-01-01'),
+                                  _directa(proveedor, 'SPY', '2012-03-01', '2013-01-01'), check_freq=False)
+    assert proveedor.peticiones == [('SPY', '2010-01-01', '2015-01-01')]
+    assert (cache.aciertos, cache.fallos) == (2, 1)
+
+def test_ampliar_el_rango_solo_descarga_lo_que_falta(cache, proveedor):
+    cache.descargar('SPY', '2010-01-01', '2015-01-01')
+    datos = cache.descargar('SPY', '2005-01-01', '2016-01-01')
+    assert proveedor.peticiones[1:] == [('SPY', '2005-01-01', '2010-01-01'), ('SPY', '2015-01-01', '2016-01-01')]
+    pd.testing.assert_frame_equal(datos, _directa(proveedor, 'SPY', '2005-01-01', '2016-01-01'), check_freq=False)
+    # Todo lo anterior ya está en disco
+    cache.descargar('SPY', '2005-01-01', '2016-01-01')
+    assert len(proveedor.peticiones) == 3
+
+def test_series_distintas_no_se_mezclan(cache, proveedor):
+    cache.descargar('SPY', '2010-01-01', '2011-01-01')
+    qqq = cache.descargar('QQQ', '2010-01-01', '2011-01-01')
+    pd.testing.assert_frame_equal(qqq, _directa(proveedor, 'QQQ', '2010-01-01', '2011-01-01'), check_freq=False)
+    assert len(proveedor.peticiones) == 2
+
+def test_tramo_vacio_no_amplia_la_entrada(cache, proveedor):
+    # XLC empieza el 2018-06-18: el tramo anterior vuelve vacío y se pide la petición entera
+    cache.descargar('XLC', '2018-06-01', '2020-01-01')
+    datos = cache.descargar('XLC', '2015-01-01', '2020-01-01')
+    pd.testing.assert_frame_equal(datos, _directa(proveedor, 'XLC', '2015-01-01', '2020-01-01'), check_freq=False)
+    assert proveedor.peticiones[1:] == [('XLC', '2015-01-01', '2018-06-01'), ('XLC', '2015-01-01', '2020-01-01')]
+    # La entrada sigue cubriendo solo lo que cubría
+    cache.descargar('XLC', '2018-06-01', '2020-01-01')
+    assert len(proveedor.peticiones) == 3
+
+def test_final_reciente_caduca(tmp_path):
+    hoy = pd.Timestamp.today().normalize()
+    proveedor = ProveedorContador(ProveedorSintetico(semilla=0, fin=hoy, multiindex=False))
+    cache = ProveedorConCache(proveedor, str(tmp_path / 'cache'), frescura_horas=1)
+    fin = (hoy + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    cache.descargar('SPY', '2020-01-01', fin)
+    cache.descargar('SPY', '2020-01-01', fin)
+    assert len(proveedor.peticiones) == 1
+    # Una entrada de hace dos horas vuelve a pedir solo los últimos días
+    ruta = cache.entradas()[0][0]
+    antes = time.time() - 2 * 3600
+    os.utime(ruta, (antes, antes))
+    cache.descargar('SPY', '2020-01-01', fin)
+    assert len(proveedor.peticiones) == 2
+    assert proveedor.peticiones[-1][1] == (hoy - pd.Timedelta(days=cache.dias_recientes)).strftime('%Y-%m-%d')
+
+def test_recortar_por_tamaño(cache):
+    for activo in ['SPY', 'QQQ', 'GLD']:
+        cache.descargar(activo, '2010-01-01', '2015-01-01')
+    assert len(cache.entradas()) == 3
+    assert cache.recortar(1) == 3
+    assert cache.tamaño() == 0
@@ -0,0 +1,64 @@
+# ESTADO DE DESCARGAS Y CARGA INCREMENTAL DEL CARGADOR
+import sqlite3
+import pytest
+
+from estrategiamomento_sintetico import ProveedorSintetico
+from estrategiamomento_cargaprecios_mensual import actualizar_base_datos, INICIO_MINIMO
+from estrategiamomento_cobertura import cargar_estado_descargas, planificar_descargas, rangos_faltantes
+
+ACTIVOS = ['SPY', 'EEM', 'XLC']
+FIN = '2020-12-31'
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'precios.db'))
+    yield conn
+    conn.close()
+
+def _primeras_fechas(conn):
+    return dict(conn.execute("SELECT ticker, MIN(date) FROM prices_daily GROUP BY ticker").fetchall())
+
+def test_rangos_faltantes():
+    rangos = [('2020-01-01', '2020-03-31'), ('2020-06-01', '2020-06-30')]
+    assert rangos_faltantes(rangos, '2019-12-01', '2020-07-31') == [
+        ('2019-12-01', '2019-12-31'), ('2020-04-01', '2020-05-31'), ('2020-07-01', '2020-07-31')]
+    # Un fin de semana suelto no es un hueco
+    assert rangos_faltantes([('2020-01-01', '2020-01-03')], '2020-01-01', '2020-01-05') == []
+
+def test_planificar_no_pide_historia_anterior_al_inicio():
+    estado = {'SPY': {'inicio': None, 'rangos': [('2005-01-01', '2020-11-30')], 'ultima_descarga': None}}
+    tareas = planificar_descargas(estado, ['SPY', 'XLC'], '2000-01-01', '2021-01-01', INICIO_MINIMO)
+    assert tareas == [('SPY', '2000-01-01', '2005-01-01'), ('SPY', '2020-12-01', '2021-01-01'),
+                      ('XLC', '2018-06-18', '2021-01-01')]
+
+def test_bajar_inicio_historico_descarga_la_historia_anterior(conn):
+    proveedor = ProveedorSintetico(semilla=0, fin=FIN)
+    actualizar_base_datos(conn, ACTIVOS, '2005-01-01', FIN, proveedor, max_concurrencia=2)
+    primeras = _primeras_fechas(conn)
+    assert primeras['SPY'] >= '2005-01-01' and primeras['EEM'] >= '2005-01-01'
+    # XLC empezó a cotizar después de 2005: su primera barra es su fecha de inicio
+    assert cargar_estado_descargas(conn)['XLC']['inicio'] == primeras['XLC']
+
+    insertadas, _ = actualizar_base_datos(conn, ACTIVOS, '2000-01-01', FIN, proveedor, max_concurrencia=2)
+    assert insertadas > 0
+    primeras = _primeras_fechas(conn)
+    assert primeras['SPY'] < '2000-01-10'
+    assert primeras['EEM'] == proveedor.inicio('EEM').strftime('%Y-%m-%d')
+    estado = cargar_estado_descargas(conn)
+    assert estado['EEM']['inicio'] == primeras['EEM']
+    # Una tercera ejecución ya no tiene nada que descargar
+    assert actualizar_base_datos(conn, ACTIVOS, '2000-01-01', FIN, proveedor, max_concurrencia=2) == (0, 0)
+
+def test_insercion_fallida_no_marca_el_rango_como_cubierto(conn):
+    proveedor = ProveedorSintetico(semilla=0, fin=FIN)
+    actualizar_base_datos(conn, [], '2005-01-01', FIN, proveedor)
+    conn.execute("""CREATE TRIGGER fallo BEFORE INSERT ON prices_daily WHEN NEW.ticker = 'EEM'
+                    BEGIN SELECT RAISE(ABORT, 'fallo de escritura'); END""")
+    assert actualizar_base_datos(conn, ACTIVOS, '2005-01-01', FIN, proveedor) == (0, 0)
+    assert cargar_estado_descargas(conn) == {}
+    assert conn.execute("SELECT COUNT(*) FROM prices_daily").fetchone()[0] == 0
+
+    conn.execute("DROP TRIGGER fallo")
+    insertadas, _ = actualizar_base_datos(conn, ACTIVOS, '2005-01-01', FIN, proveedor)
+    assert insertadas > 0
+    assert set(_primeras_fechas(conn)) == set(ACTIVOS)
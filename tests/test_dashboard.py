@@ -0,0 +1,62 @@
+# FILTRADO INDEXADO DEL DASHBOARD FRENTE AL FILTRADO CON MÁSCARAS
+import numpy as np
+import pandas as pd
+import pytest
+
+from estrategiamomento_dashboard import DatosDashboard, filtrar_datos, calcular_kpis
+
+ACTIVOS = ['SPY', 'QQQ', 'EEM', 'TLT', 'GLD', 'XLC']
+
+@pytest.fixture(scope='module')
+def dataframes():
+    rng = np.random.default_rng(0)
+    fechas = pd.date_range('2010-01-31', periods=60, freq='ME')
+    df_selecciones = pd.DataFrame({
+        'fecha': fechas,
+        'rentabilidad_mensual': rng.normal(0.008, 0.04, len(fechas)),
+        'sharpe': rng.normal(0.5, 0.3, len(fechas))
+    })
+    # Un activo sin filas en los primeros meses, como los que empiezan más tarde
+    filas = [(fecha, activo) for fecha in fechas for activo in ACTIVOS if activo != 'XLC' or fecha.year >= 2013]
+    df_metricas_activos = pd.DataFrame(filas, columns=['fecha', 'activo'])
+    df_metricas_activos['momentum'] = rng.normal(1.0, 0.5, len(df_metricas_activos))
+    # Desordenados, como llegan de la hoja de cálculo
+    return (df_selecciones.sample(frac=1, random_state=0),
+            df_metricas_activos.sample(frac=1, random_state=1))
+
+def _ordenar(df, columnas):
+    return df.sort_values(columnas, kind='stable').reset_index(drop=True)
+
+@pytest.mark.parametrize('fecha_inicio, fecha_fin, activos', [
+    ('2010-01-31', '2014-12-31', ACTIVOS),
+    ('2011-03-15', '2013-06-30', ['SPY', 'XLC']),
+    ('2012-05-31', '2012-05-31', ['QQQ']),
+    ('2016-01-01', '2017-01-01', ACTIVOS),
+    ('2011-01-01', '2012-12-31', []),
+    ('2011-01-01', '2012-12-31', ['NOEXISTE', 'TLT'])
+])
+def test_filtrar_igual_que_filtrar_datos(dataframes, fecha_inicio, fecha_fin, activos):
+    df_selecciones, df_metricas_activos = dataframes
+    esperado_mes, esperado_activo = filtrar_datos(df_selecciones, df_metricas_activos, fecha_inicio, fecha_fin, activos)
+    obtenido_mes, obtenido_activo = DatosDashboard(df_selecciones, df_metricas_activos).filtrar(fecha_inicio, fecha_fin,
+                                                                                              activos)
+    pd.testing.assert_frame_equal(_ordenar(esperado_mes, ['fecha']), obtenido_mes.reset_index(drop=True))
+    pd.testing.assert_frame_equal(_ordenar(esperado_activo, ['fecha', 'activo']),
+                                  _ordenar(obtenido_activo, ['fecha', 'activo']))
+
+def test_kpis_igual_que_calcular_kpis(dataframes):
+    datos = DatosDashboard(*dataframes)
+    df_filtrado, _ = filtrar_datos(*dataframes, '2011-03-15', '2013-06-30', ACTIVOS)
+    rentabilidad, sharpe = datos.kpis('2011-03-15', '2013-06-30')
+    esperado_rentabilidad, esperado_sharpe = calcular_kpis(df_filtrado.sort_values('fecha'))
+    assert rentabilidad == pytest.approx(esperado_rentabilidad, rel=1e-12)
+    assert sharpe == pytest.approx(esperado_sharpe, rel=1e-12)
+    assert datos.kpis('2016-01-01', '2017-01-01') == (0.0, pytest.approx(float('nan'), nan_ok=True))
+
+def test_cache_por_conjunto_de_activos(dataframes):
+    datos = DatosDashboard(*dataframes, max_entradas=2)
+    primero = datos.filtrar('2011-01-01', '2012-12-31', ['SPY', 'TLT'])
+    assert datos.filtrar('2011-01-01', '2012-12-31', ['TLT', 'SPY']) is primero
+    datos.filtrar('2011-01-01', '2012-12-31', ['QQQ'])
+    datos.filtrar('2011-01-01', '2012-12-31', ['GLD'])
+    assert datos.filtrar('2011-01-01', '2012-12-31', ['SPY', 'TLT']) is not primero
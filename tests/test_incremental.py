@@ -0,0 +1,82 @@
+# BACKTESTING INCREMENTAL FRENTE AL BACKTESTING VECTORIZADO COMPLETO
+import shutil
+import sqlite3
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from estrategiamomento_sintetico import generar_base_datos
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado
+from estrategiamomento_incremental import backtesting_incremental
+
+INICIO = datetime(2012, 1, 31)
+FIN_PARCIAL = datetime(2014, 6, 30)
+FIN = datetime(2016, 12, 31)
+
+@pytest.fixture(scope='module')
+def db_original(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('incremental') / 'precios.db')
+    generar_base_datos(ruta, 15, inicio='2010-01-01', fin='2017-01-31', semilla=0)
+    return ruta
+
+# Cada test trabaja sobre su propia copia: uno de ellos modifica los precios
+@pytest.fixture
+def db_file(db_original, tmp_path):
+    ruta = str(tmp_path / 'precios.db')
+    shutil.copy(db_original, ruta)
+    return ruta
+
+def _completo(db_file, fin=FIN, **parametros):
+    return backtesting_vectorizado(db_file, INICIO, fin, **parametros)
+
+def _incremental(db_file, directorio, fin=FIN, **parametros):
+    return backtesting_incremental(db_file, INICIO, fin, directorio_estado=directorio, **parametros)
+
+def _comparar(esperado, obtenido):
+    pd.testing.assert_frame_equal(esperado.reset_index(drop=True), obtenido.reset_index(drop=True),
+                                  check_dtype=False, rtol=1e-9, atol=1e-9)
+
+def test_ampliar_el_rango_solo_calcula_los_meses_nuevos(db_file, tmp_path):
+    directorio = str(tmp_path / 'estado')
+    _, _, resumen = _incremental(db_file, directorio, fin=FIN_PARCIAL)
+    assert resumen['recalculo_completo']
+
+    df_sel, df_met, resumen = _incremental(db_file, directorio)
+    assert not resumen['recalculo_completo']
+    df_sel_completo, df_met_completo = _completo(db_file)
+    assert resumen['meses_nuevos'] == len(df_sel_completo) - len(_completo(db_file, fin=FIN_PARCIAL)[0])
+    _comparar(df_sel_completo, df_sel)
+    _comparar(df_met_completo, df_met)
+
+def test_sin_meses_nuevos_devuelve_el_estado(db_file, tmp_path):
+    directorio = str(tmp_path / 'estado')
+    df_sel, df_met, _ = _incremental(db_file, directorio)
+    df_sel_repetido, df_met_repetido, resumen = _incremental(db_file, directorio)
+    assert resumen['meses_nuevos'] == 0
+    _comparar(df_sel, df_sel_repetido)
+    _comparar(df_met, df_met_repetido)
+
+def test_cambio_de_parametros_recalcula_todo(db_file, tmp_path):
+    directorio = str(tmp_path / 'estado')
+    _incremental(db_file, directorio, fin=FIN_PARCIAL)
+    df_sel, df_met, resumen = _incremental(db_file, directorio, max_activos=2)
+    assert resumen['recalculo_completo']
+    df_sel_completo, df_met_completo = _completo(db_file, max_activos=2)
+    _comparar(df_sel_completo, df_sel)
+    _comparar(df_met_completo, df_met)
+
+def test_cambio_de_precios_procesados_recalcula_todo(db_file, tmp_path):
+    directorio = str(tmp_path / 'estado')
+    _incremental(db_file, directorio, fin=FIN_PARCIAL)
+    conn = sqlite3.connect(db_file)
+    conn.execute("UPDATE prices SET adj_close = adj_close * 1.5 WHERE date < '2013-01-01'")
+    conn.commit()
+    conn.close()
+    obtener_panel(db_file).invalidar()
+
+    df_sel, df_met, resumen = _incremental(db_file, directorio)
+    assert resumen['recalculo_completo']
+    df_sel_completo, df_met_completo = _completo(db_file)
+    _comparar(df_sel_completo, df_sel)
+    _comparar(df_met_completo, df_met)
@@ -0,0 +1,69 @@
+# PANEL Y ARRAYS EN MEMORIA COMPARTIDA Y BARRIDO CON VARIOS PROCESOS
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from estrategiamomento_sintetico import generar_base_datos
+from estrategiamomento_almacen import leer_panel
+from estrategiamomento_columnar import leer_panel_columnar
+from estrategiamomento_backtesting import obtener_activos
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado
+from estrategiamomento_memoriacompartida import (
+    publicar_panel, liberar_panel, panel_compartido, arrays_compartidos, adjuntar_arrays
+)
+from estrategiamomento_barrido import barrido_parametros
+
+INICIO = datetime(2012, 1, 31)
+FIN = datetime(2016, 12, 31)
+
+@pytest.fixture(scope='module')
+def db_file(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('memoriacompartida') / 'precios.db')
+    generar_base_datos(ruta, 15, inicio='2010-01-01', fin='2017-01-31', semilla=0)
+    return ruta
+
+def test_panel_compartido_igual_a_la_base_de_datos(db_file):
+    conn = sqlite3.connect(db_file)
+    esperado = {columna: leer_panel(conn, columna=columna) for columna in ('adj_close', 'close')}
+    conn.close()
+
+    with panel_compartido(db_file, columnas=('adj_close', 'close')) as descriptor:
+        ruta = descriptor['ruta']
+        assert descriptor['activos'] == list(esperado['adj_close'].columns)
+        for columna, panel in esperado.items():
+            compartido = leer_panel_columnar(ruta, columna=columna)
+            np.testing.assert_array_equal(compartido.to_numpy(), panel.to_numpy())
+            assert (compartido.index == panel.index).all()
+    assert not os.path.exists(ruta)
+
+def test_la_ruta_del_panel_sirve_como_db_file(db_file):
+    activos = obtener_activos(db_file)
+    esperado = backtesting_vectorizado(db_file, INICIO, FIN, activos=activos)
+    descriptor = publicar_panel(db_file)
+    try:
+        obtenido = backtesting_vectorizado(descriptor['ruta'], INICIO, FIN, activos=activos)
+    finally:
+        liberar_panel(descriptor)
+    for df_esperado, df_obtenido in zip(esperado, obtenido):
+        pd.testing.assert_frame_equal(df_esperado, df_obtenido, check_dtype=False, rtol=1e-12, atol=1e-12)
+
+def test_arrays_compartidos_de_solo_lectura(tmp_path):
+    arrays = {'precios': np.arange(12, dtype=float).reshape(3, 4), 'validos': np.eye(3, dtype=bool)}
+    with arrays_compartidos(arrays, directorio=str(tmp_path)) as descriptor:
+        adjuntos = adjuntar_arrays(descriptor)
+        assert set(adjuntos) == set(arrays)
+        for nombre, array in arrays.items():
+            np.testing.assert_array_equal(adjuntos[nombre], array)
+            assert not adjuntos[nombre].flags.writeable
+        ruta = descriptor['ruta']
+    assert not os.path.exists(ruta)
+
+def test_barrido_con_varios_procesos_igual_que_con_uno(db_file):
+    grilla = {'max_activos': [2, 3], 'vol_corta_meses': [3, 4]}
+    serie = barrido_parametros(db_file, INICIO, FIN, grilla, procesos=1)
+    paralelo = barrido_parametros(db_file, INICIO, FIN, grilla, procesos=2)
+    assert len(serie) == 4
+    pd.testing.assert_frame_equal(serie, paralelo)
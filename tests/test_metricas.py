@@ -0,0 +1,66 @@
+# MÉTRICAS: ACUMULADOR MES A MES, SERIE VECTORIZADA Y DEFINICIÓN DIRECTA
+import json
+import numpy as np
+import pytest
+
+from estrategiamomento_metricas import MetricasAcumuladas, metricas_serie, columnas_metricas
+from estrategiamomento_backtesting import calcular_metricas
+
+CAPITAL_INICIAL = 10000
+
+@pytest.fixture(scope='module')
+def serie():
+    rng = np.random.default_rng(0)
+    retornos = rng.normal(0.008, 0.04, 120)
+    retornos[[5, 6, 40]] = 0.0
+    capitales = CAPITAL_INICIAL * np.cumprod(1 + retornos)
+    años = np.arange(1, len(retornos) + 1) / 12
+    return retornos, capitales, años
+
+def _acumuladas(retornos, capitales, años, acumulador=None, desde=0):
+    acumulador = acumulador or MetricasAcumuladas(CAPITAL_INICIAL)
+    filas = []
+    for retorno, capital, año in zip(retornos[desde:], capitales[desde:], años[desde:]):
+        acumulador.actualizar_capital(capital)
+        filas.append(acumulador.metricas(año))
+        acumulador.añadir_retorno(retorno)
+    return filas, acumulador
+
+def test_acumulador_igual_a_metricas_serie(serie):
+    filas, _ = _acumuladas(*serie)
+    retornos, capitales, años = serie
+    vectorizadas = metricas_serie(CAPITAL_INICIAL, capitales, retornos, años)
+    for columna in columnas_metricas():
+        np.testing.assert_allclose([fila[columna] for fila in filas], vectorizadas[columna], rtol=1e-9, atol=1e-12,
+                                   err_msg=columna)
+
+def test_definicion_directa(serie):
+    retornos, capitales, años = serie
+    vectorizadas = metricas_serie(CAPITAL_INICIAL, capitales, retornos, años)
+    for i in [1, 11, 12, 50, 119]:
+        previos = retornos[:i]
+        sharpe, volatilidad, cagr = calcular_metricas(CAPITAL_INICIAL, capitales[i], list(previos), años[i])
+        assert vectorizadas['cagr'][i] == pytest.approx(cagr, rel=1e-12)
+        assert vectorizadas['volatilidad_final'][i] == pytest.approx(volatilidad, rel=1e-12)
+        assert vectorizadas['sharpe'][i] == pytest.approx(sharpe, rel=1e-12)
+        picos = np.maximum.accumulate(np.concatenate([[CAPITAL_INICIAL], capitales[:i + 1]]))[1:]
+        assert vectorizadas['max_drawdown'][i] == pytest.approx(min((capitales[:i + 1] / picos - 1).min(), 0.0))
+        bajista = np.sqrt(np.mean(np.minimum(previos, 0.0) ** 2)) * np.sqrt(12)
+        assert vectorizadas['sortino'][i] == pytest.approx((cagr - 0.02) / bajista if bajista > 0 else 0.0, rel=1e-9)
+        if i >= 12:
+            ultimos = previos[-12:]
+            assert vectorizadas['sharpe_12m'][i] == pytest.approx(
+                (ultimos.mean() * 12 - 0.02) / (ultimos.std() * np.sqrt(12)), rel=1e-9)
+        else:
+            assert vectorizadas['sharpe_12m'][i] == 0.0
+    # El primer periodo no tiene retornos previos
+    assert all(vectorizadas[columna][0] == 0.0 for columna in columnas_metricas())
+
+def test_estado_en_json_continua_igual(serie):
+    retornos, capitales, años = serie
+    completas, _ = _acumuladas(*serie)
+    _, acumulador = _acumuladas(retornos[:60], capitales[:60], años[:60])
+    restaurado = MetricasAcumuladas.desde_estado(json.loads(json.dumps(acumulador.estado())))
+    continuadas, _ = _acumuladas(retornos, capitales, años, restaurado, desde=60)
+    for esperada, obtenida in zip(completas[60:], continuadas):
+        assert obtenida == pytest.approx(esperada, rel=1e-9, abs=1e-12)
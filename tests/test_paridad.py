@@ -0,0 +1,129 @@
+# PARIDAD ENTRE EL BUCLE MENSUAL Y EL MOTOR VECTORIZADO SOBRE DATOS SINTÉTICOS
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+from estrategiamomento_sintetico import generar_base_datos
+from estrategiamomento_panelprecios import obtener_panel
+from estrategiamomento_correlaciones import invalidar_correlaciones
+from estrategiamomento_backtesting import backtesting_selecciones_con_metricas, obtener_activos
+from estrategiamomento_backtesting_vectorizado import backtesting_vectorizado
+
+INICIO = datetime(2012, 1, 31)
+FIN = datetime(2016, 12, 31)
+
+@pytest.fixture(scope='module')
+def db_file(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('paridad') / 'precios.db')
+    generar_base_datos(ruta, 15, inicio='2010-01-01', fin='2017-01-31', semilla=0)
+    return ruta
+
+def _comparar(bucle, vect):
+    assert list(bucle.columns) == list(vect.columns)
+    assert len(bucle) == len(vect)
+    for col in bucle.columns:
+        if pd.api.types.is_numeric_dtype(bucle[col]):
+            pd.testing.assert_series_equal(bucle[col].astype(float), vect[col].astype(float), rtol=1e-9, atol=1e-9)
+        else:
+            assert bucle[col].tolist() == vect[col].tolist(), col
+
+@pytest.mark.parametrize('procesos', [1, 2])
+def test_bucle_y_vectorizado_coinciden(db_file, procesos):
+    obtener_panel(db_file).invalidar()
+    invalidar_correlaciones(db_file)
+    df_sel_bucle, df_met_bucle = backtesting_selecciones_con_metricas(db_file, INICIO, FIN, procesos=procesos)
+    df_sel_vect, df_met_vect = backtesting_vectorizado(db_file, INICIO, FIN, activos=obtener_activos(db_file))
+
+    assert not df_sel_bucle.empty
+    assert df_sel_bucle['activos_seleccionados'].map(len).sum() > 0
+    _comparar(df_sel_bucle, df_sel_vect)
+    _comparar(df_met_bucle, df_met_vect)
+
+# Copia de la selección y el retorno mensual originales (pandas, un activo cada
+# vez), independiente de los núcleos que ahora comparten el bucle y el motor
+# vectorizado (seleccion_greedy, tensor de correlaciones)
+def _leer(conn, activo, desde, hasta):
+    return pd.read_sql_query("""SELECT date, adj_close AS Adj_Close FROM prices
+                                WHERE ticker = ? AND date BETWEEN ? AND ? ORDER BY date""",
+                             conn, params=(activo, desde, hasta), parse_dates=['date']).set_index('date')
+
+def _seleccion_original(conn, activos, fecha_fin, momentum_min=0.7, momentum_max=3, max_activos=3):
+    fin = fecha_fin.strftime('%Y-%m-%d')
+    desde_12m = (fecha_fin - relativedelta(months=13)).strftime('%Y-%m-%d')
+    desde_4m = (fecha_fin - relativedelta(months=4)).strftime('%Y-%m-%d')
+    datos, momentum, volatilidades = {}, {}, {}
+    for activo in activos:
+        df_12m, df_4m = _leer(conn, activo, desde_12m, fin), _leer(conn, activo, desde_4m, fin)
+        if df_12m.empty or df_4m.empty or len(df_4m) < 4 or len(df_12m) < 12:
+            continue
+        datos[activo] = df_12m
+        volatilidades[activo] = (df_4m['Adj_Close'].pct_change().dropna().iloc[-4:].std(),
+                                 df_12m['Adj_Close'].pct_change().dropna().iloc[-12:].std())
+        if len(df_12m) >= 13:
+            p = df_12m['Adj_Close']
+            momentum[activo] = (12 * (p.iloc[-1] / p.iloc[-2]) + 4 * (p.iloc[-1] / p.iloc[-4]) +
+                                2 * (p.iloc[-1] / p.iloc[-7]) + (p.iloc[-1] / p.iloc[-13]) - 19)
+    validos = [activo for activo, (corta, larga) in volatilidades.items() if corta <= larga]
+    candidatos = sorted((activo for activo in momentum if activo in validos
+                         and momentum_min <= momentum[activo] <= momentum_max),
+                        key=lambda activo: -momentum[activo])
+    if not candidatos:
+        return [], {}
+    # Como el original: cada columna se alinea con las fechas de la primera
+    retornos = pd.DataFrame()
+    for activo in validos:
+        retornos[activo] = datos[activo]['Adj_Close'].pct_change().dropna()
+    correlacion = retornos.corr(method='pearson')
+    seleccionados, restantes = [candidatos[0]], candidatos[1:]
+    while len(seleccionados) < max_activos and restantes:
+        mejor, menor = None, float('inf')
+        for candidato in restantes:
+            promedio = np.mean([correlacion.loc[candidato, s] for s in seleccionados])
+            if promedio < menor:
+                mejor, menor = candidato, promedio
+        if mejor is None:
+            break
+        seleccionados.append(mejor)
+        restantes.remove(mejor)
+    metricas = {activo: {'momentum_score': momentum[activo],
+                         'volatilidad_corta': volatilidades[activo][0],
+                         'volatilidad_larga': volatilidades[activo][1],
+                         'correlacion_promedio': np.mean([correlacion.loc[activo, otro] for otro in seleccionados
+                                                          if otro != activo]) if len(seleccionados) > 1 else 0.0}
+                for activo in seleccionados}
+    return seleccionados, metricas
+
+def _retorno_original(conn, seleccionados, fecha, fecha_siguiente, comision=0.0025):
+    retornos = []
+    for activo in seleccionados:
+        df = _leer(conn, activo, fecha.strftime('%Y-%m-%d'), fecha_siguiente.strftime('%Y-%m-%d'))
+        if len(df) >= 2:
+            retornos.append(df['Adj_Close'].iloc[-1] / df['Adj_Close'].iloc[-2] - 1)
+    return (1 + np.mean(retornos)) * (1 - comision) ** 2 - 1 if retornos else 0.0
+
+def test_vectorizado_igual_a_la_seleccion_original(db_file):
+    activos = obtener_activos(db_file)
+    df_selecciones, df_metricas = backtesting_vectorizado(db_file, INICIO, FIN, activos=activos)
+    fechas = pd.date_range(INICIO, FIN, freq='ME')
+    conn = sqlite3.connect(db_file)
+    try:
+        esperadas = [(fecha, *_seleccion_original(conn, activos, fecha)) for fecha in fechas[:-1]]
+        retornos = [_retorno_original(conn, seleccionados, fecha, siguiente)
+                    for (fecha, seleccionados, _), siguiente in zip(esperadas, fechas[1:])]
+    finally:
+        conn.close()
+
+    assert df_selecciones['activos_seleccionados'].tolist() == [seleccionados for _, seleccionados, _ in esperadas]
+    assert sum(len(seleccionados) > 1 for _, seleccionados, _ in esperadas) > 10
+    np.testing.assert_allclose(df_selecciones['rentabilidad_mensual'], retornos, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(df_selecciones['capitalizacion_final'], 10000 * np.cumprod(1 + np.array(retornos)),
+                               rtol=1e-9)
+    for fecha, seleccionados, metricas in esperadas:
+        filas = df_metricas[df_metricas['fecha'] == fecha.strftime('%Y-%m-%d')].set_index('activo')
+        assert list(filas.index) == seleccionados
+        for activo in seleccionados:
+            for columna, valor in metricas[activo].items():
+                assert filas.at[activo, columna] == pytest.approx(valor, rel=1e-9, abs=1e-12), (fecha, activo, columna)
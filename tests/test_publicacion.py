@@ -0,0 +1,74 @@
+# PUBLICACIÓN INCREMENTAL EN GOOGLE SHEETS (CLIENTE EN MEMORIA)
+import numpy as np
+import pandas as pd
+import pytest
+
+from estrategiamomento_publicacion import (
+    ClienteSheetsMemoria, publicar_resultados, valores_hoja, lotes_escritura, PESTAÑAS
+)
+
+def _resultados(meses):
+    fechas = pd.date_range('2020-01-31', periods=meses, freq='ME').strftime('%Y-%m-%d')
+    df_selecciones = pd.DataFrame({
+        'fecha': fechas,
+        'activos_seleccionados': [['SPY', 'GLD'] if i % 2 else ['QQQ'] for i in range(meses)],
+        'rentabilidad_mensual': 0.001 * np.arange(meses) - 0.01,
+        'capitalizacion_final': 10000 + 100.0 * np.arange(meses)
+    })
+    df_metricas = pd.DataFrame({'fecha': fechas, 'activo': 'SPY', 'momentum_score': 0.7 + 0.01 * np.arange(meses)})
+    return df_selecciones, df_metricas
+
+def _contenido(hoja, titulo):
+    return hoja.worksheet(titulo).get_all_values()
+
+@pytest.fixture
+def hoja():
+    return ClienteSheetsMemoria().create('resultados')
+
+def test_primera_publicacion_escribe_todo(hoja):
+    df_selecciones, df_metricas = _resultados(24)
+    assert publicar_resultados(hoja, df_selecciones, df_metricas) == {PESTAÑAS[0]: 25, PESTAÑAS[1]: 25}
+    assert _contenido(hoja, PESTAÑAS[0]) == valores_hoja(df_selecciones)
+    assert _contenido(hoja, PESTAÑAS[1]) == valores_hoja(df_metricas)
+
+def test_sin_cambios_no_escribe(hoja):
+    df_selecciones, df_metricas = _resultados(24)
+    publicar_resultados(hoja, df_selecciones, df_metricas)
+    escrituras = hoja.llamadas['batch_update']
+    assert publicar_resultados(hoja, df_selecciones, df_metricas) == {PESTAÑAS[0]: 0, PESTAÑAS[1]: 0}
+    assert hoja.llamadas['batch_update'] == escrituras
+
+def test_solo_escribe_el_delta(hoja):
+    publicar_resultados(hoja, *_resultados(24))
+    df_selecciones, df_metricas = _resultados(25)
+    df_selecciones.loc[3, 'capitalizacion_final'] += 1
+    # Fila 4 modificada y fila 26 nueva (la 1 es la cabecera)
+    assert publicar_resultados(hoja, df_selecciones, df_metricas) == {PESTAÑAS[0]: 2, PESTAÑAS[1]: 1}
+    assert _contenido(hoja, PESTAÑAS[0]) == valores_hoja(df_selecciones)
+
+def test_menos_filas_recorta_la_pestaña(hoja):
+    publicar_resultados(hoja, *_resultados(24))
+    df_selecciones, df_metricas = _resultados(10)
+    assert publicar_resultados(hoja, df_selecciones, df_metricas) == {PESTAÑAS[0]: 0, PESTAÑAS[1]: 0}
+    assert _contenido(hoja, PESTAÑAS[0]) == valores_hoja(df_selecciones)
+    assert hoja.worksheet(PESTAÑAS[0]).row_count == 11
+
+def test_columnas_nuevas_reescriben_la_pestaña(hoja):
+    df_selecciones, df_metricas = _resultados(12)
+    publicar_resultados(hoja, df_selecciones, df_metricas)
+    df_selecciones['sharpe'] = 0.5
+    assert publicar_resultados(hoja, df_selecciones, df_metricas)[PESTAÑAS[0]] == 13
+    assert _contenido(hoja, PESTAÑAS[0]) == valores_hoja(df_selecciones)
+
+def test_errores_de_cuota_se_reintentan():
+    hoja = ClienteSheetsMemoria(fallos_cuota=2).create('resultados')
+    df_selecciones, df_metricas = _resultados(5)
+    publicar_resultados(hoja, df_selecciones, df_metricas, espera=0)
+    assert hoja.llamadas['errores_cuota'] == 2
+    assert _contenido(hoja, PESTAÑAS[0]) == valores_hoja(df_selecciones)
+
+def test_lotes_respetan_el_maximo_de_celdas():
+    valores = [[i, i] for i in range(10)]
+    lotes = lotes_escritura(valores, [0, 1, 2, 5, 6, 7, 8, 9], max_celdas=6)
+    assert [[bloque['range'] for bloque in lote] for lote in lotes] == [
+        ['A1:B3'], ['A6:B8'], ['A9:B10']]